@@ -13,15 +13,19 @@ logger = logging.getLogger(__name__)
 # Crear la aplicación Flask
 def create_app():
     app = Flask(__name__)
+
+    # Serialización JSON de Decimal, fechas y horas (orjson si está instalado)
+    from utils.json_provider import ProveedorJSON
+    app.json = ProveedorJSON(app)
     
     # Configurar CORS
     CORS(app, resources={
         r"/*": {
             "origins": ["http://localhost:*", "http://127.0.0.1:*", "http://192.168.1.52:*", "http://192.168.1.208:*", "http://192.168.1.60:*"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
             "supports_credentials": True,
-            "expose_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["Content-Type", "Authorization", "ETag", "X-Rollup-Origen", "X-Rollup-Actualizado", "X-Rollup-Pendientes"],
             "max_age": 3600
         }
     })
@@ -36,6 +40,14 @@ def create_app():
 
     jwt = JWTManager(app)
 
+    # Una conexión a la base de datos por petición, devuelta al pool al terminar
+    from utils.db import init_app as init_db
+    init_db(app)
+
+    # Compresión gzip/brotli de respuestas grandes
+    from utils.compresion import init_app as init_compresion
+    init_compresion(app)
+
     # Registrar los blueprints
     from blueprints.usuarios import usuarios_bp
     from blueprints.actividades import actividades_bp
@@ -116,7 +128,37 @@ def create_app():
             return {"status": "success", "config": config_info}, 200
         except Exception as e:
             return {"status": "error", "message": str(e)}, 500
-    
+
+    # Endpoint de métricas internas para debug
+    @root_bp.route('/metricas', methods=['GET'])
+    def show_metrics():
+        try:
+            from utils.db import get_pool_stats
+            from utils.sucursal import get_sucursal_cache_stats
+            from utils.catalogos import get_catalogo_cache_stats
+            from utils.compresion import get_compresion_stats
+            from utils.claves import get_claves_stats
+            from utils.usuario_actual import get_usuario_actual_stats
+            from utils.jerarquias import get_jerarquias_stats
+            from utils.rollups import get_rollups_stats
+            from utils.resultados import get_resultados_stats
+            from utils.coalescencia import get_coalescencia_stats
+            return {
+                "status": "success",
+                "pool": get_pool_stats(),
+                "cache_sucursal_activa": get_sucursal_cache_stats(),
+                "cache_catalogos": get_catalogo_cache_stats(),
+                "compresion": get_compresion_stats(),
+                "claves": get_claves_stats(),
+                "usuario_actual": get_usuario_actual_stats(),
+                "jerarquias": get_jerarquias_stats(),
+                "rollups": get_rollups_stats(),
+                "cache_indicadores": get_resultados_stats(),
+                "coalescencia": get_coalescencia_stats()
+            }, 200
+        except Exception as e:
+            return {"status": "error", "message": str(e)}, 500
+
     # Registrar el blueprint raíz
     app.register_blueprint(root_bp, url_prefix="/api")
 
@@ -0,0 +1,88 @@
+"""
+Compara la serialización de listas grandes de actividades:
+- antes: conversión fila por fila (fecha/timedelta/Decimal) + jsonify estándar
+- ahora: ProveedorJSON directo sobre las filas del cursor
+
+Uso: python benchmarks/bench_json.py [cantidad_filas] [repeticiones]
+"""
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from utils.json_provider import ProveedorJSON, orjson  # noqa: E402
+
+
+def generar_filas(cantidad):
+    return [{
+        'id': f'0190a1b2-c3d4-7e5f-8a6b-{i:012d}',
+        'fecha': date(2025, 7, 1) + timedelta(days=i % 30),
+        'hora_inicio': timedelta(hours=8),
+        'hora_fin': timedelta(hours=17, minutes=30),
+        'tarifa': Decimal('12500.00'),
+        'id_estadoactividad': 1,
+        'id_labor': i % 40,
+        'id_unidad': 1,
+        'nombre_labor': 'Poda en verde',
+        'nombre_unidad': 'Jornada',
+        'nombre_tipotrabajador': 'Propio',
+        'nombre_tiporendimiento': 'Individual',
+        'nombre_tipoceco': 'Productivo',
+        'nombre_estado': 'Creada',
+        'nombre_contratista': None,
+        'tiene_rendimientos': 1,
+    } for i in range(cantidad)]
+
+
+def convertir_filas(filas):
+    """Conversión manual que hacían los endpoints antes del proveedor."""
+    for fila in filas:
+        if isinstance(fila['fecha'], (date, datetime)):
+            fila['fecha'] = fila['fecha'].strftime('%Y-%m-%d')
+        if isinstance(fila['hora_inicio'], timedelta):
+            fila['hora_inicio'] = str(fila['hora_inicio'])
+        if isinstance(fila['hora_fin'], timedelta):
+            fila['hora_fin'] = str(fila['hora_fin'])
+        if isinstance(fila['tarifa'], Decimal):
+            fila['tarifa'] = float(fila['tarifa'])
+    return filas
+
+
+def medir(nombre, funcion, repeticiones):
+    mejor = float('inf')
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        tamano = len(funcion())
+        mejor = min(mejor, time.perf_counter() - inicio)
+    print(f"{nombre:<32} {mejor * 1000:9.2f} ms  {tamano / 1024:9.1f} KiB")
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    app_anterior = Flask('anterior')
+    app_anterior.json = DefaultJSONProvider(app_anterior)
+    app_nueva = Flask('nueva')
+    app_nueva.json = ProveedorJSON(app_nueva)
+
+    print(f"{cantidad} filas, mejor de {repeticiones} (orjson: {'sí' if orjson else 'no'})")
+    with app_anterior.app_context():
+        medir('jsonify + conversión por fila',
+              lambda: app_anterior.json.response(convertir_filas(generar_filas(cantidad))).get_data(),
+              repeticiones)
+    with app_nueva.app_context():
+        medir('ProveedorJSON',
+              lambda: app_nueva.json.response(generar_filas(cantidad)).get_data(),
+              repeticiones)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Compara modos de gunicorn (sync de un hilo, gthread con la configuración
+de gunicorn.conf.py y gevent si está instalado) con carga concurrente sobre
+endpoints reales contra una MySQL local (variables DB_* / DATABASE_URL).
+
+Para cada modo levanta gunicorn, envía peticiones desde `concurrencia`
+clientes con keep-alive durante `duracion` segundos y reporta peticiones
+por segundo, p50, p99, errores y reconexiones (keep-alive cerrado al
+reciclar un worker).
+
+Uso:
+    python benchmarks/bench_servidor.py --usuario <id_usuario> \\
+        [--rutas /api/opciones/ /api/colaboradores] [--concurrencia 80] \\
+        [--duracion 20] [--modos sync gthread gevent] [--puerto 8090]
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Variables de entorno de cada modo; el resto sale de gunicorn.conf.py
+MODOS = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_THREADS': '1'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent'},
+}
+
+
+def crear_token(usuario):
+    """Token con los mismos claims que emite /api/auth/login (rol, perfil, sucursal y versión)."""
+    from app import app
+    from utils.db import get_db_connection
+    from utils.usuario_actual import crear_token_acceso
+    with app.test_request_context():
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT u.id, u.id_rol, u.id_perfil, u.id_sucursalactiva, s.nombre AS sucursal_nombre
+            FROM general_dim_usuario u
+            LEFT JOIN general_dim_sucursal s ON u.id_sucursalactiva = s.id
+            WHERE u.id = %s
+        """, (usuario,))
+        user = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        if not user:
+            raise SystemExit(f"Usuario {usuario} no encontrado en la BD")
+        return crear_token_acceso(
+            user['id'], user['id_rol'], user['id_perfil'], user['id_sucursalactiva'], user['sucursal_nombre']
+        )
+
+
+def esperar_puerto(puerto, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn no respondió en el puerto {puerto}")
+
+
+def cliente(puerto, rutas, token, hasta, latencias, errores, reconexiones):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+    encabezados = {'Authorization': f'Bearer {token}', 'Accept-Encoding': 'gzip'}
+    i = 0
+    while time.monotonic() < hasta:
+        ruta = rutas[i % len(rutas)]
+        i += 1
+        inicio = time.perf_counter()
+        for intento in range(2):
+            try:
+                conexion.request('GET', ruta, headers=encabezados)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status >= 500:
+                    errores.append(respuesta.status)
+                latencias.append(time.perf_counter() - inicio)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conexion.close()
+                conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+                # Un worker reciclado (max_requests) cierra las conexiones
+                # keep-alive: como cualquier cliente HTTP, se reintenta una vez
+                if intento == 0 and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError)):
+                    reconexiones.append(ruta)
+                    continue
+                errores.append(type(e).__name__)
+                break
+    conexion.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def medir(modo, args, token):
+    entorno = dict(os.environ, PORT=str(args.puerto), GUNICORN_ACCESSLOG='', **MODOS[modo])
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        esperar_puerto(args.puerto)
+        # Calentar: pool de conexiones y cachés
+        calentar = []
+        cliente(args.puerto, args.rutas, token, time.monotonic() + 2, calentar, [], [])
+
+        latencias, errores, reconexiones = [], [], []
+        hasta = time.monotonic() + args.duracion
+        hilos = [threading.Thread(target=cliente, args=(args.puerto, args.rutas, token, hasta, latencias, errores, reconexiones))
+                 for _ in range(args.concurrencia)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+
+    latencias.sort()
+    print(f"{modo:<8} {len(latencias) / args.duracion:10.1f} req/s"
+          f"  p50 {percentil(latencias, 50) * 1000:8.1f} ms"
+          f"  p99 {percentil(latencias, 99) * 1000:8.1f} ms"
+          f"  errores {len(errores)}  reconexiones {len(reconexiones)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuario', required=True, help='id de un usuario existente en la BD local')
+    parser.add_argument('--rutas', nargs='+', default=['/api/opciones/', '/api/colaboradores'])
+    parser.add_argument('--concurrencia', type=int, default=80)  # containerConcurrency de service.yaml
+    parser.add_argument('--duracion', type=int, default=20)
+    parser.add_argument('--modos', nargs='+', default=list(MODOS), choices=list(MODOS))
+    parser.add_argument('--puerto', type=int, default=8090)
+    args = parser.parse_args()
+
+    token = crear_token(args.usuario)
+    print(f"{args.concurrencia} clientes, {args.duracion} s por modo, rutas: {' '.join(args.rutas)}")
+    for modo in args.modos:
+        if modo == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print("gevent   (no instalado, se omite)")
+            continue
+        medir(modo, args, token)
+
+
+if __name__ == '__main__':
+    main()
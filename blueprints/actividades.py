@@ -1,12 +1,25 @@
 import datetime
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.calendario import horas_dia_empresa
+from utils.cecos import agregar_cecos
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
+from utils.rollups import marcar_rollup
+from utils.sincronizacion import SinceInvalido, consultar_cambios, filtro_ids, obtener_since, registrar_cambio, respuesta_delta
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, date, timedelta, time
 
 
 actividades_bp = Blueprint('actividades_bp', __name__)
 
+# Orden para paginar las actividades por sucursal (?limit=&cursor=)
+ORDEN_ACTIVIDADES_SUCURSAL = [
+    Columna('a.fecha', 'fecha', descendente=True),
+    Columna('a.id', 'id', descendente=True),
+]
+
 def calcular_horario_fin(fecha_actividad, id_empresa):
     """
     Calcula el horario de fin de una actividad basándose en las horas por día de la empresa.
@@ -19,29 +32,11 @@ def calcular_horario_fin(fecha_actividad, id_empresa):
         time: Horario de fin calculado
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Obtener el día de la semana (0=lunes, 6=domingo)
-        dia_semana = fecha_actividad.weekday()
-        
-        # Mapear día de la semana a nombre
-        dias_semana = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-        nombre_dia = dias_semana[dia_semana]
-        
-        # Obtener las horas por día de la empresa
-        cursor.execute("""
-            SELECT horas_dia 
-            FROM tarja_dim_horaspordia 
-            WHERE id_empresa = %s AND nombre_dia = %s
-        """, (id_empresa, nombre_dia))
-        
-        resultado = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # Obtener las horas por día de la empresa (calendario en caché)
+        horas_dia = horas_dia_empresa(id_empresa, fecha_actividad)
         
-        if resultado:
-            horas_dia = float(resultado['horas_dia'])
+        if horas_dia is not None:
+            horas_dia = float(horas_dia)
         else:
             # Si no se encuentra configuración, usar 9 horas por defecto
             horas_dia = 9.0
@@ -62,6 +57,9 @@ def calcular_horario_fin(fecha_actividad, id_empresa):
 @jwt_required()
 def obtener_actividades_por_sucursal(id_sucursal):
     try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
+        pagina = None if since else obtener_pagina(ORDEN_ACTIVIDADES_SUCURSAL)
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
@@ -94,27 +92,38 @@ def obtener_actividades_por_sucursal(id_sucursal):
             WHERE a.id_sucursalactiva = %s
             AND (a.id_estadoactividad = 1 OR a.id_estadoactividad = 2)  -- 1: creada, 2: revisada
             AND a.id_tiporendimiento != 3  -- Excluir actividades múltiples
-            GROUP BY a.id
-            ORDER BY a.fecha DESC
         """
+        params = [id_sucursal]
+
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'tarja_fact_actividad', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('a.id', ids_cambiados)
+            sql += filtro
+            params += params_filtro
+        if pagina:
+            sql += pagina.condicion
+            params += pagina.params
+        sql += " GROUP BY a.id"
+        if pagina:
+            sql += pagina.orden_sql
+            params += pagina.params_limite
+        else:
+            sql += " ORDER BY a.fecha DESC"
 
-        cursor.execute(sql, (id_sucursal,))
+        cursor.execute(sql, tuple(params))
         actividades = cursor.fetchall()
 
-        for actividad in actividades:
-            if 'fecha' in actividad and isinstance(actividad['fecha'], (date, datetime)):
-                actividad['fecha'] = actividad['fecha'].strftime('%Y-%m-%d')
-
-            if isinstance(actividad['hora_inicio'], timedelta):
-                actividad['hora_inicio'] = str(actividad['hora_inicio'])
-            if isinstance(actividad['hora_fin'], timedelta):
-                actividad['hora_fin'] = str(actividad['hora_fin'])
-
         cursor.close()
         conn.close()
 
+        if since:
+            return jsonify(respuesta_delta(actividades, ids_cambiados, token)), 200
+        if pagina:
+            return jsonify(pagina.responder(actividades)), 200
         return jsonify(actividades), 200
 
+    except (PaginacionInvalida, SinceInvalido) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -128,13 +137,11 @@ def obtener_actividades():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener actividades del usuario SOLO de la sucursal activa y en estado 'creada'
         cursor.execute("""
@@ -147,17 +154,7 @@ def obtener_actividades():
                 tr.nombre as nombre_tiporendimiento,
                 tc.nombre as nombre_tipoceco,
                 ea.nombre as nombre_estado,
-                s.nombre as nombre_sucursal,
-                -- CECOs Productivos
-                GROUP_CONCAT(DISTINCT CONCAT(cp.id_ceco, ':', ce.nombre) SEPARATOR '|') as cecos_productivos,
-                -- CECOs de Inversión
-                GROUP_CONCAT(DISTINCT CONCAT(ci.id_ceco, ':', cei.nombre) SEPARATOR '|') as cecos_inversion,
-                -- CECOs de Maquinaria
-                GROUP_CONCAT(DISTINCT CONCAT(cm.id_ceco, ':', cem.nombre) SEPARATOR '|') as cecos_maquinaria,
-                -- CECOs de Riego
-                GROUP_CONCAT(DISTINCT CONCAT(cr.id_ceco, ':', cer.nombre) SEPARATOR '|') as cecos_riego,
-                -- CECOs Administrativos
-                GROUP_CONCAT(DISTINCT CONCAT(ca.id_ceco, ':', cea.nombre) SEPARATOR '|') as cecos_administrativos
+                s.nombre as nombre_sucursal
             FROM tarja_fact_actividad a
             LEFT JOIN general_dim_labor l ON a.id_labor = l.id
             LEFT JOIN tarja_dim_unidad u ON a.id_unidad = u.id
@@ -167,84 +164,17 @@ def obtener_actividades():
             LEFT JOIN general_dim_cecotipo tc ON a.id_tipoceco = tc.id
             LEFT JOIN tarja_dim_estadoactividad ea ON a.id_estadoactividad = ea.id
             LEFT JOIN general_dim_sucursal s ON a.id_sucursalactiva = s.id
-            -- Joins para CECOs Productivos
-            LEFT JOIN tarja_fact_cecoproductivo cp ON a.id = cp.id_actividad
-            LEFT JOIN general_dim_ceco ce ON cp.id_ceco = ce.id
-            -- Joins para CECOs de Inversión
-            LEFT JOIN tarja_fact_cecoinversion ci ON a.id = ci.id_actividad
-            LEFT JOIN general_dim_ceco cei ON ci.id_ceco = cei.id
-            -- Joins para CECOs de Maquinaria
-            LEFT JOIN tarja_fact_cecomaquinaria cm ON a.id = cm.id_actividad
-            LEFT JOIN general_dim_ceco cem ON cm.id_ceco = cem.id
-            -- Joins para CECOs de Riego
-            LEFT JOIN tarja_fact_cecoriego cr ON a.id = cr.id_actividad
-            LEFT JOIN general_dim_ceco cer ON cr.id_ceco = cer.id
-            -- Joins para CECOs Administrativos
-            LEFT JOIN tarja_fact_cecoadministrativo ca ON a.id = ca.id_actividad
-            LEFT JOIN general_dim_ceco cea ON ca.id_ceco = cea.id
             WHERE a.id_usuario = %s AND a.id_sucursalactiva = %s AND a.id_estadoactividad = 1
             AND a.id_tiporendimiento != 3  -- Excluir actividades múltiples
-            GROUP BY a.id
             ORDER BY l.nombre ASC, a.fecha DESC, a.hora_inicio DESC
         """, (usuario_id, id_sucursal))
-
         actividades = cursor.fetchall()
+
+        # CECOs de cada familia: una consulta por familia para todas las actividades
+        agregar_cecos(cursor, actividades)
         cursor.close()
         conn.close()
 
-        if not actividades:
-            return jsonify([]), 200
-
-        # Convertir timedelta a string para hora_inicio y hora_fin
-        for actividad in actividades:
-            if isinstance(actividad['hora_inicio'], timedelta):
-                actividad['hora_inicio'] = str(actividad['hora_inicio'])
-            if isinstance(actividad['hora_fin'], timedelta):
-                actividad['hora_fin'] = str(actividad['hora_fin'])
-            if isinstance(actividad['fecha'], (date, datetime)):
-                actividad['fecha'] = actividad['fecha'].strftime('%Y-%m-%d')
-
-            # Convertir los CECOs concatenados en arrays de objetos
-            if actividad['cecos_productivos']:
-                actividad['cecos_productivos'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_productivos'].split('|')
-                ]
-            else:
-                actividad['cecos_productivos'] = []
-
-            if actividad['cecos_inversion']:
-                actividad['cecos_inversion'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_inversion'].split('|')
-                ]
-            else:
-                actividad['cecos_inversion'] = []
-
-            if actividad['cecos_maquinaria']:
-                actividad['cecos_maquinaria'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_maquinaria'].split('|')
-                ]
-            else:
-                actividad['cecos_maquinaria'] = []
-
-            if actividad['cecos_riego']:
-                actividad['cecos_riego'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_riego'].split('|')
-                ]
-            else:
-                actividad['cecos_riego'] = []
-
-            if actividad['cecos_administrativos']:
-                actividad['cecos_administrativos'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_administrativos'].split('|')
-                ]
-            else:
-                actividad['cecos_administrativos'] = []
-
         return jsonify(actividades), 200
 
     except Exception as e:
@@ -323,8 +253,7 @@ def crear_actividad():
 
         # Generar ID único para la actividad
         cursor2 = conn.cursor()
-        cursor2.execute("SELECT UUID()")
-        id_actividad = cursor2.fetchone()[0]
+        id_actividad = generar_id()
 
         # Insertar la actividad
         cursor2.execute("""
@@ -351,14 +280,15 @@ def crear_actividad():
         ))
 
         # Insertar el estado inicial en tarja_pivot_actividadestado
-        cursor2.execute("SELECT UUID()")
-        id_estado = cursor2.fetchone()[0]
+        id_estado = generar_id()
         
         cursor2.execute("""
             INSERT INTO tarja_pivot_actividadestado (
                 id, id_actividad, id_estadoactividad, fecha_hora
             ) VALUES (%s, %s, %s, CONVERT_TZ(NOW(), '+00:00', '-03:00'))
         """, (id_estado, id_actividad, 1))  # 1 = Estado "Creada"
+
+        registrar_cambio(cursor2, 'tarja_fact_actividad', id_actividad, id_sucursalactiva)
         
         conn.commit()
         cursor.close()
@@ -440,10 +370,15 @@ def editar_actividad(actividad_id):
                   id_contratista, id_tiporendimiento, hora_inicio,
                   hora_fin, id_estadoactividad, tarifa, id_tipoceco, actividad_id, usuario_id)
 
+        # Si cambia la fecha, el día anterior también queda pendiente en los rollups
+        marcar_rollup(cursor, 'tarja_fact_actividad', actividad_id)
         cursor.execute(sql, valores)
+        actualizadas = cursor.rowcount
+        if actualizadas:
+            registrar_cambio(cursor, 'tarja_fact_actividad', actividad_id)
         conn.commit()
 
-        if cursor.rowcount == 0:
+        if actualizadas == 0:
             cursor.close()
             conn.close()
             return jsonify({"error": "Actividad no encontrada o no tienes permiso para editarla"}), 404
@@ -466,12 +401,13 @@ def eliminar_actividad(actividad_id):
         cursor = conn.cursor()
         # Verificar que la actividad existe y pertenece al usuario
         cursor.execute("""
-            SELECT id FROM tarja_fact_actividad 
+            SELECT id, id_sucursalactiva FROM tarja_fact_actividad 
             WHERE id = %s AND id_usuario = %s 
             AND id_tiporendimiento != 3
         """, (actividad_id, usuario_id))
+        actividad = cursor.fetchone()
         
-        if not cursor.fetchone():
+        if not actividad:
             cursor.close()
             conn.close()
             return jsonify({"error": "Actividad no encontrada o no tienes permiso para eliminarla"}), 404
@@ -480,10 +416,16 @@ def eliminar_actividad(actividad_id):
         # Eliminar estados de actividad
         cursor.execute("DELETE FROM tarja_pivot_actividadestado WHERE id_actividad = %s", (actividad_id,))
         
+        # El día de la actividad queda pendiente en los rollups (antes de borrarla)
+        marcar_rollup(cursor, 'tarja_fact_actividad', actividad_id)
+
         # Finalmente eliminar la actividad
         cursor.execute("DELETE FROM tarja_fact_actividad WHERE id = %s", (actividad_id,))
+        eliminadas = cursor.rowcount
+        if eliminadas:
+            registrar_cambio(cursor, 'tarja_fact_actividad', actividad_id, actividad[1], eliminado=True)
         conn.commit()
-        if cursor.rowcount == 0:
+        if eliminadas == 0:
             cursor.close()
             conn.close()
             return jsonify({"error": "Actividad no encontrada o no tienes permiso para eliminarla"}), 404
@@ -1,6 +1,14 @@
 import datetime
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.calendario import horas_dia_empresa
+from utils.cecos import agregar_cecos
+from utils.consultas import marcadores, agrupar_por
+from utils.rollups import marcar_rollup
+from utils.sincronizacion import registrar_cambio
+from utils.jerarquias import topologia_riego
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, date, timedelta, time
 
@@ -19,29 +27,11 @@ def calcular_horario_fin(fecha_actividad, id_empresa):
         time: Horario de fin calculado
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Obtener el día de la semana (0=lunes, 6=domingo)
-        dia_semana = fecha_actividad.weekday()
-        
-        # Mapear día de la semana a nombre
-        dias_semana = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-        nombre_dia = dias_semana[dia_semana]
+        # Obtener las horas por día de la empresa (calendario en caché)
+        horas_dia = horas_dia_empresa(id_empresa, fecha_actividad)
         
-        # Obtener las horas por día de la empresa
-        cursor.execute("""
-            SELECT horas_dia 
-            FROM tarja_dim_horaspordia 
-            WHERE id_empresa = %s AND nombre_dia = %s
-        """, (id_empresa, nombre_dia))
-        
-        resultado = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if resultado:
-            horas_dia = float(resultado['horas_dia'])
+        if horas_dia is not None:
+            horas_dia = float(horas_dia)
         else:
             # Si no se encuentra configuración, usar 9 horas por defecto
             horas_dia = 9.0
@@ -99,15 +89,6 @@ def obtener_actividades_multiples_por_sucursal(id_sucursal):
         cursor.execute(sql, (id_sucursal,))
         actividades = cursor.fetchall()
 
-        for actividad in actividades:
-            if 'fecha' in actividad and isinstance(actividad['fecha'], (date, datetime)):
-                actividad['fecha'] = actividad['fecha'].strftime('%Y-%m-%d')
-
-            if isinstance(actividad['hora_inicio'], timedelta):
-                actividad['hora_inicio'] = str(actividad['hora_inicio'])
-            if isinstance(actividad['hora_fin'], timedelta):
-                actividad['hora_fin'] = str(actividad['hora_fin'])
-
         cursor.close()
         conn.close()
 
@@ -126,13 +107,11 @@ def obtener_actividades_multiples():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener actividades múltiples del usuario con valores fijos (solo CECOs productivos y riego)
         cursor.execute("""
@@ -144,11 +123,7 @@ def obtener_actividades_multiples():
                 tr.nombre as nombre_tiporendimiento,
                 tc.nombre as nombre_tipoceco,
                 ea.nombre as nombre_estado,
-                s.nombre as nombre_sucursal,
-                -- CECOs Productivos
-                GROUP_CONCAT(DISTINCT CONCAT(cp.id_ceco, ':', ce.nombre) SEPARATOR '|') as cecos_productivos,
-                -- CECOs de Riego
-                GROUP_CONCAT(DISTINCT CONCAT(cr.id_ceco, ':', cer.nombre) SEPARATOR '|') as cecos_riego
+                s.nombre as nombre_sucursal
             FROM tarja_fact_actividad a
             LEFT JOIN general_dim_labor l ON a.id_labor = l.id
             LEFT JOIN tarja_dim_unidad u ON a.id_unidad = u.id
@@ -157,58 +132,20 @@ def obtener_actividades_multiples():
             LEFT JOIN general_dim_cecotipo tc ON a.id_tipoceco = tc.id
             LEFT JOIN tarja_dim_estadoactividad ea ON a.id_estadoactividad = ea.id
             LEFT JOIN general_dim_sucursal s ON a.id_sucursalactiva = s.id
-            -- Joins para CECOs Productivos
-            LEFT JOIN tarja_fact_cecoproductivo cp ON a.id = cp.id_actividad
-            LEFT JOIN general_dim_ceco ce ON cp.id_ceco = ce.id
-            -- Joins para CECOs de Riego
-            LEFT JOIN tarja_fact_cecoriego cr ON a.id = cr.id_actividad
-            LEFT JOIN general_dim_ceco cer ON cr.id_ceco = cer.id
             WHERE a.id_usuario = %s 
             AND a.id_sucursalactiva = %s 
             AND a.id_estadoactividad = 1
             AND a.id_tiporendimiento = 3  -- MÚLTIPLE
-            GROUP BY a.id
             ORDER BY l.nombre ASC, a.fecha DESC, a.hora_inicio DESC
         """, (usuario_id, id_sucursal))
-
         actividades = cursor.fetchall()
+
+        # Solo CECOs productivos y de riego; el resto de las familias no aplica
+        # en actividades múltiples y queda como lista vacía
+        agregar_cecos(cursor, actividades, ('cecos_productivos', 'cecos_riego'))
         cursor.close()
         conn.close()
 
-        if not actividades:
-            return jsonify([]), 200
-
-        # Convertir timedelta a string para hora_inicio y hora_fin
-        for actividad in actividades:
-            if isinstance(actividad['hora_inicio'], timedelta):
-                actividad['hora_inicio'] = str(actividad['hora_inicio'])
-            if isinstance(actividad['hora_fin'], timedelta):
-                actividad['hora_fin'] = str(actividad['hora_fin'])
-            if isinstance(actividad['fecha'], (date, datetime)):
-                actividad['fecha'] = actividad['fecha'].strftime('%Y-%m-%d')
-
-            # Convertir los CECOs concatenados en arrays de objetos (solo productivos y riego)
-            if actividad['cecos_productivos']:
-                actividad['cecos_productivos'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_productivos'].split('|')
-                ]
-            else:
-                actividad['cecos_productivos'] = []
-
-            if actividad['cecos_riego']:
-                actividad['cecos_riego'] = [
-                    {'id': int(x.split(':')[0]), 'nombre': x.split(':')[1]} 
-                    for x in actividad['cecos_riego'].split('|')
-                ]
-            else:
-                actividad['cecos_riego'] = []
-
-            # Inicializar arrays vacíos para CECOs que no aplican en actividades múltiples
-            actividad['cecos_inversion'] = []
-            actividad['cecos_maquinaria'] = []
-            actividad['cecos_administrativos'] = []
-
         return jsonify(actividades), 200
 
     except Exception as e:
@@ -297,8 +234,7 @@ def crear_actividad_multiple():
 
         # Generar ID único para la actividad
         cursor2 = conn.cursor()
-        cursor2.execute("SELECT UUID()")
-        id_actividad = cursor2.fetchone()[0]
+        id_actividad = generar_id()
 
         # Insertar la actividad
         cursor2.execute("""
@@ -325,14 +261,15 @@ def crear_actividad_multiple():
         ))
 
         # Insertar el estado inicial en tarja_pivot_actividadestado
-        cursor2.execute("SELECT UUID()")
-        id_estado = cursor2.fetchone()[0]
+        id_estado = generar_id()
         
         cursor2.execute("""
             INSERT INTO tarja_pivot_actividadestado (
                 id, id_actividad, id_estadoactividad, fecha_hora
             ) VALUES (%s, %s, %s, CONVERT_TZ(NOW(), '+00:00', '-03:00'))
         """, (id_estado, id_actividad, 1))  # 1 = Estado "Creada"
+
+        registrar_cambio(cursor2, 'tarja_fact_actividad', id_actividad, id_sucursalactiva)
         
         conn.commit()
         cursor.close()
@@ -373,6 +310,8 @@ def editar_actividad_multiple(actividad_id):
             if campo not in data or data[campo] in [None, '']:
                 return jsonify({"error": f"El campo {campo} es requerido"}), 400
 
+        conn = get_db_connection()
+
         # Obtener empresa para calcular horarios sugeridos
         cursor_empresa = conn.cursor(dictionary=True)
         cursor_empresa.execute("""
@@ -385,7 +324,6 @@ def editar_actividad_multiple(actividad_id):
         cursor_empresa.close()
         
         if not empresa or not empresa['id_empresa']:
-            cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró empresa para el usuario"}), 400
         
@@ -432,7 +370,6 @@ def editar_actividad_multiple(actividad_id):
         id_estadoactividad = data.get('id_estadoactividad')
         tarifa = data.get('tarifa')
 
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # Verificar que la actividad pertenece al usuario y es una actividad múltiple
@@ -468,10 +405,15 @@ def editar_actividad_multiple(actividad_id):
                   hora_fin, id_estadoactividad, tarifa, id_tipoceco, 
                   actividad_id, usuario_id)
 
+        # Si cambia la fecha, el día anterior también queda pendiente en los rollups
+        marcar_rollup(cursor, 'tarja_fact_actividad', actividad_id)
         cursor.execute(sql, valores)
+        actualizadas = cursor.rowcount
+        if actualizadas:
+            registrar_cambio(cursor, 'tarja_fact_actividad', actividad_id)
         conn.commit()
 
-        if cursor.rowcount == 0:
+        if actualizadas == 0:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se pudo actualizar la actividad múltiple"}), 404
@@ -503,14 +445,15 @@ def eliminar_actividad_multiple(actividad_id):
         
         # Verificar que la actividad existe y pertenece al usuario
         cursor.execute("""
-            SELECT id FROM tarja_fact_actividad 
+            SELECT id, id_sucursalactiva FROM tarja_fact_actividad 
             WHERE id = %s AND id_usuario = %s
             AND id_tipotrabajador = 1 
             AND id_contratista IS NULL 
             AND id_tiporendimiento = 3
         """, (actividad_id, usuario_id))
+        actividad = cursor.fetchone()
         
-        if not cursor.fetchone():
+        if not actividad:
             cursor.close()
             conn.close()
             return jsonify({"error": "Actividad múltiple no encontrada o no tienes permiso para eliminarla"}), 404
@@ -525,11 +468,17 @@ def eliminar_actividad_multiple(actividad_id):
         # Eliminar CECOs productivos (se eliminan automáticamente por CASCADE, pero por seguridad)
         cursor.execute("DELETE FROM tarja_fact_cecoproductivo WHERE id_actividad = %s", (actividad_id,))
         
+        # El día de la actividad queda pendiente en los rollups (antes de borrarla)
+        marcar_rollup(cursor, 'tarja_fact_actividad', actividad_id)
+
         # Finalmente eliminar la actividad
         cursor.execute("DELETE FROM tarja_fact_actividad WHERE id = %s", (actividad_id,))
+        eliminadas = cursor.rowcount
+        if eliminadas:
+            registrar_cambio(cursor, 'tarja_fact_actividad', actividad_id, actividad[1], eliminado=True)
         
         conn.commit()
-        if cursor.rowcount == 0:
+        if eliminadas == 0:
             cursor.close()
             conn.close()
             return jsonify({"error": "Actividad múltiple no encontrada o no tienes permiso para eliminarla"}), 404
@@ -650,40 +599,15 @@ def crear_ceco_riego():
 def obtener_sectores_riego():
     try:
         usuario_id = get_jwt_identity()
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
-
-        # Obtener sectores de riego con información completa filtrados por sucursal
-        cursor.execute("""
-            SELECT 
-                s.id as id_sectorriego,
-                s.nombre as nombre_sector,
-                s.id_ceco,
-                c.nombre as nombre_ceco,
-                s.id_equipo,
-                e.nombre as nombre_equipo,
-                e.id_caseta,
-                ca.nombre as nombre_caseta
-            FROM riego_dim_sector s
-            LEFT JOIN general_dim_ceco c ON s.id_ceco = c.id
-            LEFT JOIN riego_dim_equipo e ON s.id_equipo = e.id
-            LEFT JOIN general_dim_maquinaria ca ON e.id_caseta = ca.id
-            WHERE c.id_sucursal = %s AND c.id_estado = 1
-            ORDER BY s.nombre ASC
-        """, (id_sucursal,))
 
-        sectores = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # Sectores de riego con información completa filtrados por sucursal,
+        # desde el índice de topología de riego compartido con opciones
+        sectores = topologia_riego.obtener(id_sucursal)["sectores_ceco_sucursal"]
 
         return jsonify(sectores), 200
 
@@ -849,13 +773,11 @@ def obtener_cuarteles_productivos():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener cuarteles productivos con información completa filtrados por sucursal
         cursor.execute("""
@@ -970,55 +892,47 @@ def crear_ceco_productivo_multiple():
 
         registros_creados = []
         registros_existentes = []
+        en_cuarteles = marcadores(id_cuarteles)
 
+        # Obtener información de todos los cuarteles (solo con CECO existente)
+        cursor.execute(f"""
+            SELECT 
+                c.id,
+                c.id_ceco,
+                v.id_especie,
+                c.id_variedad
+            FROM general_dim_cuartel c
+            LEFT JOIN general_dim_variedad v ON c.id_variedad = v.id
+            JOIN general_dim_ceco ce ON c.id_ceco = ce.id
+            WHERE c.id IN ({en_cuarteles})
+        """, id_cuarteles)
+        cuarteles_info = {str(fila['id']): fila for fila in cursor.fetchall()}
+
+        # Cuarteles ya registrados en la actividad
+        cursor.execute(f"""
+            SELECT id_cuartel FROM tarja_fact_cecoproductivo 
+            WHERE id_actividad = %s AND id_cuartel IN ({en_cuarteles})
+        """, [id_actividad] + id_cuarteles)
+        cuarteles_registrados = {str(fila['id_cuartel']) for fila in cursor.fetchall()}
+
+        nuevos = []
         for id_cuartel in id_cuarteles:
-            # Obtener información del cuartel
-            cursor.execute("""
-                SELECT 
-                    c.id_ceco,
-                    v.id_especie,
-                    c.id_variedad
-                FROM general_dim_cuartel c
-                LEFT JOIN general_dim_variedad v ON c.id_variedad = v.id
-                WHERE c.id = %s
-            """, (id_cuartel,))
-            
-            cuartel_info = cursor.fetchone()
+            cuartel_info = cuarteles_info.get(str(id_cuartel))
             if not cuartel_info:
                 continue
 
-            # Verificar que el CECO sea de tipo productivo
-            cursor.execute("""
-                SELECT id FROM general_dim_ceco 
-                WHERE id = %s
-            """, (cuartel_info['id_ceco'],))
-            
-            if not cursor.fetchone():
-                continue
-
-            # Verificar si ya existe el registro
-            cursor.execute("""
-                SELECT id FROM tarja_fact_cecoproductivo 
-                WHERE id_actividad = %s AND id_cuartel = %s
-            """, (id_actividad, id_cuartel))
-            
-            if cursor.fetchone():
+            if str(id_cuartel) in cuarteles_registrados:
                 registros_existentes.append(id_cuartel)
                 continue
+            cuarteles_registrados.add(str(id_cuartel))
 
-            # Insertar el registro
-            cursor.execute("""
-                INSERT INTO tarja_fact_cecoproductivo (
-                    id_actividad, id_especie, id_variedad, id_cuartel, id_ceco
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, (
+            nuevos.append((
                 id_actividad,
                 cuartel_info['id_especie'],
                 cuartel_info['id_variedad'],
                 id_cuartel,
                 cuartel_info['id_ceco']
             ))
-
             registros_creados.append({
                 "id_cuartel": id_cuartel,
                 "id_especie": cuartel_info['id_especie'],
@@ -1026,6 +940,14 @@ def crear_ceco_productivo_multiple():
                 "id_ceco": cuartel_info['id_ceco']
             })
 
+        # Insertar todos los registros nuevos de una vez
+        if nuevos:
+            cursor.executemany("""
+                INSERT INTO tarja_fact_cecoproductivo (
+                    id_actividad, id_especie, id_variedad, id_cuartel, id_ceco
+                ) VALUES (%s, %s, %s, %s, %s)
+            """, nuevos)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -1082,55 +1004,47 @@ def crear_ceco_riego_multiple():
 
         registros_creados = []
         registros_existentes = []
+        en_sectores = marcadores(id_sectoresriego)
 
+        # Obtener información de todos los sectores de riego (solo con CECO existente)
+        cursor.execute(f"""
+            SELECT 
+                s.id,
+                s.id_ceco,
+                s.id_equipo,
+                e.id_caseta
+            FROM riego_dim_sector s
+            LEFT JOIN riego_dim_equipo e ON s.id_equipo = e.id
+            JOIN general_dim_ceco ce ON s.id_ceco = ce.id
+            WHERE s.id IN ({en_sectores})
+        """, id_sectoresriego)
+        sectores_info = {str(fila['id']): fila for fila in cursor.fetchall()}
+
+        # Sectores ya registrados en la actividad
+        cursor.execute(f"""
+            SELECT id_sectorriego FROM tarja_fact_cecoriego 
+            WHERE id_actividad = %s AND id_sectorriego IN ({en_sectores})
+        """, [id_actividad] + id_sectoresriego)
+        sectores_registrados = {str(fila['id_sectorriego']) for fila in cursor.fetchall()}
+
+        nuevos = []
         for id_sectorriego in id_sectoresriego:
-            # Obtener información del sector de riego
-            cursor.execute("""
-                SELECT 
-                    s.id_ceco,
-                    s.id_equipo,
-                    e.id_caseta
-                FROM riego_dim_sector s
-                LEFT JOIN riego_dim_equipo e ON s.id_equipo = e.id
-                WHERE s.id = %s
-            """, (id_sectorriego,))
-            
-            sector_info = cursor.fetchone()
+            sector_info = sectores_info.get(str(id_sectorriego))
             if not sector_info:
                 continue
 
-            # Verificar que el CECO sea de tipo riego
-            cursor.execute("""
-                SELECT id FROM general_dim_ceco 
-                WHERE id = %s
-            """, (sector_info['id_ceco'],))
-            
-            if not cursor.fetchone():
-                continue
-
-            # Verificar si ya existe el registro
-            cursor.execute("""
-                SELECT id FROM tarja_fact_cecoriego 
-                WHERE id_actividad = %s AND id_sectorriego = %s
-            """, (id_actividad, id_sectorriego))
-            
-            if cursor.fetchone():
+            if str(id_sectorriego) in sectores_registrados:
                 registros_existentes.append(id_sectorriego)
                 continue
+            sectores_registrados.add(str(id_sectorriego))
 
-            # Insertar el registro
-            cursor.execute("""
-                INSERT INTO tarja_fact_cecoriego (
-                    id_actividad, id_caseta, id_equiporiego, id_sectorriego, id_ceco
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, (
+            nuevos.append((
                 id_actividad,
                 sector_info['id_caseta'],
                 sector_info['id_equipo'],
                 id_sectorriego,
                 sector_info['id_ceco']
             ))
-
             registros_creados.append({
                 "id_sectorriego": id_sectorriego,
                 "id_equiporiego": sector_info['id_equipo'],
@@ -1138,6 +1052,14 @@ def crear_ceco_riego_multiple():
                 "id_ceco": sector_info['id_ceco']
             })
 
+        # Insertar todos los registros nuevos de una vez
+        if nuevos:
+            cursor.executemany("""
+                INSERT INTO tarja_fact_cecoriego (
+                    id_actividad, id_caseta, id_equiporiego, id_sectorriego, id_ceco
+                ) VALUES (%s, %s, %s, %s, %s)
+            """, nuevos)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -1168,13 +1090,11 @@ def obtener_actividades_multiples_con_cecos():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Consulta optimizada para obtener todas las actividades múltiples con todos sus CECOs
         cursor.execute("""
@@ -1221,45 +1141,56 @@ def obtener_actividades_multiples_con_cecos():
         """, (usuario_id, id_sucursal))
 
         actividades = cursor.fetchall()
-        
-        # Para cada actividad, obtener todos sus CECOs
-        resultado = []
-        for actividad in actividades:
-            actividad_id = actividad['id']
-            
-            # Obtener CECOs productivos
-            cursor.execute("""
+
+        # Traer los CECOs y rendimientos de todas las actividades con un número
+        # fijo de consultas (una por tipo) y agruparlos por actividad
+        ids_actividades = [actividad['id'] for actividad in actividades]
+        cecos_productivos_por_actividad = {}
+        cecos_riego_por_actividad = {}
+        rendimientos_por_actividad = {}
+
+        if ids_actividades:
+            en_actividades = marcadores(ids_actividades)
+
+            # CECOs productivos (ordenados por nombre para la lista de disponibles)
+            cursor.execute(f"""
                 SELECT 
+                    cp.id_actividad,
                     cp.id_ceco,
+                    c.id as id_ceco_disponible,
                     c.nombre as nombre_ceco,
                     cp.id_cuartel,
                     cu.nombre as nombre_cuartel
                 FROM tarja_fact_cecoproductivo cp
                 LEFT JOIN general_dim_ceco c ON cp.id_ceco = c.id
                 LEFT JOIN general_dim_cuartel cu ON cp.id_cuartel = cu.id
-                WHERE cp.id_actividad = %s
-            """, (actividad_id,))
-            cecos_productivos = cursor.fetchall()
-            
-            # Obtener CECOs de riego
-            cursor.execute("""
+                WHERE cp.id_actividad IN ({en_actividades})
+                ORDER BY cp.id_actividad, c.nombre ASC
+            """, ids_actividades)
+            cecos_productivos_por_actividad = agrupar_por(cursor.fetchall(), 'id_actividad')
+
+            # CECOs de riego (ordenados por nombre para la lista de disponibles)
+            cursor.execute(f"""
                 SELECT 
+                    cr.id_actividad,
                     cr.id_ceco,
+                    c.id as id_ceco_disponible,
                     c.nombre as nombre_ceco,
                     cr.id_sectorriego,
                     sr.nombre as nombre_sector
                 FROM tarja_fact_cecoriego cr
                 LEFT JOIN general_dim_ceco c ON cr.id_ceco = c.id
                 LEFT JOIN riego_dim_sector sr ON cr.id_sectorriego = sr.id
-                WHERE cr.id_actividad = %s
-            """, (actividad_id,))
-            cecos_riego = cursor.fetchall()
-            
+                WHERE cr.id_actividad IN ({en_actividades})
+                ORDER BY cr.id_actividad, c.nombre ASC
+            """, ids_actividades)
+            cecos_riego_por_actividad = agrupar_por(cursor.fetchall(), 'id_actividad')
+
             # Las actividades múltiples solo manejan CECOs productivos y de riego
             # No se incluyen maquinaria, inversión ni administrativos
-            
+
             # Obtener rendimientos múltiples (rendimientos ya registrados)
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT 
                     r.id,
                     r.id_actividad,
@@ -1277,38 +1208,38 @@ def obtener_actividades_multiples_con_cecos():
                 LEFT JOIN general_dim_colaborador c ON r.id_colaborador = c.id
                 LEFT JOIN general_dim_bono b ON r.id_bono = b.id
                 LEFT JOIN general_dim_ceco ce ON r.id_ceco = ce.id
-                WHERE r.id_actividad = %s
-                ORDER BY c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC
-            """, (actividad_id,))
-            rendimientos_multiples = cursor.fetchall()
-            
-            # Obtener CECOs disponibles para rendimientos (combinando riego y productivos)
-            cursor.execute("""
-                SELECT 
-                    c.id as id_ceco,
-                    COALESCE(c.nombre, 'Sin nombre') as nombre_ceco,
-                    'riego' as tipo_ceco
-                FROM tarja_fact_cecoriego tcr
-                LEFT JOIN general_dim_ceco c ON tcr.id_ceco = c.id
-                WHERE tcr.id_actividad = %s
-                ORDER BY c.nombre ASC
-            """, (actividad_id,))
-            cecos_riego_disponibles = cursor.fetchall()
-            
-            cursor.execute("""
-                SELECT 
-                    c.id as id_ceco,
-                    COALESCE(c.nombre, 'Sin nombre') as nombre_ceco,
-                    'productivo' as tipo_ceco
-                FROM tarja_fact_cecoproductivo tcp
-                LEFT JOIN general_dim_ceco c ON tcp.id_ceco = c.id
-                WHERE tcp.id_actividad = %s
-                ORDER BY c.nombre ASC
-            """, (actividad_id,))
-            cecos_productivos_disponibles = cursor.fetchall()
-            
-            # Combinar CECOs disponibles para rendimientos
-            cecos_disponibles_rendimientos = cecos_riego_disponibles + cecos_productivos_disponibles
+                WHERE r.id_actividad IN ({en_actividades})
+                ORDER BY r.id_actividad, c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC
+            """, ids_actividades)
+            rendimientos_por_actividad = agrupar_por(cursor.fetchall(), 'id_actividad')
+
+        resultado = []
+        for actividad in actividades:
+            actividad_id = actividad['id']
+            filas_productivos = cecos_productivos_por_actividad.get(actividad_id, [])
+            filas_riego = cecos_riego_por_actividad.get(actividad_id, [])
+            rendimientos_multiples = rendimientos_por_actividad.get(actividad_id, [])
+
+            cecos_productivos = [{
+                "id_ceco": fila['id_ceco'],
+                "nombre_ceco": fila['nombre_ceco'],
+                "id_cuartel": fila['id_cuartel'],
+                "nombre_cuartel": fila['nombre_cuartel']
+            } for fila in filas_productivos]
+
+            cecos_riego = [{
+                "id_ceco": fila['id_ceco'],
+                "nombre_ceco": fila['nombre_ceco'],
+                "id_sectorriego": fila['id_sectorriego'],
+                "nombre_sector": fila['nombre_sector']
+            } for fila in filas_riego]
+
+            # Combinar CECOs disponibles para rendimientos (primero riego, luego productivos)
+            cecos_disponibles_rendimientos = [{
+                "id_ceco": fila['id_ceco_disponible'],
+                "nombre_ceco": fila['nombre_ceco'] if fila['nombre_ceco'] is not None else 'Sin nombre',
+                "tipo_ceco": tipo_ceco
+            } for tipo_ceco, filas in (('riego', filas_riego), ('productivo', filas_productivos)) for fila in filas]
             
             # Construir el objeto de respuesta
             actividad_completa = {
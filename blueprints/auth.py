@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
-import bcrypt
 from config import Config
 from utils.db import get_db_connection
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token
+from utils.claves import ClavesSaturadas, hash_clave, verificar_clave, necesita_rehash, respuesta_saturada
+from utils.ids import generar_id
+from utils.sucursal import invalidar_sucursal_activa
+from utils.usuario_actual import usuario_actual, marcar_cambio_usuario, crear_token_acceso
+from flask_jwt_extended import jwt_required, get_jwt_identity, create_refresh_token
 from datetime import date
 import logging
 
@@ -28,24 +31,25 @@ def register():
     if not correo or not clave or not usuario or not nombre or not apellido_paterno or not id_sucursalactiva:
         return jsonify({"error": "Correo, clave, usuario, nombre, apellido paterno y sucursal son requeridos"}), 400
 
-    # Generar hash de la contraseña
-    salt = bcrypt.gensalt()
-    clave_encriptada = bcrypt.hashpw(clave.encode('utf-8'), salt)
-
     try:
+        # Generar hash de la contraseña
+        clave_encriptada = hash_clave(clave)
+
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
             """INSERT INTO general_dim_usuario 
                (id, usuario, nombre, apellido_paterno, apellido_materno, correo, clave, id_sucursalactiva, id_estado, id_rol, id_perfil, fecha_creacion) 
-               VALUES (UUID(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (usuario, nombre, apellido_paterno, apellido_materno, correo, clave_encriptada.decode('utf-8'), id_sucursalactiva, 
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (generar_id(), usuario, nombre, apellido_paterno, apellido_materno, correo, clave_encriptada, id_sucursalactiva, 
              id_estado, id_rol, id_perfil, date.today())
         )
         conn.commit()
         cursor.close()
         conn.close()
         return jsonify({"message": "Usuario registrado correctamente"}), 201
+    except ClavesSaturadas:
+        return respuesta_saturada()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -96,7 +100,7 @@ def login():
             return jsonify({"error": "Usuario o clave incorrectos"}), 401
 
         logger.info("🔐 Verificando contraseña...")
-        if not bcrypt.checkpw(clave.encode('utf-8'), user['clave'].encode('utf-8')):
+        if not verificar_clave(clave, user['clave']):
             logger.warning(f"❌ Contraseña incorrecta para usuario: {usuario}")
             cursor.close()
             conn.close()
@@ -104,15 +108,20 @@ def login():
 
         logger.info("✅ Usuario autenticado correctamente")
 
+        # Actualizar el hash si se generó con un costo distinto al configurado
+        if necesita_rehash(user['clave']):
+            try:
+                cursor.execute("UPDATE general_dim_usuario SET clave = %s WHERE id = %s",
+                               (hash_clave(clave), user['id']))
+                conn.commit()
+                logger.info("🔐 Hash de clave actualizado al costo configurado")
+            except Exception as e:
+                # No impide el login: se reintenta en el próximo inicio de sesión
+                logger.warning(f"⚠️ No se pudo actualizar el hash de la clave: {str(e)}")
+
         # Crear token con información adicional
-        access_token = create_access_token(
-            identity=user['id'],
-            additional_claims={
-                'rol': user['id_rol'],
-                'perfil': user['id_perfil'],
-                'sucursal': user['id_sucursalactiva'],
-                'sucursal_nombre': user['sucursal_nombre']
-            }
+        access_token = crear_token_acceso(
+            user['id'], user['id_rol'], user['id_perfil'], user['id_sucursalactiva'], user['sucursal_nombre']
         )
 
         cursor.close()
@@ -133,6 +142,8 @@ def login():
             "id_perfil": user['id_perfil']
         }), 200
 
+    except ClavesSaturadas:
+        return respuesta_saturada()
     except Exception as e:
         logger.error(f"❌ Error en login: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -168,14 +179,8 @@ def refresh():
             conn.close()
             return jsonify({"error": "Usuario no encontrado o sin acceso"}), 401
 
-        access_token = create_access_token(
-            identity=user['id'],
-            additional_claims={
-                'rol': user['id_rol'],
-                'perfil': user['id_perfil'],
-                'sucursal': user['id_sucursalactiva'],
-                'sucursal_nombre': user['sucursal_nombre']
-            }
+        access_token = crear_token_acceso(
+            user['id'], user['id_rol'], user['id_perfil'], user['id_sucursalactiva'], user['sucursal_nombre']
         )
 
         cursor.close()
@@ -217,18 +222,17 @@ def cambiar_clave():
         cursor.execute("SELECT clave FROM general_dim_usuario WHERE id = %s", (usuario_id,))
         user = cursor.fetchone()
 
-        if not user or not bcrypt.checkpw(clave_actual.encode('utf-8'), user['clave'].encode('utf-8')):
+        if not user or not verificar_clave(clave_actual, user['clave']):
             cursor.close()
             conn.close()
             return jsonify({"error": "Clave actual incorrecta"}), 401
 
         # Generar nuevo hash con bcrypt
-        salt = bcrypt.gensalt()
-        nueva_clave_hash = bcrypt.hashpw(nueva_clave.encode('utf-8'), salt)
+        nueva_clave_hash = hash_clave(nueva_clave)
 
         # Actualizar clave
         cursor.execute("UPDATE general_dim_usuario SET clave = %s WHERE id = %s", 
-                      (nueva_clave_hash.decode('utf-8'), usuario_id))
+                      (nueva_clave_hash, usuario_id))
         conn.commit()
 
         cursor.close()
@@ -236,6 +240,8 @@ def cambiar_clave():
 
         return jsonify({"message": "Clave actualizada correctamente"}), 200
 
+    except ClavesSaturadas:
+        return respuesta_saturada()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -271,25 +277,35 @@ def cambiar_sucursal():
             SET id_sucursalactiva = %s 
             WHERE id = %s
         """, (nueva_sucursal_id, usuario_id))
+        rol, perfil = usuario_actual.rol, usuario_actual.perfil
+        marcar_cambio_usuario(cursor, usuario_id)
         
         conn.commit()
+        invalidar_sucursal_activa(usuario_id)
 
-        # Obtener el nombre de la sucursal para la respuesta
+        # Sucursal y nombre tal como quedaron en la BD (el id del JSON puede venir como texto)
         cursor.execute("""
-            SELECT nombre 
-            FROM general_dim_sucursal 
-            WHERE id = %s
-        """, (nueva_sucursal_id,))
+            SELECT u.id_sucursalactiva, s.nombre 
+            FROM general_dim_usuario u
+            LEFT JOIN general_dim_sucursal s ON u.id_sucursalactiva = s.id
+            WHERE u.id = %s
+        """, (usuario_id,))
         
         sucursal = cursor.fetchone()
 
         cursor.close()
         conn.close()
 
+        # Token nuevo con la sucursal actualizada; el anterior ya no se usa para autorizar
+        access_token = crear_token_acceso(
+            usuario_id, rol, perfil, sucursal['id_sucursalactiva'], sucursal['nombre']
+        )
+
         return jsonify({
             "message": "Sucursal actualizada correctamente",
-            "id_sucursal": nueva_sucursal_id,
-            "sucursal_nombre": sucursal['nombre'] if sucursal else None
+            "id_sucursal": sucursal['id_sucursalactiva'],
+            "sucursal_nombre": sucursal['nombre'],
+            "access_token": access_token
         }), 200
 
     except Exception as e:
@@ -1,35 +1,66 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.coalescencia import coalescer
 from utils.validar_rut import validar_rut
-import uuid
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
+from utils.sincronizacion import SinceInvalido, consultar_cambios, filtro_ids, obtener_since, registrar_cambio, respuesta_delta
 
 colaboradores_bp = Blueprint('colaboradores_bp', __name__)
 
+# Orden para paginar los colaboradores (?limit=&cursor=)
+ORDEN_COLABORADORES = [
+    Columna('nombre', 'nombre'),
+    Columna('apellido_paterno', 'apellido_paterno'),
+    Columna('apellido_materno', 'apellido_materno', si_nulo=''),
+    Columna('id', 'id'),
+]
+
 # Listar colaboradores (por sucursal activa del usuario)
 @colaboradores_bp.route('', methods=['GET'])
 @jwt_required()
+@coalescer('sucursal')
 def listar_colaboradores():
     try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
+        pagina = None if since else obtener_pagina(ORDEN_COLABORADORES)
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         # Listar colaboradores de la sucursal
-        cursor.execute("""
+        sql = """
             SELECT * FROM general_dim_colaborador
             WHERE id_sucursal = %s AND id_estado = 1
-            ORDER BY nombre, apellido_paterno, apellido_materno ASC
-        """, (id_sucursal,))
+        """
+        params = [id_sucursal]
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'general_dim_colaborador', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('id', ids_cambiados)
+            sql += filtro
+            params += params_filtro
+        if pagina:
+            sql += pagina.condicion + pagina.orden_sql
+            params += pagina.params + pagina.params_limite
+        else:
+            sql += " ORDER BY nombre, apellido_paterno, apellido_materno ASC"
+        cursor.execute(sql, tuple(params))
         colaboradores = cursor.fetchall()
         cursor.close()
         conn.close()
+        if since:
+            return jsonify(respuesta_delta(colaboradores, ids_cambiados, token)), 200
+        if pagina:
+            return jsonify(pagina.responder(colaboradores)), 200
         return jsonify(colaboradores), 200
+    except (PaginacionInvalida, SinceInvalido) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -48,12 +79,10 @@ def crear_colaborador():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
-        colaborador_id = str(uuid.uuid4())
+        colaborador_id = generar_id()
         sql = """
             INSERT INTO general_dim_colaborador (
                 id, nombre, apellido_paterno, apellido_materno, rut, codigo_verificador,
@@ -76,6 +105,7 @@ def crear_colaborador():
             data.get('id_afp'),
             data.get('id_estado', 1)
         ))
+        registrar_cambio(cursor, 'general_dim_colaborador', colaborador_id, id_sucursal)
         conn.commit()
         cursor.close()
         conn.close()
@@ -133,6 +163,7 @@ def editar_colaborador(colaborador_id):
             id_estado,
             colaborador_id
         ))
+        registrar_cambio(cursor, 'general_dim_colaborador', colaborador_id, colaborador_actual['id_sucursal'])
         conn.commit()
         cursor.close()
         conn.close()
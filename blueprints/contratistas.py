@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import uuid
 from utils.validar_rut import validar_rut
 
 contratistas_bp = Blueprint('contratistas_bp', __name__)
@@ -19,11 +20,9 @@ def obtener_contratistas():
 
         # Si no se pasa id_sucursal, usar la sucursal activa del usuario
         if not id_sucursal:
-            cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-            usuario = cursor.fetchone()
-            if not usuario or usuario['id_sucursalactiva'] is None:
+            id_sucursal = obtener_id_sucursal_activa(usuario_id)
+            if id_sucursal is None:
                 return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-            id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener contratistas de la sucursal
         cursor.execute("""
@@ -58,18 +57,15 @@ def crear_contratista():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # Crear contratista
-        contratista_id = str(uuid.uuid4())
+        contratista_id = generar_id()
         sql = """
             INSERT INTO general_dim_contratista
             (id, rut, codigo_verificador, nombre, id_estado)
@@ -1,15 +1,48 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
-from datetime import datetime, timedelta, date
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.calendario import horas_dia_empresa, obtener_calendarios
+from utils.resultados import cache_indicador
+from utils.rollups import encabezados_rollup, marcar_ventana, refrescar_rollups, usar_rollup
+from blueprints.usuarios import verificar_admin
 from decimal import Decimal
 
 indicadores_bp = Blueprint('indicadores_bp', __name__)
 
 
+def comparar_con_horas_esperadas(fila, calendarios):
+    """
+    Agrega horas_esperadas, diferencia_horas y estado_trabajo a una fila de
+    control de horas, con las horas por día de la empresa (`calendarios`, de
+    obtener_calendarios, una vez por petición). Sin horas configuradas el
+    estado queda 'EXACTO', igual que el CASE en SQL.
+    """
+    horas_esperadas = horas_dia_empresa(fila.pop('id_empresa'), fila['fecha'], calendarios)
+    horas_trabajadas = fila['horas_trabajadas']
+    diferencia = None
+    estado = 'EXACTO'
+    if horas_esperadas is not None and horas_trabajadas is not None:
+        diferencia = Decimal(str(horas_trabajadas)) - Decimal(str(horas_esperadas))
+        if diferencia > 0:
+            estado = 'MÁS'
+        elif diferencia < 0:
+            estado = 'MENOS'
+    fila['horas_esperadas'] = horas_esperadas
+    fila['diferencia_horas'] = diferencia
+    fila['estado_trabajo'] = estado
+    return fila
+
+
+def pide_recalculo(usuario_id):
+    """`?fresco=1` recalcula todos los días pendientes de la sucursal: solo para administradores."""
+    return request.args.get('fresco') in ('1', 'true') and bool(verificar_admin(usuario_id))
+
+
 # Obtener resumen de horas diarias por colaborador vs horas esperadas
 @indicadores_bp.route('/control-horas/resumen-diario-colaborador', methods=['GET'])
 @jwt_required()
+@cache_indicador
 def obtener_resumen_horas_diarias_colaborador():
     try:
         usuario_id = get_jwt_identity()
@@ -17,48 +50,44 @@ def obtener_resumen_horas_diarias_colaborador():
         cursor = conn.cursor(dictionary=True)
         
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
         
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
         
-        id_sucursal = usuario['id_sucursalactiva']
-        
         # Parámetros de filtrado
         fecha_inicio = request.args.get('fecha_inicio')
         fecha_fin = request.args.get('fecha_fin')
         id_colaborador = request.args.get('id_colaborador')
         
-        # Construir consulta de resumen diario usando id_sucursal directamente de la vista
-        sql = """
-            SELECT 
-                v.id_colaborador,
-                v.colaborador,
-                v.fecha,
-                DAYNAME(v.fecha) as nombre_dia,
-                SUM(v.horas_trabajadas) as horas_trabajadas,
-                h.horas_dia as horas_esperadas,
-                (SUM(v.horas_trabajadas) - h.horas_dia) as diferencia_horas,
-                CASE 
-                    WHEN SUM(v.horas_trabajadas) > h.horas_dia THEN 'MÁS'
-                    WHEN SUM(v.horas_trabajadas) < h.horas_dia THEN 'MENOS'
-                    ELSE 'EXACTO'
-                END as estado_trabajo
-            FROM v_tarja_tarjamovil_controlhoras v
-            LEFT JOIN tarja_dim_horaspordia h ON h.id_empresa = v.id_empresa 
-                AND h.nombre_dia = CASE 
-                    WHEN DAYNAME(v.fecha) = 'Monday' THEN 'Lunes'
-                    WHEN DAYNAME(v.fecha) = 'Tuesday' THEN 'Martes'
-                    WHEN DAYNAME(v.fecha) = 'Wednesday' THEN 'Miércoles'
-                    WHEN DAYNAME(v.fecha) = 'Thursday' THEN 'Jueves'
-                    WHEN DAYNAME(v.fecha) = 'Friday' THEN 'Viernes'
-                    WHEN DAYNAME(v.fecha) = 'Saturday' THEN 'Sábado'
-                    WHEN DAYNAME(v.fecha) = 'Sunday' THEN 'Domingo'
-                END
-            WHERE v.id_sucursal = %s
-                AND v.id_usuario = %s
-        """
+        # Resumen diario ya calculado (rollup) o, si no cubre el rango, agregado desde la vista
+        estado = usar_rollup(cursor, id_sucursal, fecha_inicio, forzar=pide_recalculo(usuario_id))
+        if estado is not None:
+            sql = """
+                SELECT 
+                    v.id_colaborador,
+                    v.colaborador,
+                    v.fecha,
+                    DAYNAME(v.fecha) as nombre_dia,
+                    v.horas_trabajadas,
+                    v.id_empresa
+                FROM tarja_rollup_horas_diarias v
+                WHERE v.id_sucursal = %s
+                    AND v.id_usuario = %s
+            """
+        else:
+            sql = """
+                SELECT 
+                    v.id_colaborador,
+                    v.colaborador,
+                    v.fecha,
+                    DAYNAME(v.fecha) as nombre_dia,
+                    SUM(v.horas_trabajadas) as horas_trabajadas,
+                    v.id_empresa
+                FROM v_tarja_tarjamovil_controlhoras v
+                WHERE v.id_sucursal = %s
+                    AND v.id_usuario = %s
+            """
         params = [id_sucursal, usuario_id]
         
         # Agregar filtros
@@ -74,16 +103,19 @@ def obtener_resumen_horas_diarias_colaborador():
             sql += " AND v.id_colaborador = %s"
             params.append(id_colaborador)
         
-        # Agrupar por colaborador y fecha
-        sql += " GROUP BY v.id_colaborador, v.colaborador, v.fecha, h.horas_dia ORDER BY v.fecha DESC, v.colaborador ASC"
+        # Agrupar por colaborador y fecha (el rollup ya tiene una fila por cada uno)
+        if estado is None:
+            sql += " GROUP BY v.id_colaborador, v.colaborador, v.fecha, v.id_empresa"
+        sql += " ORDER BY v.fecha DESC, v.colaborador ASC"
         
         cursor.execute(sql, tuple(params))
-        resultados = cursor.fetchall()
+        calendarios = obtener_calendarios()
+        resultados = [comparar_con_horas_esperadas(fila, calendarios) for fila in cursor.fetchall()]
         
         cursor.close()
         conn.close()
         
-        return jsonify(resultados), 200
+        return jsonify(resultados), 200, encabezados_rollup(estado)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -92,6 +124,7 @@ def obtener_resumen_horas_diarias_colaborador():
 # Obtener actividades de un colaborador específico
 @indicadores_bp.route('/control-horas/actividades-colaborador', methods=['GET'])
 @jwt_required()
+@cache_indicador
 def obtener_actividades_colaborador():
     try:
         usuario_id = get_jwt_identity()
@@ -99,14 +132,11 @@ def obtener_actividades_colaborador():
         cursor = conn.cursor(dictionary=True)
         
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
         
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
         
-        id_sucursal = usuario['id_sucursalactiva']
-        
         # Parámetros requeridos
         id_colaborador = request.args.get('id_colaborador')
         fecha_inicio = request.args.get('fecha_inicio')
@@ -128,24 +158,8 @@ def obtener_actividades_colaborador():
                 v.detalle_ceco,
                 v.usuario,
                 DAYNAME(v.fecha) as nombre_dia,
-                h.horas_dia as horas_esperadas,
-                (v.horas_trabajadas - h.horas_dia) as diferencia_horas,
-                CASE 
-                    WHEN v.horas_trabajadas > h.horas_dia THEN 'MÁS'
-                    WHEN v.horas_trabajadas < h.horas_dia THEN 'MENOS'
-                    ELSE 'EXACTO'
-                END as estado_trabajo
+                v.id_empresa
             FROM v_tarja_tarjamovil_controlhoras v
-            LEFT JOIN tarja_dim_horaspordia h ON h.id_empresa = v.id_empresa 
-                AND h.nombre_dia = CASE 
-                    WHEN DAYNAME(v.fecha) = 'Monday' THEN 'Lunes'
-                    WHEN DAYNAME(v.fecha) = 'Tuesday' THEN 'Martes'
-                    WHEN DAYNAME(v.fecha) = 'Wednesday' THEN 'Miércoles'
-                    WHEN DAYNAME(v.fecha) = 'Thursday' THEN 'Jueves'
-                    WHEN DAYNAME(v.fecha) = 'Friday' THEN 'Viernes'
-                    WHEN DAYNAME(v.fecha) = 'Saturday' THEN 'Sábado'
-                    WHEN DAYNAME(v.fecha) = 'Sunday' THEN 'Domingo'
-                END
             WHERE v.id_sucursal = %s 
                 AND v.id_colaborador = %s
                 AND v.id_usuario = %s
@@ -165,20 +179,12 @@ def obtener_actividades_colaborador():
         sql += " ORDER BY v.fecha DESC, v.horas_trabajadas DESC"
         
         cursor.execute(sql, tuple(params))
-        actividades = cursor.fetchall()
+        calendarios = obtener_calendarios()
+        actividades = [comparar_con_horas_esperadas(fila, calendarios) for fila in cursor.fetchall()]
         
         cursor.close()
         conn.close()
         
-        # Convertir tipos de datos problemáticos para JSON
-        if actividades:
-            for actividad in actividades:
-                for key, value in actividad.items():
-                    if isinstance(value, (datetime, date)):
-                        actividad[key] = value.isoformat()
-                    elif isinstance(value, Decimal):
-                        actividad[key] = float(value)
-        
         return jsonify(actividades), 200
         
     except Exception as e:
@@ -191,6 +197,7 @@ def obtener_actividades_colaborador():
 # Resumen diario de rendimientos individuales (propios y contratistas) por fecha
 @indicadores_bp.route('/control-rendimientos/individuales', methods=['GET'])
 @jwt_required()
+@cache_indicador
 def obtener_rendimientos_individuales():
     try:
         usuario_id = get_jwt_identity()
@@ -198,11 +205,9 @@ def obtener_rendimientos_individuales():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Filtros opcionales
         fecha_inicio = request.args.get('fecha_inicio')
@@ -274,15 +279,6 @@ def obtener_rendimientos_individuales():
         cursor.execute(sql, tuple(params))
         rendimientos = cursor.fetchall()
 
-        # Normalizar tipos para JSON
-        for fila in rendimientos:
-            if isinstance(fila.get('fecha'), (datetime, date)):
-                fila['fecha'] = fila['fecha'].isoformat()
-            if isinstance(fila.get('rendimiento'), Decimal):
-                fila['rendimiento'] = float(fila['rendimiento'])
-            if isinstance(fila.get('porcentaje_contratista'), Decimal):
-                fila['porcentaje_contratista'] = float(fila['porcentaje_contratista'])
-
         cursor.close()
         conn.close()
         return jsonify(rendimientos), 200
@@ -294,6 +290,7 @@ def obtener_rendimientos_individuales():
 # Resumen diario de rendimientos grupales (contratistas) por fecha
 @indicadores_bp.route('/control-rendimientos/grupales', methods=['GET'])
 @jwt_required()
+@cache_indicador
 def obtener_rendimientos_grupales():
     try:
         usuario_id = get_jwt_identity()
@@ -301,11 +298,9 @@ def obtener_rendimientos_grupales():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Filtros opcionales
         fecha_inicio = request.args.get('fecha_inicio')
@@ -372,14 +367,8 @@ def obtener_rendimientos_grupales():
         cursor.execute(sql, tuple(params))
         rendimientos = cursor.fetchall()
 
-        # Normalizar tipos para JSON
+        # Conteos como enteros (Decimal y fechas los serializa el proveedor JSON)
         for fila in rendimientos:
-            if isinstance(fila.get('fecha'), (datetime, date)):
-                fila['fecha'] = fila['fecha'].isoformat()
-            if isinstance(fila.get('rendimiento'), Decimal):
-                fila['rendimiento'] = float(fila['rendimiento'])
-            if isinstance(fila.get('porcentaje_contratista'), Decimal):
-                fila['porcentaje_contratista'] = float(fila['porcentaje_contratista'])
             if isinstance(fila.get('cantidad_trab'), Decimal):
                 fila['cantidad_trab'] = int(fila['cantidad_trab'])
 
@@ -394,6 +383,7 @@ def obtener_rendimientos_grupales():
 # Resumen diario de rendimientos (todos los tipos) por fecha
 @indicadores_bp.route('/control-rendimientos/resumen', methods=['GET'])
 @jwt_required()
+@cache_indicador
 def obtener_resumen_rendimientos_diario():
     try:
         usuario_id = get_jwt_identity()
@@ -401,11 +391,9 @@ def obtener_resumen_rendimientos_diario():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Filtros opcionales
         fecha_inicio = request.args.get('fecha_inicio')
@@ -416,32 +404,47 @@ def obtener_resumen_rendimientos_diario():
         id_unidad = request.args.get('id_unidad')
         tipo_mo = request.args.get('tipo_mo')
 
-        # Consulta de resumen agregado por día, tipo de mano de obra, labor, CECO y unidad
-        sql = """
-            SELECT
-                v.fecha,
-                v.tipo_mo,
-                v.id_tiporendimiento,
-                v.tipo_rendimiento,
-                v.grupo_mo,
-                v.id_labor,
-                v.labor,
-                v.id_ceco,
-                v.nombre_ceco,
-                v.id_tipoceco,
-                v.tipoceco,
-                v.detalle_ceco,
-                v.id_unidad,
-                v.unidad,
-                SUM(v.rendimiento) AS total_rendimiento,
-                COUNT(DISTINCT CASE WHEN v.id_trabajador IS NOT NULL THEN v.id_trabajador END) AS total_trabajadores_individuales,
-                COUNT(DISTINCT CASE WHEN v.id_trabajador IS NULL THEN v.grupo_mo END) AS total_grupos,
-                SUM(CASE WHEN v.id_trabajador IS NOT NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_individuales,
-                SUM(CASE WHEN v.id_trabajador IS NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_grupales
-            FROM v_tarja_tarjamovil_controlrendimiento v
-            WHERE v.id_sucursal = %s
-              AND v.id_usuario = %s
-        """
+        # Resumen por día, tipo de mano de obra, labor, CECO y unidad: desde el
+        # rollup o, si no cubre el rango, agregado desde la vista
+        estado = usar_rollup(cursor, id_sucursal, fecha_inicio, forzar=pide_recalculo(usuario_id))
+        if estado is not None:
+            sql = """
+                SELECT
+                    v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo,
+                    v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco,
+                    v.detalle_ceco, v.id_unidad, v.unidad,
+                    v.total_rendimiento, v.total_trabajadores_individuales, v.total_grupos,
+                    v.total_cantidad_individuales, v.total_cantidad_grupales
+                FROM tarja_rollup_rendimiento_diario v
+                WHERE v.id_sucursal = %s
+                  AND v.id_usuario = %s
+            """
+        else:
+            sql = """
+                SELECT
+                    v.fecha,
+                    v.tipo_mo,
+                    v.id_tiporendimiento,
+                    v.tipo_rendimiento,
+                    v.grupo_mo,
+                    v.id_labor,
+                    v.labor,
+                    v.id_ceco,
+                    v.nombre_ceco,
+                    v.id_tipoceco,
+                    v.tipoceco,
+                    v.detalle_ceco,
+                    v.id_unidad,
+                    v.unidad,
+                    SUM(v.rendimiento) AS total_rendimiento,
+                    COUNT(DISTINCT CASE WHEN v.id_trabajador IS NOT NULL THEN v.id_trabajador END) AS total_trabajadores_individuales,
+                    COUNT(DISTINCT CASE WHEN v.id_trabajador IS NULL THEN v.grupo_mo END) AS total_grupos,
+                    SUM(CASE WHEN v.id_trabajador IS NOT NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_individuales,
+                    SUM(CASE WHEN v.id_trabajador IS NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_grupales
+                FROM v_tarja_tarjamovil_controlrendimiento v
+                WHERE v.id_sucursal = %s
+                  AND v.id_usuario = %s
+            """
         params = [id_sucursal, usuario_id]
 
         if fecha_inicio:
@@ -466,19 +469,16 @@ def obtener_resumen_rendimientos_diario():
             sql += " AND v.tipo_mo = %s"
             params.append(tipo_mo)
 
-        sql += """ GROUP BY v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo, 
+        if estado is None:
+            sql += """ GROUP BY v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo, 
                    v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco, v.detalle_ceco, v.id_unidad, v.unidad"""
         sql += " ORDER BY v.fecha DESC, v.tipo_mo ASC, v.labor ASC, v.grupo_mo ASC, v.nombre_ceco ASC, v.unidad ASC"
 
         cursor.execute(sql, tuple(params))
         resumen = cursor.fetchall()
 
-        # Normalizar tipos para JSON
+        # Conteos como enteros (Decimal y fechas los serializa el proveedor JSON)
         for fila in resumen:
-            if isinstance(fila.get('fecha'), (datetime, date)):
-                fila['fecha'] = fila['fecha'].isoformat()
-            if isinstance(fila.get('total_rendimiento'), Decimal):
-                fila['total_rendimiento'] = float(fila['total_rendimiento'])
             if isinstance(fila.get('total_trabajadores_individuales'), Decimal):
                 fila['total_trabajadores_individuales'] = int(fila['total_trabajadores_individuales'])
             if isinstance(fila.get('total_grupos'), Decimal):
@@ -490,8 +490,39 @@ def obtener_resumen_rendimientos_diario():
 
         cursor.close()
         conn.close()
-        return jsonify(resumen), 200
+        return jsonify(resumen), 200, encabezados_rollup(estado)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+# Recalcular los resúmenes diarios pendientes (tarea programada o carga inicial)
+@indicadores_bp.route('/rollup/refrescar', methods=['POST'])
+@jwt_required()
+def refrescar_resumenes():
+    try:
+        usuario_id = get_jwt_identity()
+        if not verificar_admin(usuario_id):
+            return jsonify({"error": "No autorizado"}), 403
+
+        data = request.get_json(silent=True) or {}
+        id_sucursal = data.get('id_sucursal')
+        marcados = 0
+        # ventana_dias: marcar además todos los días recientes (carga inicial o
+        # cambios hechos fuera de la API)
+        if data.get('ventana_dias'):
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            marcados = marcar_ventana(cursor, int(data['ventana_dias']), id_sucursal)
+            conn.commit()
+            cursor.close()
+            conn.close()
+
+        recalculados = refrescar_rollups(id_sucursal, data.get('limite'))
+        return jsonify({
+            "message": "Resúmenes diarios recalculados",
+            "dias_marcados": marcados,
+            "dias_recalculados": recalculados
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,32 +1,36 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from config import Config
 from utils.db import get_db_connection
+from utils.sucursal import obtener_id_sucursal_activa, obtener_sucursal_actividad
+from utils.jerarquias import arbol_productivo, topologia_riego, invalidar_jerarquias
+from utils.catalogos import consultar_catalogo, invalidar_catalogo, TTL_POR_TABLA
+from utils.http_cache import cache_http
+from utils.coalescencia import coalescer
+from utils.rollups import marcar_dimension
+from blueprints.usuarios import verificar_admin
 #from blueprints.auth import token_requerido
 import uuid
 
 opciones_bp = Blueprint('opciones_bp', __name__)
 
+# Consultas de catálogo compartidas por varios endpoints (misma entrada en caché)
+SQL_LABORES = "SELECT id, nombre FROM general_dim_labor ORDER BY nombre ASC"
+SQL_UNIDADES_ACTIVAS = "SELECT id, nombre FROM tarja_dim_unidad WHERE id_estado = 1 ORDER BY nombre ASC"
+SQL_TIPOS_CECO = "SELECT id, nombre FROM general_dim_cecotipo ORDER BY nombre ASC"
+
 # Endpoint raíz para el blueprint
 @opciones_bp.route('/', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@cache_http(max_age=300)
+@coalescer('global')
 def opciones_root():
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id, nombre FROM general_dim_labor ORDER BY nombre ASC")
-        labores = cursor.fetchall() or []
-
-        cursor.execute("SELECT id, nombre FROM tarja_dim_unidad WHERE id_estado = 1 ORDER BY nombre ASC")
-        unidades = cursor.fetchall() or []
-
-        cursor.execute("SELECT id, nombre FROM general_dim_cecotipo ORDER BY nombre ASC")
-        tipoCecos = cursor.fetchall() or []
-
-        cursor.close()
-        conn.close()
+        labores = consultar_catalogo('general_dim_labor', SQL_LABORES) or []
+        unidades = consultar_catalogo('tarja_dim_unidad', SQL_UNIDADES_ACTIVAS) or []
+        tipoCecos = consultar_catalogo('general_dim_cecotipo', SQL_TIPOS_CECO) or []
 
         return jsonify({
             "labores": labores,
@@ -44,32 +48,27 @@ def opciones_root():
 # Obtener especies
 @opciones_bp.route('/especies', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@cache_http(max_age=300)
+@coalescer('sucursal')
 def obtener_especies():
     if request.method == 'OPTIONS':
         return '', 200
     try:
         usuario_id = get_jwt_identity()
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
 
         # 🔹 Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
         # Obtener todas las especies
-        cursor.execute("""
+        especies = consultar_catalogo('general_dim_especie', """
             SELECT id, nombre, caja_equivalente
             FROM general_dim_especie 
             ORDER BY nombre ASC
         """)
 
-        especies = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
         if not especies:
             return jsonify([]), 200
 
@@ -112,14 +111,11 @@ def obtener_cecos():
         cursor = conn.cursor(dictionary=True)
 
         # 🔹 Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # Obtener CECOs según sucursal activa
         cursor.execute("""
             SELECT c.id, c.nombre, c.id_cecotipo, t.nombre as nombre_tipo
@@ -143,21 +139,15 @@ def obtener_cecos():
      # Obtener tipo trabajador
 @opciones_bp.route('/tipotrabajadores', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_tipotrabajador():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Obtener tipos de trabajador
-        cursor.execute("""
+        tipotrabajador = consultar_catalogo('general_dim_tipotrabajador', """
             SELECT id, nombre 
             FROM general_dim_tipotrabajador 
             ORDER BY nombre ASC
         """)
-        
-        tipotrabajador = cursor.fetchall()
-        cursor.close()
-        conn.close()
 
         if not tipotrabajador:
             return jsonify([]), 200
@@ -169,6 +159,7 @@ def obtener_tipotrabajador():
 # Obtener contratistas según la sucursal activa del usuario logueado
 @opciones_bp.route('/contratistas', methods=['GET'])
 @jwt_required()
+@cache_http()
 def obtener_contratistas():
     try:
         usuario_id = get_jwt_identity()
@@ -177,14 +168,11 @@ def obtener_contratistas():
         cursor = conn.cursor(dictionary=True)
 
         # 🔹 Obtener sucursal_activa del usuario autenticado
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # 🔹 Obtener contratistas de la sucursal activa
         cursor.execute("""
             SELECT DISTINCT c.id, c.nombre, c.rut, c.codigo_verificador
@@ -210,22 +198,16 @@ def obtener_contratistas():
     # Obtener tipo rendimiento
 @opciones_bp.route('/tiporendimientos', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_tiporendimiento():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Obtener tipos de rendimiento
-        cursor.execute("""
+        tiporendimiento = consultar_catalogo('tarja_dim_tiporendimiento', """
             SELECT id, nombre 
             FROM tarja_dim_tiporendimiento 
             ORDER BY nombre ASC
         """)
         
-        tiporendimiento = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
         if not tiporendimiento:
             return jsonify([]), 200
             
@@ -236,6 +218,7 @@ def obtener_tiporendimiento():
 # Obtener sucursales del usuario logueado
 @opciones_bp.route('/sucursales', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@cache_http(max_age=60)
 def obtener_sucursales():
     if request.method == 'OPTIONS':
         return '', 200
@@ -267,16 +250,10 @@ def obtener_sucursales():
 # Obtener porcentajes de trabajadores
 @opciones_bp.route('/porcentajes', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_porcentajes():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id, porcentaje FROM Porcentaje_trabajador ORDER BY porcentaje ASC")
-        porcentajes = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
+        porcentajes = consultar_catalogo('Porcentaje_trabajador', "SELECT id, porcentaje FROM Porcentaje_trabajador ORDER BY porcentaje ASC")
 
         return jsonify(porcentajes), 200
     except Exception as e:
@@ -292,15 +269,12 @@ def obtener_cecos_administrativos():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # Obtener los CECOs administrativos de la sucursal activa
         cursor.execute("""
             SELECT id, nombre
@@ -669,16 +643,12 @@ def test():
 # Obtener tipos de CECO
 @opciones_bp.route('/tiposceco', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_tiposceco():
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, nombre FROM general_dim_cecotipo ORDER BY nombre ASC")
-        tipos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        tipos = consultar_catalogo('general_dim_cecotipo', SQL_TIPOS_CECO)
         if not tipos:
             return jsonify([]), 200
         return jsonify(tipos), 200
@@ -705,13 +675,11 @@ def obtener_cecos_productivos():
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         cursor.execute("""
             SELECT id, nombre
             FROM general_dim_ceco
@@ -733,13 +701,11 @@ def obtener_cecos_maquinaria():
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         cursor.execute("""
             SELECT id, nombre
             FROM general_dim_ceco
@@ -761,13 +727,11 @@ def obtener_cecos_inversion():
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         cursor.execute("""
             SELECT id, nombre
             FROM general_dim_ceco
@@ -789,13 +753,11 @@ def obtener_cecos_riego():
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         cursor.execute("""
             SELECT id, nombre
             FROM general_dim_ceco
@@ -947,14 +909,10 @@ def obtener_cecosinversion_por_actividad(id_actividad, id_tipoinversion, id_inve
 # Obtener tipos de maquinaria
 @opciones_bp.route('/tiposmaquinaria', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_tipos_maquinaria():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, nombre FROM general_dim_maquinariatipo ORDER BY nombre ASC")
-        tipos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        tipos = consultar_catalogo('general_dim_maquinariatipo', "SELECT id, nombre FROM general_dim_maquinariatipo ORDER BY nombre ASC")
         return jsonify(tipos), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1021,19 +979,10 @@ def obtener_cecosmaquinaria_por_actividad(id_actividad, id_tipomaquinaria, id_ma
 
 @opciones_bp.route('/unidades', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def obtener_unidades():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, nombre
-            FROM tarja_dim_unidad
-            WHERE id_estado = 1
-            ORDER BY nombre ASC
-        """)
-        unidades = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        unidades = consultar_catalogo('tarja_dim_unidad', SQL_UNIDADES_ACTIVAS)
         return jsonify(unidades), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1082,30 +1031,21 @@ def obtener_unidad_default_labor(id_labor):
 # Obtener lista de porcentajes de contratista
 @opciones_bp.route('/porcentajescontratista', methods=['GET'])
 @jwt_required()
+@cache_http(max_age=300)
 def get_porcentajes_contratista():
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        porcentajes = consultar_catalogo('general_dim_porcentajecontratista', """
             SELECT id, porcentaje, id_empresa
             FROM general_dim_porcentajecontratista
             ORDER BY porcentaje ASC
         """)
-        porcentajes = cursor.fetchall()
         return jsonify([{
-            'id': p[0],
-            'porcentaje': p[1],
-            'id_empresa': p[2]
+            'id': p['id'],
+            'porcentaje': p['porcentaje'],
+            'id_empresa': p['id_empresa']
         } for p in porcentajes]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # Obtener tipos de maquinaria disponibles para la sucursal de la actividad
 @opciones_bp.route('/tiposmaquinaria/actividad/<string:id_actividad>', methods=['GET'])
@@ -1141,31 +1081,15 @@ def obtener_tiposmaquinaria_por_actividad(id_actividad):
 # Obtener especies disponibles para la sucursal de la actividad
 @opciones_bp.route('/especies/actividad/<string:id_actividad>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_especies_por_actividad(id_actividad):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Especies que tienen variedades asociadas a cuarteles de la sucursal
-        cursor.execute("""
-            SELECT DISTINCT e.id, e.nombre
-            FROM general_dim_especie e
-            JOIN general_dim_variedad v ON v.id_especie = e.id
-            JOIN general_dim_cuartel c ON c.id_variedad = v.id
-            JOIN general_dim_ceco ce ON c.id_ceco = ce.id
-            WHERE ce.id_sucursal = %s AND ce.id_estado = 1
-            ORDER BY e.nombre ASC
-        """, (id_sucursal,))
-        especies = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        especies = arbol_productivo.obtener(id_sucursal)["especies"]
         return jsonify(especies), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1173,30 +1097,15 @@ def obtener_especies_por_actividad(id_actividad):
 # Obtener variedades disponibles para la sucursal de la actividad y especie
 @opciones_bp.route('/variedades/actividad/<string:id_actividad>/<int:id_especie>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_variedades_por_actividad(id_actividad, id_especie):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Variedades de la especie que tienen cuarteles en la sucursal
-        cursor.execute("""
-            SELECT DISTINCT v.id, v.nombre
-            FROM general_dim_variedad v
-            JOIN general_dim_cuartel c ON c.id_variedad = v.id
-            JOIN general_dim_ceco ce ON c.id_ceco = ce.id
-            WHERE v.id_especie = %s AND ce.id_sucursal = %s AND ce.id_estado = 1
-            ORDER BY v.nombre ASC
-        """, (id_especie, id_sucursal))
-        variedades = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        variedades = arbol_productivo.obtener(id_sucursal)["variedades_por_especie"].get(id_especie, [])
         return jsonify(variedades), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1204,29 +1113,15 @@ def obtener_variedades_por_actividad(id_actividad, id_especie):
 # Obtener cuarteles disponibles para la sucursal de la actividad, especie y variedad
 @opciones_bp.route('/cuarteles/actividad/<string:id_actividad>/<int:id_especie>/<int:id_variedad>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_cuarteles_por_actividad_y_variedad(id_actividad, id_especie, id_variedad):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Cuarteles de la variedad en la sucursal
-        cursor.execute("""
-            SELECT c.id, c.nombre
-            FROM general_dim_cuartel c
-            JOIN general_dim_ceco ce ON c.id_ceco = ce.id
-            WHERE c.id_variedad = %s AND ce.id_sucursal = %s AND ce.id_estado = 1
-            ORDER BY c.nombre ASC
-        """, (id_variedad, id_sucursal))
-        cuarteles = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        cuarteles = arbol_productivo.obtener(id_sucursal)["cuarteles_por_variedad"].get(id_variedad, [])
         return jsonify(cuarteles), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1234,49 +1129,52 @@ def obtener_cuarteles_por_actividad_y_variedad(id_actividad, id_especie, id_vari
 # Obtener CECOs disponibles para la sucursal de la actividad, especie, variedad y cuartel
 @opciones_bp.route('/cecosproductivo/actividad/<string:id_actividad>/<int:id_especie>/<int:id_variedad>/<int:id_cuartel>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_cecosproductivo_por_actividad(id_actividad, id_especie, id_variedad, id_cuartel):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
+            return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
         # Obtener el CECO asociado al cuartel seleccionado
-        cursor.execute("""
-            SELECT c.id, c.nombre
-            FROM general_dim_ceco c
-            JOIN general_dim_cuartel cu ON cu.id_ceco = c.id
-            WHERE cu.id = %s AND c.id_estado = 1
-        """, (id_cuartel,))
-        cecos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        cecos = arbol_productivo.obtener(id_sucursal)["cecos_por_cuartel"].get(id_cuartel, [])
         return jsonify(cecos), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 🌳 Árbol productivo completo (especie → variedad → cuartel → CECO) de una sucursal
+@opciones_bp.route('/arbol-productivo', methods=['GET'])
+@opciones_bp.route('/arbol-productivo/actividad/<string:id_actividad>', methods=['GET'])
+@jwt_required()
+@cache_http()
+def obtener_arbol_productivo(id_actividad=None):
+    try:
+        if id_actividad:
+            id_sucursal = obtener_sucursal_actividad(id_actividad)
+            if not id_sucursal:
+                return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
+        else:
+            id_sucursal = obtener_id_sucursal_activa(get_jwt_identity())
+            if not id_sucursal:
+                return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
+        return jsonify({
+            "id_sucursal": id_sucursal,
+            "especies": arbol_productivo.obtener(id_sucursal)["arbol"]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Obtener casetas disponibles para la sucursal de la actividad
 @opciones_bp.route('/casetas/actividad/<string:id_actividad>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_casetas_por_actividad(id_actividad):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Casetas de la sucursal
-        cursor.execute("""
-            SELECT id, nombre, ubicacion
-            FROM riego_dim_caseta
-            WHERE id_sucursal = %s
-            ORDER BY nombre ASC
-        """, (id_sucursal,))
-        casetas = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        casetas = topologia_riego.obtener(id_sucursal)["casetas"]
         return jsonify(casetas), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1284,29 +1182,15 @@ def obtener_casetas_por_actividad(id_actividad):
 # Obtener equipos de riego disponibles para la sucursal de la actividad y caseta
 @opciones_bp.route('/equiposriego/actividad/<string:id_actividad>/<string:id_caseta>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_equiposriego_por_actividad_y_caseta(id_actividad, id_caseta):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Equipos de riego de la caseta
-        cursor.execute("""
-            SELECT e.id, e.nombre
-            FROM riego_dim_equipo e
-            JOIN riego_dim_caseta c ON e.id_caseta = c.id
-            WHERE c.id = %s AND c.id_sucursal = %s
-            ORDER BY e.nombre ASC
-        """, (id_caseta, id_sucursal))
-        equipos = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        equipos = topologia_riego.obtener(id_sucursal)["equipos_por_caseta"].get(id_caseta, [])
         return jsonify(equipos), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1314,30 +1198,15 @@ def obtener_equiposriego_por_actividad_y_caseta(id_actividad, id_caseta):
 # Obtener sectores de riego disponibles para la sucursal de la actividad y equipo
 @opciones_bp.route('/sectoresriego/actividad/<string:id_actividad>/<string:id_equipo>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_sectoresriego_por_actividad_y_equipo(id_actividad, id_equipo):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
-        id_sucursal = actividad['id_sucursalactiva']
         # Sectores de riego del equipo
-        cursor.execute("""
-            SELECT s.id, s.nombre
-            FROM riego_dim_sector s
-            JOIN riego_dim_equipo e ON s.id_equipo = e.id
-            JOIN riego_dim_caseta c ON e.id_caseta = c.id
-            WHERE e.id = %s AND c.id_sucursal = %s
-            ORDER BY s.nombre ASC
-        """, (id_equipo, id_sucursal))
-        sectores = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        sectores = topologia_riego.obtener(id_sucursal)["sectores_por_equipo"].get(id_equipo, [])
         return jsonify(sectores), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1345,20 +1214,14 @@ def obtener_sectoresriego_por_actividad_y_equipo(id_actividad, id_equipo):
 # Obtener CECOs disponibles para la sucursal de la actividad, caseta, equipo y sector
 @opciones_bp.route('/cecosriego/actividad/<string:id_actividad>/<string:id_caseta>/<string:id_equipo>/<string:id_sector>', methods=['GET'])
 @jwt_required()
+@coalescer('global')
 def obtener_cecosriego_por_actividad(id_actividad, id_caseta, id_equipo, id_sector):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
+            return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
         # Obtener el CECO asociado al sector seleccionado
-        cursor.execute("""
-            SELECT c.id, c.nombre
-            FROM general_dim_ceco c
-            JOIN riego_dim_sector s ON s.id_ceco = c.id
-            WHERE s.id = %s AND c.id_estado = 1
-        """, (id_sector,))
-        ceco = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        ceco = topologia_riego.obtener(id_sucursal)["ceco_por_sector"].get(id_sector)
         
         if not ceco:
             return jsonify({"error": "No se encontró el CECO asociado al sector"}), 404
@@ -1374,36 +1237,41 @@ def obtener_opciones_riego_por_actividad(id_actividad):
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Obtener la sucursal de la actividad
-        cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad = cursor.fetchone()
-        if not actividad or not actividad['id_sucursalactiva']:
-            cursor.close()
-            conn.close()
+        id_sucursal = obtener_sucursal_actividad(id_actividad)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
         
-        id_sucursal = actividad['id_sucursalactiva']
-        
         # Obtener casetas de la sucursal (devuelve solo la lista de casetas)
-        cursor.execute("""
-            SELECT id, nombre, ubicacion
-            FROM riego_dim_caseta
-            WHERE id_sucursal = %s
-            ORDER BY nombre ASC
-        """, (id_sucursal,))
-        casetas = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        casetas = topologia_riego.obtener(id_sucursal)["casetas"]
         
         return jsonify(casetas), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 💧 Topología de riego completa (caseta → equipo → sector → CECO) de una sucursal
+@opciones_bp.route('/arbol-riego', methods=['GET'])
+@opciones_bp.route('/arbol-riego/actividad/<string:id_actividad>', methods=['GET'])
+@jwt_required()
+@cache_http()
+def obtener_arbol_riego(id_actividad=None):
+    try:
+        if id_actividad:
+            id_sucursal = obtener_sucursal_actividad(id_actividad)
+            if not id_sucursal:
+                return jsonify({"error": "No se encontró la sucursal de la actividad"}), 400
+        else:
+            id_sucursal = obtener_id_sucursal_activa(get_jwt_identity())
+            if not id_sucursal:
+                return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
+        return jsonify({
+            "id_sucursal": id_sucursal,
+            "casetas": topologia_riego.obtener(id_sucursal)["arbol"]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Obtener CECOs de riego por actividad
 @opciones_bp.route('/cecosriego/<string:id_actividad>', methods=['GET'])
 @jwt_required()
@@ -1499,3 +1367,42 @@ def eliminar_cecoriego(id):
         return jsonify({"message": "Ceco riego eliminado correctamente"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+# Invalidar la caché de catálogos (tras modificar tablas de dimensión desde otro sistema)
+@opciones_bp.route('/cache/invalidar', methods=['POST'])
+@jwt_required()
+def invalidar_cache_catalogos():
+    try:
+        usuario_id = get_jwt_identity()
+        if not verificar_admin(usuario_id):
+            return jsonify({"error": "No autorizado"}), 403
+
+        data = request.get_json(silent=True) or {}
+        tablas = data.get('tablas') or list(TTL_POR_TABLA.keys())
+        invalidar_catalogo(*tablas)
+        # Sin tablas explícitas también se descartan los índices por sucursal
+        invalidar_jerarquias(*(data.get('tablas') or []), id_sucursal=data.get('id_sucursal'))
+
+        # Los resúmenes de indicadores copian nombres de labores, CECOs,
+        # unidades...: recalcular los días donde aparecen las tablas indicadas
+        dias_marcados = 0
+        if data.get('tablas'):
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            dias_marcados = marcar_dimension(cursor, *data['tablas'])
+            conn.commit()
+            cursor.close()
+            conn.close()
+
+        # La caché es de cada proceso: solo se invalida en el worker que atendió
+        # la petición; los demás la renuevan al vencer su TTL
+        return jsonify({
+            "message": "Caché de catálogos invalidada en este proceso; los demás la renuevan al vencer su TTL",
+            "tablas": tablas,
+            "alcance": "proceso",
+            "ttl_max_segundos": max([Config.CATALOGO_CACHE_TTL, Config.JERARQUIA_CACHE_TTL]
+                                    + [TTL_POR_TABLA.get(tabla, Config.CATALOGO_CACHE_TTL) for tabla in tablas]),
+            "dias_rollup_marcados": dias_marcados
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,11 +1,23 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.streaming import formato_streaming, respuesta_streaming
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
 from datetime import datetime, date
-import uuid
 
 permisos_bp = Blueprint('permisos_bp', __name__)
 
+# Orden para paginar los permisos (?limit=&cursor=)
+ORDEN_PERMISOS = [
+    Columna('c.nombre', 'nombre_colaborador'),
+    Columna('c.apellido_paterno', 'apellido_paterno'),
+    Columna('c.apellido_materno', 'apellido_materno', si_nulo=''),
+    Columna('p.fecha', 'fecha', descendente=True),
+    Columna('p.id', 'id'),
+]
+
 def format_fecha(fecha):
     if isinstance(fecha, (date, datetime)):
         return fecha.strftime('%Y-%m-%d')
@@ -16,25 +28,30 @@ def format_fecha(fecha):
 @jwt_required()
 def listar_permisos():
     try:
+        pagina = obtener_pagina(ORDEN_PERMISOS)
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         # Listar permisos de colaboradores de la sucursal y del usuario autenticado
-        cursor.execute("""
+        sql = """
             SELECT p.*, t.nombre AS tipo_permiso, c.nombre AS nombre_colaborador, c.apellido_paterno, c.apellido_materno, e.nombre AS estado_permiso
             FROM tarja_fact_permiso p
             JOIN tarja_dim_permisotipo t ON p.id_tipopermiso = t.id
             JOIN general_dim_colaborador c ON p.id_colaborador = c.id
             JOIN tarja_dim_permisoestado e ON p.id_estadopermiso = e.id
             WHERE c.id_sucursal = %s AND p.id_usuario = %s
-            ORDER BY c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC, p.fecha DESC
-        """, (id_sucursal, usuario_id))
+        """
+        params = [id_sucursal, usuario_id]
+        if pagina:
+            sql += pagina.condicion + pagina.orden_sql
+            params += pagina.params + pagina.params_limite
+        else:
+            sql += " ORDER BY c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC, p.fecha DESC"
+        cursor.execute(sql, tuple(params))
         permisos = cursor.fetchall()
         cursor.close()
         conn.close()
@@ -44,7 +61,11 @@ def listar_permisos():
                 permiso['fecha'] = format_fecha(permiso['fecha'])
             if 'timestamp' in permiso and permiso['timestamp']:
                 permiso['timestamp'] = format_fecha(permiso['timestamp'])
+        if pagina:
+            return jsonify(pagina.responder(permisos)), 200
         return jsonify(permisos), 200
+    except PaginacionInvalida as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -66,7 +87,7 @@ def crear_permiso():
         cursor = conn.cursor(dictionary=True)
         
         # Generar id UUID
-        permiso_id = str(uuid.uuid4())
+        permiso_id = generar_id()
         sql = """
             INSERT INTO tarja_fact_permiso (
                 id, id_usuario, fecha, id_tipopermiso, id_colaborador, horas, id_estadopermiso
@@ -162,9 +183,8 @@ def obtener_actividades():
         cursor = conn.cursor(dictionary=True)
         
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
         
         # Construir la consulta base
@@ -210,7 +230,7 @@ def obtener_actividades():
             AND a.id_estadoactividad IN (1, 2)  -- Solo actividades creadas o revisadas
         """
         
-        params = [usuario['id_sucursalactiva']]
+        params = [id_sucursal]
         
         # Agregar filtro de fecha si se proporciona
         if fecha_filtro:
@@ -218,6 +238,10 @@ def obtener_actividades():
             params.append(fecha_filtro)
         
         sql += " ORDER BY a.fecha DESC, l.nombre ASC"
+
+        formato = formato_streaming()
+        if formato:
+            return respuesta_streaming(sql, tuple(params), formato)
         
         cursor.execute(sql, params)
         actividades = cursor.fetchall()
@@ -1,12 +1,23 @@
-import datetime
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
+from utils.sincronizacion import registrar_cambio
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, date, timedelta, time
 
 
 rendimiento_multiple_bp = Blueprint('rendimiento_multiple_bp', __name__)
 
+# Orden para paginar los rendimientos propios del usuario (?limit=&cursor=)
+ORDEN_RENDIMIENTOS_USUARIO = [
+    Columna('a.fecha', 'fecha', descendente=True),
+    Columna('c.nombre', 'orden_nombre', si_nulo='', oculta=True),
+    Columna('c.apellido_paterno', 'orden_apellido_paterno', si_nulo='', oculta=True),
+    Columna('c.apellido_materno', 'orden_apellido_materno', si_nulo='', oculta=True),
+    Columna('r.id', 'id'),
+]
+
 # 🚀 Endpoint para obtener rendimientos propios de una actividad múltiple
 @rendimiento_multiple_bp.route('/actividad/<string:id_actividad>', methods=['GET'])
 @jwt_required()
@@ -67,21 +78,20 @@ def obtener_rendimientos_actividad(id_actividad):
 @jwt_required()
 def obtener_rendimientos_usuario():
     try:
+        pagina = obtener_pagina(ORDEN_RENDIMIENTOS_USUARIO)
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener rendimientos propios de actividades múltiples del usuario
-        cursor.execute("""
+        sql = """
             SELECT 
                 r.id,
                 r.id_actividad,
@@ -97,7 +107,7 @@ def obtener_rendimientos_usuario():
                 COALESCE(ce.nombre, 'Sin nombre') as nombre_ceco,
                 a.fecha,
                 a.id_labor,
-                l.nombre as nombre_labor
+                l.nombre as nombre_labor{columnas_orden}
             FROM tarja_fact_rendimientopropio r
             LEFT JOIN general_dim_colaborador c ON r.id_colaborador = c.id
             LEFT JOIN general_dim_bono b ON r.id_bono = b.id
@@ -109,20 +119,25 @@ def obtener_rendimientos_usuario():
             AND a.id_tipotrabajador = 1 
             AND a.id_contratista IS NULL 
             AND a.id_tiporendimiento = 3
-            ORDER BY a.fecha DESC, c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC
-        """, (usuario_id, id_sucursal))
+        """.format(columnas_orden=pagina.columnas_ocultas if pagina else '')
+        params = [usuario_id, id_sucursal]
+        if pagina:
+            sql += pagina.condicion + pagina.orden_sql
+            params += pagina.params + pagina.params_limite
+        else:
+            sql += " ORDER BY a.fecha DESC, c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC"
+        cursor.execute(sql, tuple(params))
 
         rendimientos = cursor.fetchall()
         cursor.close()
         conn.close()
 
-        # Convertir fecha a string
-        for rendimiento in rendimientos:
-            if isinstance(rendimiento['fecha'], (date, datetime)):
-                rendimiento['fecha'] = rendimiento['fecha'].strftime('%Y-%m-%d')
-
+        if pagina:
+            return jsonify(pagina.responder(rendimientos)), 200
         return jsonify(rendimientos), 200
 
+    except PaginacionInvalida as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -202,8 +217,7 @@ def crear_rendimiento():
 
         # Generar ID único para el rendimiento
         cursor2 = conn.cursor()
-        cursor2.execute("SELECT UUID()")
-        id_rendimiento = cursor2.fetchone()[0]
+        id_rendimiento = generar_id()
 
         # Insertar el rendimiento
         cursor2.execute("""
@@ -221,6 +235,7 @@ def crear_rendimiento():
             None,  # id_bono = NULL
             id_ceco
         ))
+        registrar_cambio(cursor2, 'tarja_fact_rendimientopropio', id_rendimiento)
 
         conn.commit()
         cursor.close()
@@ -286,10 +301,13 @@ def editar_rendimiento(rendimiento_id):
                 id_ceco = %s
             WHERE id = %s
         """, (rendimiento, horas_trabajadas, horas_extras, id_bono, id_ceco, rendimiento_id))
+        actualizadas = cursor.rowcount
+        if actualizadas:
+            registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
 
         conn.commit()
         
-        if cursor.rowcount == 0:
+        if actualizadas == 0:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se pudo actualizar el rendimiento"}), 404
@@ -326,7 +344,8 @@ def eliminar_rendimiento(rendimiento_id):
             conn.close()
             return jsonify({"error": "Rendimiento no encontrado o no tienes permiso para eliminarlo"}), 404
 
-        # Eliminar el rendimiento
+        # Eliminar el rendimiento (el registro de cambio se anota antes, mientras la fila existe)
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id, eliminado=True)
         cursor.execute("""
             DELETE FROM tarja_fact_rendimientopropio 
             WHERE id = %s
@@ -357,13 +376,11 @@ def obtener_colaboradores():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró sucursal activa para el usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
 
         # Obtener colaboradores de la sucursal
         cursor.execute("""
@@ -489,11 +506,9 @@ def getRendimientosPropiosPorCeco(id_ceco):
         cursor = conn.cursor(dictionary=True)
         
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         
         # Verificar que el CECO existe y obtener su nombre
         cursor.execute("SELECT id, nombre FROM general_dim_ceco WHERE id = %s", (id_ceco,))
@@ -538,11 +553,6 @@ def getRendimientosPropiosPorCeco(id_ceco):
         cursor.close()
         conn.close()
         
-        # Convertir fecha a string
-        for rendimiento in rendimientos:
-            if isinstance(rendimiento['fecha'], (date, datetime)):
-                rendimiento['fecha'] = rendimiento['fecha'].strftime('%Y-%m-%d')
-        
         return jsonify({
             "ceco": {
                 "id": id_ceco,
@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
-import uuid
-from datetime import date, datetime
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.sincronizacion import registrar_cambio
 
 rendimientopropio_bp = Blueprint('rendimientopropio_bp', __name__)
 
@@ -35,7 +36,7 @@ def crear_rendimiento_propio():
             return jsonify({"error": "Actividad no encontrada o no tienes permisos"}), 404
         
         # Generar id UUID
-        rendimiento_id = str(uuid.uuid4())
+        rendimiento_id = generar_id()
         
         sql = """
             INSERT INTO tarja_fact_rendimientopropio (
@@ -52,6 +53,7 @@ def crear_rendimiento_propio():
             float(data.get('horas_extras', 0)),
             data.get('id_bono', None)
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -68,11 +70,9 @@ def listar_rendimientos_propios_por_actividad(id_actividad):
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         # Verificar que la actividad pertenece a la sucursal y obtener fecha, labor y CECO principal
         cursor.execute("""
             SELECT 
@@ -124,15 +124,6 @@ def listar_rendimientos_propios_por_actividad(id_actividad):
         """, (id_actividad,))
         rendimientos = cursor.fetchall()
         
-        # Convertir valores numéricos a float para evitar redondeo
-        for r in rendimientos:
-            if 'rendimiento' in r and r['rendimiento'] is not None:
-                r['rendimiento'] = float(r['rendimiento'])
-            if 'horas_trabajadas' in r and r['horas_trabajadas'] is not None:
-                r['horas_trabajadas'] = float(r['horas_trabajadas'])
-            if 'horas_extras' in r and r['horas_extras'] is not None:
-                r['horas_extras'] = float(r['horas_extras'])
-        
         cursor.close()
         conn.close()
         # Formatear nombre completo del colaborador
@@ -179,6 +170,7 @@ def editar_rendimiento_propio(id_rendimiento):
             data.get('id_bono', rendimiento['id_bono']),
             id_rendimiento
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', id_rendimiento)
         conn.commit()
         cursor.close()
         conn.close()
@@ -194,11 +186,9 @@ def listar_actividades_sucursal_usuario():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         # Listar actividades de la sucursal con estado 1 (creada) y obtener el CECO principal
         cursor.execute("""
             SELECT a.id, a.fecha, l.nombre AS labor, a.id_estadoactividad, a.id_tipotrabajador,
@@ -240,11 +230,9 @@ def obtener_horas_trabajadas_colaborador(id_colaborador):
         cursor = conn.cursor(dictionary=True)
         
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         
         # Verificar que el colaborador existe y pertenece a la sucursal
         cursor.execute("""
@@ -285,20 +273,6 @@ def obtener_horas_trabajadas_colaborador(id_colaborador):
         cursor.close()
         conn.close()
         
-        # Formatear datos
-        for registro in horas_trabajadas:
-            # Convertir fecha a string
-            if isinstance(registro['fecha'], (date, datetime)):
-                registro['fecha'] = registro['fecha'].strftime('%Y-%m-%d')
-            
-            # Convertir valores numéricos a float
-            if 'rendimiento' in registro and registro['rendimiento'] is not None:
-                registro['rendimiento'] = float(registro['rendimiento'])
-            if 'horas_trabajadas' in registro and registro['horas_trabajadas'] is not None:
-                registro['horas_trabajadas'] = float(registro['horas_trabajadas'])
-            if 'horas_extras' in registro and registro['horas_extras'] is not None:
-                registro['horas_extras'] = float(registro['horas_extras'])
-        
         return jsonify({
             "colaborador": {
                 "id": colaborador['id'],
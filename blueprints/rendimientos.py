@@ -1,10 +1,14 @@
 import datetime
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
+from utils.streaming import formato_streaming, respuesta_streaming
+from utils.rollups import marcar_rollup
+from utils.sincronizacion import SinceInvalido, consultar_cambios, filtro_ids, obtener_since, registrar_cambio, respuesta_delta
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, date, timedelta
 from flask_cors import cross_origin
-import uuid
 
 
 rendimientos_bp = Blueprint('rendimientos_bp', __name__)
@@ -82,23 +86,20 @@ def crear_rendimiento():
             return jsonify({"error": "Falta id_actividad"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        # Consultar el tipo de trabajador de la actividad
-        cursor.execute("SELECT id_tipotrabajador FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
-        actividad_tipo = cursor.fetchone()
-        if not actividad_tipo:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "No se pudo determinar el tipo de trabajador de la actividad"}), 400
-        tipo_trabajador = actividad_tipo['id_tipotrabajador']
-        # Consultar el tipo de rendimiento de la actividad
-        cursor.execute("SELECT id_tiporendimiento FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
+        # Consultar el tipo de trabajador y de rendimiento de la actividad
+        cursor.execute("SELECT id_tipotrabajador, id_tiporendimiento FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
         actividad = cursor.fetchone()
         if not actividad:
             cursor.close()
             conn.close()
-            return jsonify({"error": "Actividad no encontrada"}), 404
+            return jsonify({"error": "No se pudo determinar el tipo de trabajador de la actividad"}), 400
+        tipo_trabajador = actividad['id_tipotrabajador']
         tipo = actividad['id_tiporendimiento']
-        ids_insertados = []
+
+        # Validar y preparar todo el lote antes de insertar
+        filas = []
+        errores = []
+        sql = None
         if tipo == 1:  # Individual
             sql = """
                 INSERT INTO tarja_fact_rendimientopropio (
@@ -107,60 +108,73 @@ def crear_rendimiento():
                     id_bono, id_porcentaje_individual
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """
-            for rendimiento in data:
-                nuevo_id = str(uuid.uuid4())
-                # Validación según tipo de trabajador
-                if tipo_trabajador == 1:
-                    if not rendimiento.get('id_colaborador'):
-                        return jsonify({"error": "Falta id_colaborador para trabajador propio"}), 400
-                    valores = (
-                        nuevo_id,
-                        rendimiento.get('id_actividad'),
-                        rendimiento.get('id_colaborador'),
-                        float(rendimiento.get('rendimiento', 0)),
-                        float(rendimiento.get('horas_trabajadas', 0)),
-                        float(rendimiento.get('horas_extras', 0)),
-                        rendimiento.get('id_bono'),
-                        rendimiento.get('id_porcentaje_individual')
-                    )
-                elif tipo_trabajador == 2:
-                    if not rendimiento.get('id_trabajador'):
-                        return jsonify({"error": "Falta id_trabajador para trabajador contratista"}), 400
-                    valores = (
-                        nuevo_id,
+            if tipo_trabajador == 1:
+                campo_trabajador = 'id_colaborador'
+                error_trabajador = "Falta id_colaborador para trabajador propio"
+            elif tipo_trabajador == 2:
+                campo_trabajador = 'id_trabajador'
+                error_trabajador = "Falta id_trabajador para trabajador contratista"
+            else:
+                cursor.close()
+                conn.close()
+                return jsonify({"error": "Tipo de trabajador no soportado"}), 400
+            for indice, rendimiento in enumerate(data):
+                if not rendimiento.get(campo_trabajador):
+                    errores.append({"indice": indice, "error": error_trabajador})
+                    continue
+                try:
+                    filas.append((
+                        generar_id(),
                         rendimiento.get('id_actividad'),
-                        rendimiento.get('id_trabajador'),
+                        rendimiento.get(campo_trabajador),
                         float(rendimiento.get('rendimiento', 0)),
                         float(rendimiento.get('horas_trabajadas', 0)),
                         float(rendimiento.get('horas_extras', 0)),
                         rendimiento.get('id_bono'),
                         rendimiento.get('id_porcentaje_individual')
-                    )
-                else:
-                    return jsonify({"error": "Tipo de trabajador no soportado"}), 400
-                cursor.execute(sql, valores)
-                ids_insertados.append(nuevo_id)
+                    ))
+                except (TypeError, ValueError) as e:
+                    errores.append({"indice": indice, "error": f"Valor numérico inválido: {str(e)}"})
         elif tipo == 2:  # Grupal
             sql = """
                 INSERT INTO tarja_fact_redimientogrupal (
                     id, id_actividad, rendimiento_total, cantidad_trab, id_porcentaje
                 ) VALUES (%s, %s, %s, %s, %s)
             """
-            for rendimiento in data:
-                nuevo_id = str(uuid.uuid4())
-                valores = (
-                    nuevo_id,
-                    rendimiento.get('id_actividad'),
-                    float(rendimiento.get('rendimiento_total', 0)),
-                    float(rendimiento.get('cantidad_trab', 0)),
-                    rendimiento.get('id_porcentaje')
-                )
-                cursor.execute(sql, valores)
-                ids_insertados.append(nuevo_id)
+            for indice, rendimiento in enumerate(data):
+                try:
+                    filas.append((
+                        generar_id(),
+                        rendimiento.get('id_actividad'),
+                        float(rendimiento.get('rendimiento_total', 0)),
+                        float(rendimiento.get('cantidad_trab', 0)),
+                        rendimiento.get('id_porcentaje')
+                    ))
+                except (TypeError, ValueError) as e:
+                    errores.append({"indice": indice, "error": f"Valor numérico inválido: {str(e)}"})
+
+        if errores:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": errores[0]["error"], "errores": errores}), 400
+
+        # Insertar todo el lote en una sola operación
+        if filas:
+            cursor.executemany(sql, filas)
+            if tipo == 1:
+                registrar_cambio(cursor, 'tarja_fact_rendimientopropio', [fila[0] for fila in filas])
+            else:
+                registrar_cambio(cursor, 'tarja_fact_redimientogrupal', [fila[0] for fila in filas])
         conn.commit()
         cursor.close()
         conn.close()
-        return jsonify({"message": "Rendimientos creados correctamente", "ids": ids_insertados}), 201
+        ids_insertados = [fila[0] for fila in filas]
+        return jsonify({
+            "message": "Rendimientos creados correctamente",
+            "ids": ids_insertados,
+            "resultados": [{"indice": indice, "id": id_rendimiento, "estado": "creado"}
+                           for indice, id_rendimiento in enumerate(ids_insertados)]
+        }), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -235,6 +249,7 @@ def editar_rendimiento(rendimiento_id):
             else:
                 return jsonify({"error": "Tipo de trabajador no soportado"}), 400
             cursor.execute(sql, valores)
+            registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
         elif tipo == 2:  # Grupal
             sql = """
                 UPDATE tarja_fact_redimientogrupal 
@@ -250,6 +265,7 @@ def editar_rendimiento(rendimiento_id):
                 rendimiento_id
             )
             cursor.execute(sql, valores)
+            registrar_cambio(cursor, 'tarja_fact_redimientogrupal', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -267,11 +283,9 @@ def crear_rendimiento_grupal():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         # Consultar sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             return jsonify({'error': 'No se encontró la sucursal activa del usuario'}), 400
-        id_sucursal = usuario['id_sucursalactiva']
         # Obtener datos del request
         data = request.get_json()
         campos_requeridos = ['id_actividad', 'rendimiento_total', 'cantidad_trab', 'id_porcentaje']
@@ -295,7 +309,7 @@ def crear_rendimiento_grupal():
         if not porcentaje:
             return jsonify({'error': 'Porcentaje no encontrado'}), 404
         # Insertar rendimiento grupal
-        nuevo_id = str(uuid.uuid4())
+        nuevo_id = generar_id()
         cursor.execute("""
             INSERT INTO tarja_fact_redimientogrupal 
             (id, id_actividad, rendimiento_total, cantidad_trab, id_porcentaje)
@@ -307,6 +321,7 @@ def crear_rendimiento_grupal():
             data['cantidad_trab'],
             data['id_porcentaje']
         ))
+        registrar_cambio(cursor, 'tarja_fact_redimientogrupal', nuevo_id, id_sucursal)
         conn.commit()
         return jsonify({
             'mensaje': 'Rendimiento grupal creado exitosamente',
@@ -344,7 +359,8 @@ def eliminar_rendimiento_individual(rendimiento_id):
             conn.close()
             return jsonify({"error": "Rendimiento no encontrado o no tienes permiso para eliminarlo"}), 404
         
-        # Eliminar el rendimiento
+        # Eliminar el rendimiento (el registro de cambio se anota antes, mientras la fila existe)
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id, eliminado=True)
         cursor.execute("DELETE FROM tarja_fact_rendimientopropio WHERE id = %s", (rendimiento_id,))
         conn.commit()
         
@@ -377,7 +393,8 @@ def eliminar_rendimiento_grupal(rendimiento_id):
             conn.close()
             return jsonify({"error": "Rendimiento grupal no encontrado o no tienes permiso para eliminarlo"}), 404
         
-        # Eliminar el rendimiento
+        # Eliminar el rendimiento (el registro de cambio se anota antes, mientras la fila existe)
+        registrar_cambio(cursor, 'tarja_fact_redimientogrupal', rendimiento_id, eliminado=True)
         cursor.execute("DELETE FROM tarja_fact_redimientogrupal WHERE id = %s", (rendimiento_id,))
         conn.commit()
         
@@ -392,18 +409,18 @@ def eliminar_rendimiento_grupal(rendimiento_id):
 @jwt_required()
 def obtener_rendimientos_individuales_propios():
     try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
         id_actividad = request.args.get('id_actividad')
 
         sql = """
@@ -429,27 +446,33 @@ def obtener_rendimientos_individuales_propios():
         if id_actividad:
             sql += " AND r.id_actividad = %s"
             params.append(id_actividad)
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'tarja_fact_rendimientopropio', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('r.id', ids_cambiados)
+            sql += filtro
+            params += params_filtro
         sql += " ORDER BY c.nombre ASC, c.apellido_paterno ASC, c.apellido_materno ASC, l.nombre ASC"
+
+        formato = None if since else formato_streaming()
+        if formato:
+            return respuesta_streaming(sql, tuple(params), formato)
+
         cursor.execute(sql, tuple(params))
         rendimientos = cursor.fetchall()
 
-        # Convertir valores numéricos a float para evitar redondeo
-        for rendimiento in rendimientos:
-            if 'rendimiento' in rendimiento and rendimiento['rendimiento'] is not None:
-                rendimiento['rendimiento'] = float(rendimiento['rendimiento'])
-            if 'horas_trabajadas' in rendimiento and rendimiento['horas_trabajadas'] is not None:
-                rendimiento['horas_trabajadas'] = float(rendimiento['horas_trabajadas'])
-            if 'horas_extras' in rendimiento and rendimiento['horas_extras'] is not None:
-                rendimiento['horas_extras'] = float(rendimiento['horas_extras'])
-
         cursor.close()
         conn.close()
 
+        if since:
+            return jsonify(respuesta_delta(rendimientos, ids_cambiados, token)), 200
+
         if not rendimientos:
             return jsonify([]), 200
 
         return jsonify(rendimientos), 200
 
+    except SinceInvalido as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -458,21 +481,20 @@ def obtener_rendimientos_individuales_propios():
 @jwt_required()
 def obtener_rendimientos_individuales_contratistas():
     try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
         usuario_id = get_jwt_identity()
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # Obtener rendimientos individuales de contratistas
-        cursor.execute("""
+        sql = """
             SELECT 
                 r.id,
                 r.id_actividad,
@@ -488,23 +510,87 @@ def obtener_rendimientos_individuales_contratistas():
             JOIN general_dim_trabajador t ON r.id_trabajador = t.id
             JOIN general_dim_porcentajecontratista p ON r.id_porcentaje_individual = p.id
             WHERE a.id_sucursalactiva = %s
-            ORDER BY t.nombre ASC, l.nombre ASC
-        """, (id_sucursal,))
+        """
+        params = [id_sucursal]
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'tarja_fact_rendimientocontratista', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('r.id', ids_cambiados)
+            sql += filtro
+            params += params_filtro
+        sql += " ORDER BY t.nombre ASC, l.nombre ASC"
+        cursor.execute(sql, tuple(params))
         rendimientos = cursor.fetchall()
 
-        # Convertir valores numéricos a float para evitar redondeo
-        for rendimiento in rendimientos:
-            if 'rendimiento' in rendimiento and rendimiento['rendimiento'] is not None:
-                rendimiento['rendimiento'] = float(rendimiento['rendimiento'])
-
         cursor.close()
         conn.close()
 
+        if since:
+            return jsonify(respuesta_delta(rendimientos, ids_cambiados, token)), 200
+
         if not rendimientos:
             return jsonify([]), 200
 
         return jsonify(rendimientos), 200
 
+    except SinceInvalido as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# 📌 Obtener rendimientos grupales de la sucursal activa
+@rendimientos_bp.route('/grupal', methods=['GET'])
+@jwt_required()
+def obtener_rendimientos_grupales():
+    try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
+        usuario_id = get_jwt_identity()
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # Obtener la sucursal activa del usuario
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+
+        if id_sucursal is None:
+            return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
+
+        sql = """
+            SELECT 
+                rg.id,
+                rg.id_actividad,
+                rg.rendimiento_total,
+                rg.cantidad_trab,
+                rg.id_porcentaje,
+                l.nombre as nombre_actividad
+            FROM tarja_fact_redimientogrupal rg
+            JOIN tarja_fact_actividad a ON rg.id_actividad = a.id
+            JOIN general_dim_labor l ON a.id_labor = l.id
+            WHERE a.id_sucursalactiva = %s
+        """
+        params = [id_sucursal]
+        id_actividad = request.args.get('id_actividad')
+        if id_actividad:
+            sql += " AND rg.id_actividad = %s"
+            params.append(id_actividad)
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'tarja_fact_redimientogrupal', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('rg.id', ids_cambiados)
+            sql += filtro
+            params += params_filtro
+        sql += " ORDER BY a.fecha DESC, l.nombre ASC"
+        cursor.execute(sql, tuple(params))
+        rendimientos = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        if since:
+            return jsonify(respuesta_delta(rendimientos, ids_cambiados, token)), 200
+
+        return jsonify(rendimientos), 200
+
+    except SinceInvalido as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -516,7 +602,7 @@ def crear_rendimiento_individual_propio():
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor()
-        rendimiento_id = str(uuid.uuid4())
+        rendimiento_id = generar_id()
 
         # Calcular horas_trabajadas a partir de la actividad
         cursor.execute("SELECT hora_inicio, hora_fin FROM tarja_fact_actividad WHERE id = %s", (data['id_actividad'],))
@@ -552,6 +638,7 @@ def crear_rendimiento_individual_propio():
             float(horas_extras),
             data.get('id_bono', None)
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -567,7 +654,7 @@ def crear_rendimiento_individual_contratista():
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor()
-        rendimiento_id = str(uuid.uuid4())
+        rendimiento_id = generar_id()
         sql = """
             INSERT INTO tarja_fact_rendimientocontratista 
             (id, id_actividad, id_trabajador, rendimiento, id_porcentaje_individual)
@@ -580,6 +667,7 @@ def crear_rendimiento_individual_contratista():
             float(data['rendimiento']),
             data['id_porcentaje_individual']
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientocontratista', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -616,6 +704,9 @@ def editar_rendimiento_individual_propio(rendimiento_id):
         if horas_extras is None:
             horas_extras = 0
 
+        # Puede cambiar de actividad: el día de la actividad anterior también queda pendiente
+        marcar_rollup(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
+
         sql = """
             UPDATE tarja_fact_rendimientopropio 
             SET id_actividad = %s, id_colaborador = %s, rendimiento = %s, 
@@ -631,6 +722,7 @@ def editar_rendimiento_individual_propio(rendimiento_id):
             data.get('id_bono', None),
             rendimiento_id
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -648,6 +740,8 @@ def editar_rendimiento_individual_contratista(rendimiento_id):
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor()
+        # Puede cambiar de actividad: el día de la actividad anterior también queda pendiente
+        marcar_rollup(cursor, 'tarja_fact_rendimientocontratista', rendimiento_id)
         sql = """
             UPDATE tarja_fact_rendimientocontratista 
             SET id_actividad = %s, id_trabajador = %s, rendimiento = %s, 
@@ -661,6 +755,7 @@ def editar_rendimiento_individual_contratista(rendimiento_id):
             data['id_porcentaje_individual'],
             rendimiento_id
         ))
+        registrar_cambio(cursor, 'tarja_fact_rendimientocontratista', rendimiento_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -675,6 +770,7 @@ def eliminar_rendimiento_individual_propio(rendimiento_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        registrar_cambio(cursor, 'tarja_fact_rendimientopropio', rendimiento_id, eliminado=True)
         sql = "DELETE FROM tarja_fact_rendimientopropio WHERE id = %s"
         cursor.execute(sql, (rendimiento_id,))
         conn.commit()
@@ -691,6 +787,7 @@ def eliminar_rendimiento_individual_contratista(rendimiento_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        registrar_cambio(cursor, 'tarja_fact_rendimientocontratista', rendimiento_id, eliminado=True)
         sql = "DELETE FROM tarja_fact_rendimientocontratista WHERE id = %s"
         cursor.execute(sql, (rendimiento_id,))
         conn.commit()
@@ -710,16 +807,13 @@ def obtener_rendimiento(rendimiento_id):
         cursor = conn.cursor(dictionary=True)
         
         # Obtener la sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
         
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
         
-        id_sucursal = usuario['id_sucursalactiva']
-        
         # Buscar el rendimiento en las diferentes tablas
         # 1. Buscar en rendimientos propios
         cursor.execute("""
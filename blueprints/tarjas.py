@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.streaming import formato_streaming, respuesta_streaming
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 tarjas_bp = Blueprint('tarjas_bp', __name__)
@@ -8,6 +9,11 @@ tarjas_bp = Blueprint('tarjas_bp', __name__)
 @jwt_required()
 def obtener_tarjas():
     try:
+        # ?stream=1 o Accept: application/x-ndjson envían las filas a medida que se leen
+        formato = formato_streaming()
+        if formato:
+            return respuesta_streaming("SELECT * FROM Tarjas", formato=formato)
+
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT * FROM Tarjas")
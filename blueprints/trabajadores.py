@@ -1,17 +1,31 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa
 from utils.validar_rut import validar_rut
-import uuid
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
+from utils.sincronizacion import SinceInvalido, consultar_cambios, filtro_ids, obtener_since, registrar_cambio, respuesta_delta
 
 
 trabajadores_bp = Blueprint('trabajadores_bp', __name__)
 
+# Orden para paginar los trabajadores (?limit=&cursor=)
+ORDEN_TRABAJADORES = [
+    Columna('t.nombre', 'nombre'),
+    Columna('t.apellido_paterno', 'apellido_paterno'),
+    Columna('t.apellido_materno', 'apellido_materno', si_nulo=''),
+    Columna('t.id', 'id'),
+]
+
 # Obtener trabajadores
 @trabajadores_bp.route('', methods=['GET'])  
 @jwt_required()
 def obtener_trabajadores():
     try:
+        # ?since= devuelve solo lo que cambió desde la última sincronización
+        since = obtener_since()
+        pagina = None if since else obtener_pagina(ORDEN_TRABAJADORES)
         id_contratista = request.args.get('id_contratista')
         id_sucursal = request.args.get('id_sucursal')
         usuario_id = get_jwt_identity()
@@ -21,11 +35,9 @@ def obtener_trabajadores():
 
         # Si no se pasa id_sucursal, usar la sucursal activa del usuario
         if not id_sucursal:
-            cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-            usuario = cursor.fetchone()
-            if not usuario or usuario['id_sucursalactiva'] is None:
+            id_sucursal = obtener_id_sucursal_activa(usuario_id)
+            if id_sucursal is None:
                 return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-            id_sucursal = usuario['id_sucursalactiva']
 
         base_query = """
             SELECT t.id, t.rut, t.codigo_verificador, t.nombre, t.apellido_paterno, t.apellido_materno,
@@ -39,15 +51,30 @@ def obtener_trabajadores():
             base_query += " AND t.id_contratista = %s"
             params.append(id_contratista)
 
-        base_query += " ORDER BY t.nombre, t.apellido_paterno, t.apellido_materno ASC"
+        if since:
+            ids_cambiados, token = consultar_cambios(cursor, 'general_dim_trabajador', since, id_sucursal)
+            filtro, params_filtro = filtro_ids('t.id', ids_cambiados)
+            base_query += filtro
+            params += params_filtro
+        if pagina:
+            base_query += pagina.condicion + pagina.orden_sql
+            params += pagina.params + pagina.params_limite
+        else:
+            base_query += " ORDER BY t.nombre, t.apellido_paterno, t.apellido_materno ASC"
 
         cursor.execute(base_query, tuple(params))
         trabajadores = cursor.fetchall()
 
         cursor.close()
         conn.close()
+        if since:
+            return jsonify(respuesta_delta(trabajadores, ids_cambiados, token)), 200
+        if pagina:
+            return jsonify(pagina.responder(trabajadores)), 200
         return jsonify(trabajadores), 200
 
+    except (PaginacionInvalida, SinceInvalido) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -75,16 +102,13 @@ def crear_trabajador():
         cursor = conn.cursor(dictionary=True)
 
         # Obtener sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             return jsonify({"error": "No se pudo obtener la sucursal activa"}), 400
 
-        id_sucursal = usuario['id_sucursalactiva']
-
         # Crear trabajador
-        trabajador_id = str(uuid.uuid4())
+        trabajador_id = generar_id()
         sql = """
             INSERT INTO general_dim_trabajador (
                 id, rut, codigo_verificador, nombre, apellido_paterno, apellido_materno,
@@ -103,6 +127,7 @@ def crear_trabajador():
             data['id_estado'],
             id_sucursal
         ))
+        registrar_cambio(cursor, 'general_dim_trabajador', trabajador_id, id_sucursal)
 
         conn.commit()
         cursor.close()
@@ -160,6 +185,7 @@ def editar_trabajador(trabajador_id):
             id_contratista, id_porcentaje, id_estado,
             trabajador_id
         ))
+        registrar_cambio(cursor, 'general_dim_trabajador', trabajador_id, id_sucursal_activa)
 
         conn.commit()
         cursor.close()
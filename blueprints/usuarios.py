@@ -1,15 +1,30 @@
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from utils.ids import generar_id
+from utils.sucursal import obtener_id_sucursal_activa, invalidar_sucursal_activa
+from utils.usuario_actual import usuario_actual, marcar_cambio_usuario, crear_token_acceso
+from utils.streaming import formato_streaming, respuesta_streaming
+from utils.paginacion import Columna, PaginacionInvalida, obtener_pagina
+from utils.claves import ClavesSaturadas, hash_clave, respuesta_saturada
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import bcrypt
 from datetime import date
-import uuid
 
 
 usuarios_bp = Blueprint('usuarios_bp', __name__)
 
+# Orden para paginar los usuarios (?limit=&cursor=)
+ORDEN_USUARIOS = [
+    Columna('u.fecha_creacion', 'fecha_creacion', descendente=True, si_nulo='1000-01-01 00:00:00'),
+    Columna('u.id', 'id', descendente=True),
+]
+
 def verificar_admin(usuario_id):
-    """Verifica si el usuario tiene perfil de administrador (id_perfil = 3)"""
+    """
+    Verifica si el usuario tiene perfil de administrador (id_perfil = 3).
+    Para el usuario de la petición se usa el perfil del token si sigue vigente.
+    """
+    if usuario_id == usuario_actual.id:
+        return usuario_actual.perfil == 3
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT id_perfil FROM general_dim_usuario WHERE id = %s", (usuario_id,))
@@ -27,22 +42,39 @@ def obtener_usuarios():
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        sql = """
     SELECT 
         u.id, u.id_sucursalactiva, u.usuario, u.nombre, u.apellido_paterno, u.apellido_materno, 
         u.clave, u.fecha_creacion, u.id_estado, u.correo, u.id_rol, u.id_perfil,
         s.nombre AS nombre_sucursal
     FROM general_dim_usuario u
     LEFT JOIN general_dim_sucursal s ON u.id_sucursalactiva = s.id
-    ORDER BY u.fecha_creacion DESC
-""")
+    WHERE 1 = 1
+"""
+        formato = formato_streaming()
+        if formato:
+            return respuesta_streaming(sql + " ORDER BY u.fecha_creacion DESC", formato=formato)
+
+        pagina = obtener_pagina(ORDEN_USUARIOS)
+        params = []
+        if pagina:
+            sql += pagina.condicion + pagina.orden_sql
+            params += pagina.params + pagina.params_limite
+        else:
+            sql += " ORDER BY u.fecha_creacion DESC"
+
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, tuple(params))
 
         usuarios = cursor.fetchall()
         cursor.close()
         conn.close()
+        if pagina:
+            return jsonify(pagina.responder(usuarios)), 200
         return jsonify(usuarios), 200
+    except PaginacionInvalida as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -145,8 +177,7 @@ def crear_usuario():
             return jsonify({"error": "Ya existe un usuario con ese nombre de usuario o correo"}), 400
 
         # Generar hash bcrypt
-        salt = bcrypt.gensalt()
-        clave_encriptada = bcrypt.hashpw(clave.encode('utf-8'), salt).decode('utf-8')
+        clave_encriptada = hash_clave(clave)
 
         # Valores por defecto para campos ocultos
         id_estado = 1  # Activo por defecto
@@ -156,7 +187,7 @@ def crear_usuario():
             id_perfil = 1  # Perfil 1 por defecto
 
         # Generar UUID para el usuario
-        usuario_id = str(uuid.uuid4())
+        usuario_id = generar_id()
 
         # Insertar usuario
         cursor.execute("""
@@ -169,7 +200,7 @@ def crear_usuario():
               clave_encriptada, date.today(), id_estado, correo, id_rol, id_perfil))
         
         # Asignar permiso a la app (id_app = 2)
-        pivot_id = str(uuid.uuid4())
+        pivot_id = generar_id()
         cursor.execute("""
             INSERT INTO usuario_pivot_app_usuario (id, id_usuario, id_app)
             VALUES (%s, %s, %s)
@@ -193,6 +224,8 @@ def crear_usuario():
             "id_estado": id_estado
         }), 201
         
+    except ClavesSaturadas:
+        return respuesta_saturada()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -280,8 +313,7 @@ def editar_usuario(usuario_id):
 
         # Preparar la actualización
         if clave:  # Solo si se envió una nueva clave
-            salt = bcrypt.gensalt()
-            clave_encriptada = bcrypt.hashpw(clave.encode('utf-8'), salt).decode('utf-8')
+            clave_encriptada = hash_clave(clave)
             sql = """
                 UPDATE general_dim_usuario 
                 SET usuario = %s, nombre = %s, apellido_paterno = %s, apellido_materno = %s, 
@@ -300,8 +332,11 @@ def editar_usuario(usuario_id):
         
         cursor.execute(sql, valores)
         filas_afectadas = cursor.rowcount
+        if filas_afectadas:
+            marcar_cambio_usuario(cursor, usuario_id)
         
         conn.commit()
+        invalidar_sucursal_activa(usuario_id)
         cursor.close()
         conn.close()
 
@@ -319,6 +354,8 @@ def editar_usuario(usuario_id):
             "filas_afectadas": filas_afectadas
         }), 200
         
+    except ClavesSaturadas:
+        return respuesta_saturada()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -328,20 +365,19 @@ def editar_usuario(usuario_id):
 def eliminar_usuario(usuario_id):
     usuario_logueado = get_jwt_identity()
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     # Verificar si el usuario logueado es administrador
-    cursor.execute("SELECT id_perfil FROM general_dim_usuario WHERE id = %s", (usuario_logueado,))
-    usuario = cursor.fetchone()
-    if not usuario or usuario['id_perfil'] != 3:
-        cursor.close()
-        conn.close()
+    if not verificar_admin(usuario_logueado):
         return jsonify({"error": "No autorizado"}), 403
 
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
     try:
         cursor.execute("DELETE FROM general_dim_usuario WHERE id = %s", (usuario_id,))
+        if cursor.rowcount:
+            marcar_cambio_usuario(cursor, usuario_id, eliminado=True)
         conn.commit()
+        invalidar_sucursal_activa(usuario_id)
         cursor.close()
         conn.close()
 
@@ -355,19 +391,12 @@ def obtener_sucursal_usuario():
     try:
         usuario_id = get_jwt_identity()
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-
-        cursor.close()
-        conn.close()
-
-        if not usuario or not usuario['id_sucursalactiva']:
+        if not id_sucursal:
             return jsonify({"error": "Usuario no encontrado o sin sucursal asignada"}), 404
 
-        return jsonify({"id_sucursal": usuario['id_sucursalactiva']}), 200
+        return jsonify({"id_sucursal": id_sucursal}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -403,25 +432,35 @@ def actualizar_sucursal_activa():
                 SET id_sucursalactiva = %s 
                 WHERE id = %s
             """, (nueva_sucursal, usuario_id))
+        rol, perfil = usuario_actual.rol, usuario_actual.perfil
+        marcar_cambio_usuario(cursor, usuario_id)
             
         conn.commit()
+        invalidar_sucursal_activa(usuario_id)
 
-            # Obtener el nombre de la sucursal para la respuesta
+            # Sucursal y nombre tal como quedaron en la BD (el id del JSON puede venir como texto)
         cursor.execute("""
-                SELECT nombre 
-                FROM general_dim_sucursal 
-                WHERE id = %s
-            """, (nueva_sucursal,))
+                SELECT u.id_sucursalactiva, s.nombre 
+                FROM general_dim_usuario u
+                LEFT JOIN general_dim_sucursal s ON u.id_sucursalactiva = s.id
+                WHERE u.id = %s
+            """, (usuario_id,))
             
         sucursal = cursor.fetchone()
 
         cursor.close()
         conn.close()
 
+        # Token nuevo con la sucursal actualizada
+        access_token = crear_token_acceso(
+            usuario_id, rol, perfil, sucursal['id_sucursalactiva'], sucursal['nombre']
+        )
+
         return jsonify({
                 "message": "Sucursal actualizada correctamente",
-                "id_sucursal": nueva_sucursal,
-                "sucursal_nombre": sucursal['nombre'] if sucursal else None
+                "id_sucursal": sucursal['id_sucursalactiva'],
+                "sucursal_nombre": sucursal['nombre'],
+                "access_token": access_token
             }), 200
 
     except Exception as e:
@@ -434,19 +473,12 @@ def obtener_sucursal_activa():
     usuario_id = get_jwt_identity()
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
 
-        cursor.close()
-        conn.close()
-
-        if not usuario or usuario['id_sucursalactiva'] is None:
+        if id_sucursal is None:
             return jsonify({"error": "No se encontró la sucursal activa"}), 404
 
-        return jsonify({"sucursal_activa": usuario['id_sucursalactiva']}), 200
+        return jsonify({"sucursal_activa": id_sucursal}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -461,13 +493,11 @@ def obtener_colaboradores():
     cursor = conn.cursor(dictionary=True)
     if not id_sucursal:
         # Buscar sucursal activa del usuario
-        cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
-        usuario = cursor.fetchone()
-        if not usuario or not usuario['id_sucursalactiva']:
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if not id_sucursal:
             cursor.close()
             conn.close()
             return jsonify({"error": "No se encontró la sucursal activa del usuario"}), 400
-        id_sucursal = usuario['id_sucursalactiva']
     # Buscar colaboradores activos de la sucursal
     cursor.execute("""
         SELECT id, nombre, apellido_paterno, apellido_materno, rut, codigo_verificador, id_cargo
@@ -740,7 +770,7 @@ def asignar_apps_permitidas(usuario_id):
         if apps_ids:
             for app_id in apps_ids:
                 # Generar UUID para el id de la tabla pivote
-                pivot_id = str(uuid.uuid4())
+                pivot_id = generar_id()
                 cursor.execute("""
                     INSERT INTO usuario_pivot_app_usuario (id, id_usuario, id_app)
                     VALUES (%s, %s, %s)
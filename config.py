@@ -21,6 +21,54 @@ class Config:
     DB_USER = os.getenv("DB_USER", "UserApp")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "&8y7c()tu9t/+,6`")
     DB_NAME = os.getenv("DB_NAME", "lahornilla_base_normalizada")
+
+    # Pool de conexiones MySQL (por proceso)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # segundos
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # segundos de espera por una conexión
+    DB_POOL_PING_INTERVAL = int(os.getenv("DB_POOL_PING_INTERVAL", "5"))  # verificar si estuvo ociosa más de N segundos
+
+    # Caché de la sucursal activa por usuario
+    SUCURSAL_CACHE_TTL = int(os.getenv("SUCURSAL_CACHE_TTL", "60"))  # segundos
+    SUCURSAL_CACHE_MAX = int(os.getenv("SUCURSAL_CACHE_MAX", "5000"))
+
+    # Claims del token (rol, perfil, sucursal): cada cuántos segundos se relee
+    # el log de cambios de usuarios hechos por otros procesos
+    CLAIMS_REFRESCO = int(os.getenv("CLAIMS_REFRESCO", "5"))
+
+    # Caché de catálogos (tablas de dimensión) del blueprint de opciones
+    CATALOGO_CACHE_TTL = int(os.getenv("CATALOGO_CACHE_TTL", "300"))  # segundos, si la tabla no define el suyo
+
+    # Índices en memoria por sucursal (árbol productivo, topología de riego)
+    JERARQUIA_CACHE_TTL = int(os.getenv("JERARQUIA_CACHE_TTL", "600"))  # segundos
+    JERARQUIA_CACHE_MAX = int(os.getenv("JERARQUIA_CACHE_MAX", "200"))  # sucursales por índice
+
+    # Resúmenes diarios (rollups) de los indicadores
+    INDICADORES_ROLLUP = os.getenv("INDICADORES_ROLLUP", "True") == "True"  # False: consultar siempre las vistas
+    ROLLUP_LOTE = int(os.getenv("ROLLUP_LOTE", "200"))  # días recalculados por llamada
+    ROLLUP_LOTE_LECTURA = int(os.getenv("ROLLUP_LOTE_LECTURA", "3"))  # días pendientes recalculados al consultar
+
+    # Caché de resultados de /api/indicadores por sucursal, usuario y filtros
+    INDICADORES_CACHE_TTL = int(os.getenv("INDICADORES_CACHE_TTL", "60"))  # segundos
+    INDICADORES_CACHE_MAX = int(os.getenv("INDICADORES_CACHE_MAX", "500"))  # respuestas guardadas
+
+    # Peticiones GET idénticas y simultáneas comparten una sola ejecución
+    COALESCER_GET = os.getenv("COALESCER_GET", "True") == "True"
+    COALESCER_ESPERA = int(os.getenv("COALESCER_ESPERA", "30"))  # segundos esperando a la petición en curso
+
+    # Compresión de respuestas (gzip, y brotli si está instalado)
+    COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))  # no comprimir respuestas más chicas
+    COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))  # 1-9
+    COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "5"))  # 0-11
+    COMPRESION_CACHE_MAX = int(os.getenv("COMPRESION_CACHE_MAX", "256"))  # respuestas con ETag ya comprimidas
+    COMPRESION_CACHE_TTL = int(os.getenv("COMPRESION_CACHE_TTL", "600"))  # segundos
+    
+    # Hashing de claves (bcrypt) en un pool de hilos acotado
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # costo; las claves con otro costo se re-hashean al iniciar sesión
+    BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    BCRYPT_COLA_MAX = int(os.getenv("BCRYPT_COLA_MAX", "16"))  # trabajos en espera antes de responder 503
+    BCRYPT_TIMEOUT = int(os.getenv("BCRYPT_TIMEOUT", "10"))  # segundos de espera por un hash
     
     JWT_SECRET_KEY = 'Inicio01*'  # ✅ Esta clave es usada por Flask-JWT-Extended
     SECRET_KEY = 'Inicio01*'
@@ -0,0 +1,69 @@
+"""
+Configuración de gunicorn (Dockerfile: gunicorn -c gunicorn.conf.py app:app).
+
+Los handlers pasan casi todo el tiempo esperando a MySQL, así que cada
+worker atiende varias peticiones a la vez con hilos (gthread). Cada
+petición usa una conexión del pool mientras dura, por lo que más hilos que
+DB_POOL_MAX solo esperarían una conexión libre; además se limitan por CPU
+porque la serialización JSON y bcrypt sí ocupan CPU.
+
+Todo se puede ajustar por variables de entorno (GUNICORN_*). Para comparar
+modos: python benchmarks/bench_servidor.py
+"""
+import logging
+import os
+from config import Config
+
+cpus = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# gthread: un proceso por CPU, con hilos. 'gevent' requiere instalar gevent
+# y usar el conector MySQL puro (el de extensión C bloquea el loop).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", str(cpus)))
+threads = int(os.getenv("GUNICORN_THREADS", str(max(1, min(Config.DB_POOL_MAX, 8 * cpus)))))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", str(Config.DB_POOL_MAX)))  # solo gevent
+
+# Cargar la app una vez antes de crear los workers: arranque más rápido y
+# memoria compartida. post_fork descarta el pool que se haya creado en el
+# proceso principal y post_worker_init abre las DB_POOL_MIN conexiones del
+# pool propio de cada worker antes de que atienda peticiones.
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Mayor que el tiempo ocioso del balanceador, para que no corte conexiones reutilizables
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# Reciclar cada worker tras N peticiones (con variación para que no se
+# reinicien todos a la vez)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Heartbeat de los workers en memoria (en Docker /tmp puede estar en disco)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def post_fork(server, worker):
+    from utils.db import descartar_pool
+    descartar_pool()
+
+
+def post_worker_init(worker):
+    from utils.db import precalentar_pool
+    try:
+        precalentar_pool()
+    except Exception as e:
+        # Sin BD al arrancar el worker igual atiende; las conexiones se abren al usarlas
+        worker.log.warning(f"⚠️ No se pudo precalentar el pool de conexiones: {str(e)}")
+
+
+def when_ready(server):
+    logging.getLogger("gunicorn.error").info(
+        f"🚀 gunicorn listo: {worker_class}, {workers} worker(s) x {threads} hilo(s), "
+        f"pool BD max={Config.DB_POOL_MAX}, preload={preload_app}"
+    )
@@ -0,0 +1,20 @@
+-- Registro de cambios para la sincronización incremental (?since=) de la app móvil.
+-- Lo mantienen los endpoints que escriben en actividades, rendimientos,
+-- colaboradores y trabajadores (ver utils/sincronizacion.py).
+
+CREATE TABLE IF NOT EXISTS tarja_log_cambio (
+    seq BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    tabla VARCHAR(64) NOT NULL,
+    id_registro VARCHAR(64) NOT NULL,
+    id_sucursal INT NULL,
+    operacion ENUM('upsert', 'delete') NOT NULL,
+    fecha TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (seq),
+    KEY idx_log_cambio_tabla_seq (tabla, seq),
+    KEY idx_log_cambio_tabla_fecha (tabla, fecha),
+    KEY idx_log_cambio_fecha (fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Limpieza periódica sugerida: los clientes que no sincronizan hace más de
+-- 90 días deben hacer una sincronización completa (since=0).
+-- DELETE FROM tarja_log_cambio WHERE fecha < NOW() - INTERVAL 90 DAY;
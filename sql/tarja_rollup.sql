@@ -0,0 +1,61 @@
+-- Resúmenes diarios (rollups) para los endpoints de /api/indicadores.
+-- Los recalcula utils/rollups.py por día y sucursal: los endpoints de escritura
+-- marcan el día en tarja_rollup_pendiente y POST /api/indicadores/rollup/refrescar
+-- (o ?fresco=1 en la consulta) los vuelve a calcular desde las vistas.
+--
+-- Las tablas de resumen toman los tipos de columna de las vistas.
+
+CREATE TABLE IF NOT EXISTS tarja_rollup_horas_diarias AS
+SELECT v.id_sucursal, v.id_usuario, v.id_colaborador, v.colaborador, v.fecha, v.id_empresa,
+       SUM(v.horas_trabajadas) AS horas_trabajadas
+FROM v_tarja_tarjamovil_controlhoras v
+WHERE 1 = 0
+GROUP BY v.id_sucursal, v.id_usuario, v.id_colaborador, v.colaborador, v.fecha, v.id_empresa;
+
+ALTER TABLE tarja_rollup_horas_diarias
+    ADD KEY idx_rollup_horas_sucursal_usuario_fecha (id_sucursal, id_usuario, fecha),
+    ADD KEY idx_rollup_horas_sucursal_fecha (id_sucursal, fecha);
+
+CREATE TABLE IF NOT EXISTS tarja_rollup_rendimiento_diario AS
+SELECT v.id_sucursal, v.id_usuario, v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo,
+       v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco, v.detalle_ceco, v.id_unidad, v.unidad,
+       SUM(v.rendimiento) AS total_rendimiento,
+       COUNT(DISTINCT CASE WHEN v.id_trabajador IS NOT NULL THEN v.id_trabajador END) AS total_trabajadores_individuales,
+       COUNT(DISTINCT CASE WHEN v.id_trabajador IS NULL THEN v.grupo_mo END) AS total_grupos,
+       SUM(CASE WHEN v.id_trabajador IS NOT NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_individuales,
+       SUM(CASE WHEN v.id_trabajador IS NULL THEN v.cantidad_trab ELSE 0 END) AS total_cantidad_grupales
+FROM v_tarja_tarjamovil_controlrendimiento v
+WHERE 1 = 0
+GROUP BY v.id_sucursal, v.id_usuario, v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo,
+         v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco, v.detalle_ceco, v.id_unidad, v.unidad;
+
+ALTER TABLE tarja_rollup_rendimiento_diario
+    ADD KEY idx_rollup_rend_sucursal_usuario_fecha (id_sucursal, id_usuario, fecha),
+    ADD KEY idx_rollup_rend_sucursal_fecha (id_sucursal, fecha);
+
+-- Días (sucursal, fecha) que cambiaron y falta recalcular
+CREATE TABLE IF NOT EXISTS tarja_rollup_pendiente (
+    id_sucursal INT NOT NULL,
+    fecha DATE NOT NULL,
+    marcado_en TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (id_sucursal, fecha),
+    KEY idx_rollup_pendiente_marcado (marcado_en)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Último recálculo por sucursal (indicador de frescura de las respuestas) y
+-- desde qué fecha están todos los días (carga inicial con ventana_dias).
+-- Las consultas que empiezan antes de cubierto_desde van a las vistas.
+CREATE TABLE IF NOT EXISTS tarja_rollup_estado (
+    id_sucursal INT NOT NULL,
+    actualizado_en TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    cubierto_desde DATE NULL,
+    PRIMARY KEY (id_sucursal)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Bases donde ya se aplicó una versión anterior de este script:
+-- ALTER TABLE tarja_rollup_estado ADD COLUMN cubierto_desde DATE NULL;
+
+-- Carga inicial: marcar la temporada y recalcular por lotes desde la API,
+-- que además anota cubierto_desde en tarja_rollup_estado:
+-- POST /api/indicadores/rollup/refrescar {"ventana_dias": 365}
+-- (repetir sin ventana_dias hasta que dias_recalculados sea 0)
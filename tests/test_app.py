@@ -0,0 +1,963 @@
+import datetime
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import app as flask_app
+import blueprints.actividades_multiples as actividades_multiples
+
+
+class CursorFalso:
+    """Cursor que registra cada consulta y responde según la tabla consultada."""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self._filas = []
+
+    def execute(self, sql, params=None):
+        self.conexion.consultas.append(sql)
+        params = list(params or [])
+        if 'FROM tarja_fact_actividad a' in sql:
+            self._filas = [{
+                'id': f'act-{i}',
+                'fecha': datetime.date(2025, 7, 1),
+                'id_estadoactividad': 1,
+                'id_labor': 1,
+                'id_unidad': 1,
+                'id_tipotrabajador': 1,
+                'id_tiporendimiento': 3,
+                'id_contratista': None,
+                'id_sucursalactiva': 103,
+                'id_tipoceco': 2,
+                'hora_inicio': datetime.timedelta(hours=8),
+                'hora_fin': datetime.timedelta(hours=17),
+                'tarifa': 1000,
+                'nombre_labor': 'Poda',
+                'nombre_unidad': 'Jornada',
+                'nombre_tipotrabajador': 'Propio',
+                'nombre_tiporendimiento': 'Múltiple',
+                'nombre_tipoceco': 'Productivo',
+                'nombre_estado': 'Creada',
+                'nombre_sucursal': 'SANTA VICTORIA',
+                'tiene_rendimientos_multiples': 0,
+            } for i in range(self.conexion.total_actividades)]
+        elif 'FROM tarja_fact_cecoproductivo' in sql:
+            self._filas = [{
+                'id_actividad': id_actividad,
+                'id_ceco': 10,
+                'id_ceco_disponible': 10,
+                'nombre_ceco': 'CECO 10',
+                'id_cuartel': 5,
+                'nombre_cuartel': 'Cuartel 5',
+            } for id_actividad in params]
+        else:
+            self._filas = []
+
+    def fetchall(self):
+        return self._filas
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, total_actividades):
+        self.total_actividades = total_actividades
+        self.consultas = []
+
+    def cursor(self, *args, **kwargs):
+        return CursorFalso(self)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cliente():
+    flask_app.config['TESTING'] = True
+    with flask_app.test_client() as cliente:
+        yield cliente
+
+
+def _consultar_con_cecos(cliente, monkeypatch, total_actividades):
+    conexion = ConexionFalsa(total_actividades)
+    monkeypatch.setattr(actividades_multiples, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(actividades_multiples, 'obtener_id_sucursal_activa', lambda usuario_id: 103)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    respuesta = cliente.get(
+        '/api/actividades_multiples/con-cecos',
+        headers={'Authorization': f'Bearer {token}'}
+    )
+    return respuesta, conexion.consultas
+
+
+def test_con_cecos_cantidad_de_consultas_constante(cliente, monkeypatch):
+    respuesta_una, consultas_una = _consultar_con_cecos(cliente, monkeypatch, 1)
+    respuesta_muchas, consultas_muchas = _consultar_con_cecos(cliente, monkeypatch, 60)
+
+    assert respuesta_una.status_code == 200
+    assert respuesta_muchas.status_code == 200
+    assert respuesta_muchas.get_json()['count'] == 60
+    assert len(consultas_una) == len(consultas_muchas)
+
+
+def test_con_cecos_mantiene_forma_de_respuesta(cliente, monkeypatch):
+    respuesta, _ = _consultar_con_cecos(cliente, monkeypatch, 2)
+    actividad = respuesta.get_json()['data'][0]
+
+    assert actividad['fecha'] == '2025-07-01'
+    assert actividad['hora_inicio'] == '8:00:00'
+    assert actividad['cecos_productivos'] == [
+        {'id_ceco': 10, 'nombre_ceco': 'CECO 10', 'id_cuartel': 5, 'nombre_cuartel': 'Cuartel 5'}
+    ]
+    assert actividad['cecos_riego'] == []
+    assert actividad['cecos_disponibles_rendimientos'] == [
+        {'id_ceco': 10, 'nombre_ceco': 'CECO 10', 'tipo_ceco': 'productivo'}
+    ]
+    assert actividad['rendimientos_existentes'] == actividad['rendimientos_multiples'] == []
+
+
+class CursorStreamingFalso:
+    def __init__(self, filas):
+        self._filas = list(filas)
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchmany(self, cantidad):
+        lote, self._filas = self._filas[:cantidad], self._filas[cantidad:]
+        return lote
+
+    def close(self):
+        pass
+
+
+class PoolStreamingFalso:
+    def __init__(self, filas):
+        self.filas = filas
+        self.devueltas = 0
+
+    def obtener(self):
+        pool = self
+
+        class Prestada:
+            def cursor(self, *args, **kwargs):
+                return CursorStreamingFalso(pool.filas)
+
+            def close(self):
+                pool.devueltas += 1
+
+        return Prestada()
+
+
+def test_tarjas_en_streaming(cliente, monkeypatch):
+    import utils.streaming as streaming
+    filas = [{'id': i, 'fecha': datetime.date(2025, 7, 1)} for i in range(1200)]
+    pool = PoolStreamingFalso(filas)
+    monkeypatch.setattr('utils.db.obtener_pool', lambda: pool)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    respuesta = cliente.get('/api/tarjas/?stream=1', headers=headers)
+    assert respuesta.get_json() == [{'id': i, 'fecha': '2025-07-01'} for i in range(1200)]
+
+    respuesta = cliente.get('/api/tarjas/', headers={**headers, 'Accept': 'application/x-ndjson'})
+    lineas = respuesta.get_data(as_text=True).splitlines()
+    assert respuesta.mimetype == 'application/x-ndjson'
+    assert len(lineas) == 1200
+    assert pool.devueltas == 2
+
+
+def test_streaming_usa_la_conexion_de_la_peticion_y_marca_errores(monkeypatch):
+    from utils.db import get_db_connection
+    from utils.streaming import respuesta_streaming
+
+    class CursorConError(CursorStreamingFalso):
+        def fetchmany(self, cantidad):
+            if len(self._filas) < 3:
+                raise RuntimeError('conexión perdida')
+            return super().fetchmany(cantidad)
+
+    class PoolContado(PoolStreamingFalso):
+        prestamos = 0
+
+        def obtener(self):
+            self.prestamos += 1
+            prestada = super().obtener()
+            prestada.cursor = lambda *args, **kwargs: CursorConError(self.filas)
+            return prestada
+
+    pool = PoolContado([{'id': i} for i in range(4)])
+    monkeypatch.setattr('utils.db.obtener_pool', lambda: pool)
+    with flask_app.test_request_context():
+        get_db_connection()  # p. ej. verificar_admin antes de responder
+        respuesta = respuesta_streaming('SELECT ...', formato='json', tamano_lote=2)
+        cuerpo = ''.join(respuesta.response)
+
+    assert pool.prestamos == 1
+    assert pool.devueltas == 1
+    assert json.loads(cuerpo) == [{'id': 0}, {'id': 1}, {'error': 'conexión perdida'}]
+
+
+def test_paginacion_keyset_cursor_y_condicion():
+    from utils.paginacion import Columna, Pagina, decodificar_cursor
+
+    columnas = [Columna('a.fecha', 'fecha', descendente=True), Columna('a.id', 'id', descendente=True)]
+    filas = [{'id': f'act-{i}', 'fecha': datetime.date(2025, 7, 3 - i)} for i in range(3)]
+
+    respuesta = Pagina(columnas, 2).responder(list(filas))
+    assert respuesta['data'] == filas[:2]
+    valores = decodificar_cursor(respuesta['next_cursor'])
+    assert valores == ['2025-07-02', 'act-1']
+
+    siguiente = Pagina(columnas, 2, valores)
+    assert siguiente.condicion == ' AND (a.fecha, a.id) < (%s, %s)'
+    assert siguiente.params == valores
+    assert Pagina(columnas, 2).responder(filas[2:])['next_cursor'] is None
+
+
+@pytest.mark.parametrize('token', ['W3siYSI6IDF9LCAieCJd', 'W1sxXSwgIngiXQ', 'eyJhIjogMX0', 'no-es-base64!'])
+def test_paginacion_rechaza_cursor_con_valores_no_simples(token):
+    from utils.paginacion import PaginacionInvalida, decodificar_cursor
+    with pytest.raises(PaginacionInvalida):
+        decodificar_cursor(token)
+
+
+def test_paginacion_usuarios_incluye_fecha_creacion_nula():
+    from blueprints.usuarios import ORDEN_USUARIOS
+    from utils.paginacion import Pagina
+
+    pagina = Pagina(ORDEN_USUARIOS, 10, ['1000-01-01 00:00:00', 'u-9'])
+    assert 'COALESCE(u.fecha_creacion' in pagina.condicion
+    assert ORDEN_USUARIOS[0].valor({'fecha_creacion': None, 'id': 'u-9'}) == '1000-01-01 00:00:00'
+
+
+def test_respuesta_delta_informa_eliminados():
+    from utils.sincronizacion import filtro_ids, respuesta_delta
+
+    assert filtro_ids('t.id', None) == ('', [])
+    assert filtro_ids('t.id', []) == (' AND 1 = 0', [])
+    assert filtro_ids('t.id', ['a', 'b']) == (' AND t.id IN (%s, %s)', ['a', 'b'])
+
+    filas = [{'id': 'a', 'nombre': 'Juan'}]
+    respuesta = respuesta_delta(filas, ['a', 'b'], 42)
+    assert respuesta == {'data': filas, 'eliminados': ['b'], 'since': '42', 'completo': False}
+    assert respuesta_delta(filas, None, 42)['eliminados'] == []
+    assert respuesta_delta(filas, None, 42)['completo'] is True
+
+
+def test_catalogo_responde_304_con_etag(cliente, monkeypatch):
+    import blueprints.opciones as opciones
+    monkeypatch.setattr(opciones, 'consultar_catalogo', lambda *args, **kwargs: [{'id': 1, 'nombre': 'Propio'}])
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    respuesta = cliente.get('/api/opciones/tipotrabajadores', headers=headers)
+    etag = respuesta.headers['ETag']
+    assert respuesta.status_code == 200
+    assert 'max-age=300' in respuesta.headers['Cache-Control']
+
+    respuesta = cliente.get('/api/opciones/tipotrabajadores', headers={**headers, 'If-None-Match': etag})
+    assert respuesta.status_code == 304
+    assert respuesta.get_data() == b''
+
+
+def test_catalogo_comprimido_con_etag_debil(cliente, monkeypatch):
+    import gzip
+    import blueprints.opciones as opciones
+    filas = [{'id': i, 'nombre': f'Tipo de trabajador {i}'} for i in range(200)]
+    monkeypatch.setattr(opciones, 'consultar_catalogo', lambda *args, **kwargs: filas)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': 'gzip'}
+
+    respuesta = cliente.get('/api/opciones/tipotrabajadores', headers=headers)
+    assert respuesta.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in respuesta.headers['Vary']
+    etag = respuesta.headers['ETag']
+    assert etag.startswith('W/')
+    assert flask_app.json.loads(gzip.decompress(respuesta.get_data())) == filas
+
+    respuesta = cliente.get('/api/opciones/tipotrabajadores', headers={**headers, 'If-None-Match': etag})
+    assert respuesta.status_code == 304
+
+
+def test_claves_hash_en_pool_y_rechazo_por_saturacion(monkeypatch):
+    import threading
+    from config import Config
+    import utils.claves as claves
+    monkeypatch.setattr(Config, 'BCRYPT_ROUNDS', 4)
+
+    hash_guardado = claves.hash_clave('secreta')
+    assert hash_guardado.startswith('$2b$04$')
+    assert claves.verificar_clave('secreta', hash_guardado)
+    assert not claves.verificar_clave('otra', hash_guardado)
+    assert not claves.necesita_rehash(hash_guardado)
+    monkeypatch.setattr(Config, 'BCRYPT_ROUNDS', 12)
+    assert claves.necesita_rehash(hash_guardado)
+
+    monkeypatch.setattr(claves, '_cupos', threading.BoundedSemaphore(1))
+    claves._cupos.acquire()
+    with pytest.raises(claves.ClavesSaturadas):
+        claves.verificar_clave('secreta', hash_guardado)
+    assert claves.get_claves_stats()['rechazadas'] >= 1
+
+
+def test_usuario_actual_desde_claims_hasta_que_cambia(monkeypatch):
+    from flask import g
+    from flask_jwt_extended import verify_jwt_in_request
+    import utils.usuario_actual as usuario_actual
+
+    versiones = {'usuario-1': 5}
+    monkeypatch.setattr(usuario_actual._registro, 'version', lambda usuario_id, forzar=False: versiones[usuario_id])
+    conexion = ConexionFalsa(0)
+    monkeypatch.setattr(usuario_actual, 'get_db_connection', lambda: conexion)
+    with flask_app.app_context():
+        token = usuario_actual.crear_token_acceso('usuario-1', 2, 3, 103, 'SANTA VICTORIA')
+
+    with flask_app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        verify_jwt_in_request()
+        assert usuario_actual.usuario_actual.perfil == 3
+        assert usuario_actual.usuario_actual.sucursal == 103
+        assert conexion.consultas == []
+
+        # Un cambio posterior a la emisión del token obliga a leer la BD
+        versiones['usuario-1'] = 6
+        g.pop('usuario_actual')
+        assert not usuario_actual.usuario_actual.desde_token
+        assert len(conexion.consultas) == 1
+
+
+def test_usuario_actual_normaliza_sucursal_de_texto(monkeypatch):
+    from flask_jwt_extended import verify_jwt_in_request
+    import utils.usuario_actual as usuario_actual
+    monkeypatch.setattr(usuario_actual._registro, 'version', lambda usuario_id, forzar=False: 5)
+    with flask_app.app_context():
+        token = usuario_actual.crear_token_acceso('usuario-1', 2, 3, '103', 'SANTA VICTORIA')
+
+    with flask_app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        verify_jwt_in_request()
+        assert usuario_actual.usuario_actual.sucursal == 103
+
+
+def test_arbol_productivo_se_arma_una_vez_por_sucursal(cliente, monkeypatch):
+    import blueprints.opciones as opciones
+    import utils.jerarquias as jerarquias
+    filas = [
+        {'id_especie': 1, 'nombre_especie': 'Cerezo', 'id_variedad': 10, 'nombre_variedad': 'Lapins',
+         'id_cuartel': 100, 'nombre_cuartel': 'C1', 'id_ceco': 1000, 'nombre_ceco': 'CECO C1'},
+        {'id_especie': 1, 'nombre_especie': 'Cerezo', 'id_variedad': 11, 'nombre_variedad': 'Santina',
+         'id_cuartel': 101, 'nombre_cuartel': 'C2', 'id_ceco': 1001, 'nombre_ceco': 'CECO C2'},
+    ]
+    conexion = ConexionFalsa(0)
+
+    class CursorArbol(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            self._filas = filas
+
+    conexion.cursor = lambda *args, **kwargs: CursorArbol(conexion)
+    monkeypatch.setattr(jerarquias, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(opciones, 'obtener_sucursal_actividad', lambda id_actividad: 999)
+    jerarquias.invalidar_jerarquias()
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    especies = cliente.get('/api/opciones/especies/actividad/act-1', headers=headers).get_json()
+    variedades = cliente.get('/api/opciones/variedades/actividad/act-1/1', headers=headers).get_json()
+    cuarteles = cliente.get('/api/opciones/cuarteles/actividad/act-1/1/11', headers=headers).get_json()
+    cecos = cliente.get('/api/opciones/cecosproductivo/actividad/act-1/1/11/101', headers=headers).get_json()
+    arbol = cliente.get('/api/opciones/arbol-productivo/actividad/act-1', headers=headers).get_json()
+
+    assert especies == [{'id': 1, 'nombre': 'Cerezo'}]
+    assert [v['nombre'] for v in variedades] == ['Lapins', 'Santina']
+    assert cuarteles == [{'id': 101, 'nombre': 'C2'}]
+    assert cecos == [{'id': 1001, 'nombre': 'CECO C2'}]
+    assert arbol['especies'][0]['variedades'][1]['cuarteles'][0]['cecos'] == cecos
+    assert len(conexion.consultas) == 1
+
+
+def test_topologia_riego_compartida_entre_blueprints(cliente, monkeypatch):
+    import blueprints.opciones as opciones
+    import utils.jerarquias as jerarquias
+    respuestas = {
+        'FROM riego_dim_caseta': [{'id': 1, 'nombre': 'Caseta 1', 'ubicacion': 'Norte'}],
+        'FROM riego_dim_equipo': [{'id': 7, 'nombre': 'Equipo 7', 'id_caseta': 1}],
+        'FROM riego_dim_sector': [{
+            'id': 50, 'nombre': 'Sector 50', 'id_equipo': 7, 'id_ceco': 500,
+            'nombre_ceco': 'CECO 500', 'id_sucursal_ceco': 999, 'id_estado_ceco': 1,
+            'nombre_equipo': 'Equipo 7', 'id_caseta': 1, 'id_sucursal_caseta': 999,
+            'nombre_maquinaria': 'Bomba 1',
+        }],
+    }
+    conexion = ConexionFalsa(0)
+
+    class CursorRiego(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            tabla = next(t for t in respuestas if t in sql.split('JOIN')[0])
+            self._filas = respuestas[tabla]
+
+    conexion.cursor = lambda *args, **kwargs: CursorRiego(conexion)
+    monkeypatch.setattr(jerarquias, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(opciones, 'obtener_sucursal_actividad', lambda id_actividad: 999)
+    monkeypatch.setattr(actividades_multiples, 'obtener_id_sucursal_activa', lambda usuario_id: 999)
+    jerarquias.invalidar_jerarquias()
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    equipos = cliente.get('/api/opciones/equiposriego/actividad/act-1/1', headers=headers).get_json()
+    ceco = cliente.get('/api/opciones/cecosriego/actividad/act-1/1/7/50', headers=headers).get_json()
+    sectores = cliente.get('/api/actividades_multiples/sectores-riego', headers=headers).get_json()
+
+    assert equipos == [{'id': 7, 'nombre': 'Equipo 7'}]
+    assert ceco == {'id': 500, 'nombre': 'CECO 500'}
+    assert sectores[0]['nombre_caseta'] == 'Bomba 1'
+    assert len(conexion.consultas) == 3
+
+
+def test_calendario_normaliza_dias_y_carga_una_vez(monkeypatch):
+    import utils.calendario as calendario
+    from decimal import Decimal
+    conexion = ConexionFalsa(0)
+
+    class CursorCalendario(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            self._filas = [
+                {'id_empresa': 1, 'nombre_dia': 'Miércoles', 'horas_dia': Decimal('8.5')},
+                {'id_empresa': 1, 'nombre_dia': 'lunes', 'horas_dia': Decimal('9')},
+            ]
+
+    conexion.cursor = lambda *args, **kwargs: CursorCalendario(conexion)
+    monkeypatch.setattr(calendario, 'get_db_connection', lambda: conexion)
+    calendario.invalidar_calendario()
+
+    assert calendario.horas_dia_empresa(1, datetime.date(2025, 7, 2)) == Decimal('8.5')  # miércoles
+    assert calendario.horas_dia_empresa(1, datetime.date(2025, 7, 7)) == Decimal('9')  # lunes
+    assert calendario.horas_dia_empresa(1, datetime.date(2025, 7, 6)) is None  # domingo sin configurar
+    assert calendario.horas_dia_empresa(2, datetime.date(2025, 7, 7)) is None
+    assert len(conexion.consultas) == 1
+
+
+def test_actividades_cecos_por_familia_sin_group_concat(cliente, monkeypatch):
+    import blueprints.actividades as actividades
+    conexion = ConexionFalsa(3)
+
+    class CursorCecos(CursorFalso):
+        def execute(self, sql, params=None):
+            if 'FROM tarja_fact_cecoproductivo f' in sql:
+                self.conexion.consultas.append(sql)
+                self._filas = [{'id_actividad': id_actividad, 'id': 10, 'nombre': 'Cuartel 1: Norte | A'}
+                               for id_actividad in params]
+            elif 'FROM tarja_fact_ceco' in sql:
+                self.conexion.consultas.append(sql)
+                self._filas = []
+            else:
+                super().execute(sql, params)
+
+    conexion.cursor = lambda *args, **kwargs: CursorCecos(conexion)
+    monkeypatch.setattr(actividades, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(actividades, 'obtener_id_sucursal_activa', lambda usuario_id: 103)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/actividades/', headers={'Authorization': f'Bearer {token}'})
+    datos = respuesta.get_json()
+
+    assert respuesta.status_code == 200
+    assert len(datos) == 3
+    assert datos[0]['cecos_productivos'] == [{'id': 10, 'nombre': 'Cuartel 1: Norte | A'}]
+    assert datos[0]['cecos_riego'] == datos[0]['cecos_administrativos'] == []
+    assert not any('GROUP_CONCAT' in sql for sql in conexion.consultas)
+    assert len(conexion.consultas) == 6
+
+
+def _conexion_rollup(monkeypatch, pendientes, cubierto_desde=datetime.date(2025, 1, 1)):
+    """
+    Conexión falsa con una sucursal ya calculada desde `cubierto_desde` y
+    `pendientes` días por recalcular.
+    """
+    import blueprints.indicadores as indicadores
+    import utils.rollups as rollups
+    conexion = ConexionFalsa(0)
+    conexion.commit = conexion.rollback = lambda: None
+    estado = {'pendientes': pendientes}
+
+    class CursorRollup(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            if 'FROM tarja_rollup_estado' in sql:
+                self._filas = [{'actualizado_en': datetime.datetime(2025, 7, 1, 12, 0),
+                                'cubierto_desde': cubierto_desde}]
+            elif 'COUNT(*) AS pendientes' in sql:
+                self._filas = [{'pendientes': estado['pendientes']}]
+            elif 'SELECT id_sucursal, fecha, marcado_en FROM tarja_rollup_pendiente' in sql:
+                limite = params[-1]
+                self._filas = [{'id_sucursal': 103, 'fecha': datetime.date(2025, 7, i + 1),
+                                'marcado_en': datetime.datetime(2025, 7, 2)}
+                               for i in range(min(limite, estado['pendientes']))]
+                estado['pendientes'] -= len(self._filas)
+            elif 'FROM tarja_rollup_rendimiento_diario' in sql:
+                self._filas = [{'fecha': datetime.date(2025, 7, 1), 'labor': 'Poda', 'total_grupos': 1}]
+            else:
+                self._filas = []
+
+    conexion.cursor = lambda *args, **kwargs: CursorRollup(conexion)
+    monkeypatch.setattr(indicadores, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(rollups, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(indicadores, 'obtener_id_sucursal_activa', lambda usuario_id: 103)
+    monkeypatch.setattr('utils.sucursal.obtener_id_sucursal_activa', lambda usuario_id: 103)
+    return conexion
+
+
+def test_resumen_rendimientos_recalcula_pendientes_y_lee_rollup(cliente, monkeypatch):
+    conexion = _conexion_rollup(monkeypatch, pendientes=2)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/indicadores/control-rendimientos/resumen?fecha_inicio=2025-06-01',
+                            headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()[0]['labor'] == 'Poda'
+    assert respuesta.headers['X-Rollup-Origen'] == 'rollup'
+    assert respuesta.headers['X-Rollup-Pendientes'] == '0'
+    assert sum('INSERT INTO tarja_rollup_rendimiento_diario' in sql for sql in conexion.consultas) == 2
+    assert any('FROM tarja_rollup_rendimiento_diario v' in sql for sql in conexion.consultas)
+
+
+def test_resumen_rendimientos_usa_vista_si_quedan_pendientes(cliente, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'ROLLUP_LOTE_LECTURA', 1)
+    conexion = _conexion_rollup(monkeypatch, pendientes=3)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/indicadores/control-rendimientos/resumen?fecha_inicio=2025-05-01',
+                            headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers['X-Rollup-Origen'] == 'vista'
+    assert any('FROM v_tarja_tarjamovil_controlrendimiento v' in sql and 'GROUP BY' in sql
+               for sql in conexion.consultas)
+
+
+@pytest.mark.parametrize('filtro', ['?fecha_inicio=2024-09-01', ''])
+def test_resumen_rendimientos_antes_de_la_carga_inicial_usa_vista(cliente, monkeypatch, filtro):
+    conexion = _conexion_rollup(monkeypatch, pendientes=0, cubierto_desde=datetime.date(2025, 1, 1))
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/indicadores/control-rendimientos/resumen' + filtro,
+                            headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers['X-Rollup-Origen'] == 'vista'
+    assert not any('FROM tarja_rollup_rendimiento_diario v' in sql for sql in conexion.consultas)
+
+
+def test_cache_indicadores_por_filtros_e_invalidacion_por_dia(cliente, monkeypatch):
+    import blueprints.indicadores as indicadores
+    from utils.resultados import invalidar_resultados
+    conexion = ConexionFalsa(0)
+    monkeypatch.setattr(indicadores, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(indicadores, 'obtener_id_sucursal_activa', lambda usuario_id: 104)
+    monkeypatch.setattr('utils.sucursal.obtener_id_sucursal_activa', lambda usuario_id: 104)
+    monkeypatch.setattr(indicadores, 'usar_rollup', lambda cursor, id_sucursal, fecha_inicio=None, forzar=False: None)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    encabezados = {'Authorization': f'Bearer {token}'}
+    url = '/api/indicadores/control-rendimientos/resumen?fecha_inicio=2025-07-01&fecha_fin=2025-07-31'
+
+    cliente.get(url + '&tipo_mo=', headers=encabezados)
+    consultas = len(conexion.consultas)
+    assert cliente.get(url, headers=encabezados).status_code == 200
+    assert len(conexion.consultas) == consultas  # mismos filtros normalizados: desde la caché
+
+    invalidar_resultados([(104, datetime.date(2025, 8, 15))])  # fuera de la ventana
+    cliente.get(url, headers=encabezados)
+    assert len(conexion.consultas) == consultas
+
+    invalidar_resultados([(104, datetime.date(2025, 7, 15))])
+    cliente.get(url, headers=encabezados)
+    assert len(conexion.consultas) > consultas
+
+
+def test_get_identicos_concurrentes_comparten_una_ejecucion(monkeypatch):
+    import threading
+    import time
+    import blueprints.opciones as opciones
+    from utils.coalescencia import get_coalescencia_stats
+    llamadas = []
+
+    def consultar_catalogo_lento(tabla, sql):
+        llamadas.append(tabla)
+        time.sleep(0.3)
+        return [{'id': 1, 'nombre': tabla}]
+
+    monkeypatch.setattr(opciones, 'consultar_catalogo', consultar_catalogo_lento)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    coalescidas_antes = get_coalescencia_stats()['coalescidas']
+    barrera = threading.Barrier(5)
+    respuestas = []
+
+    def pedir():
+        with flask_app.test_client() as cliente:
+            barrera.wait()
+            respuestas.append(cliente.get('/api/opciones/', headers={'Authorization': f'Bearer {token}'}))
+
+    hilos = [threading.Thread(target=pedir) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert [r.status_code for r in respuestas] == [200] * 5
+    assert len({r.headers['ETag'] for r in respuestas}) == 1
+    assert len(llamadas) == 3  # labores, unidades y tipos de CECO una sola vez
+    assert get_coalescencia_stats()['coalescidas'] - coalescidas_antes == 4
+
+
+def test_eliminar_actividad_marca_el_dia_antes_de_borrar(cliente, monkeypatch):
+    import blueprints.actividades as actividades
+    conexion = ConexionFalsa(0)
+    conexion.commit = lambda: None
+    estado = {'borrada': False}
+    marcados = []
+
+    class CursorEliminar(CursorFalso):
+        rowcount = 0
+
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            self._filas = []
+            if 'SELECT DISTINCT t.id_sucursalactiva, t.fecha' in sql:
+                if not estado['borrada']:
+                    self._filas = [(103, datetime.date(2025, 7, 1))]
+            elif 'SELECT id, id_sucursalactiva FROM tarja_fact_actividad' in sql:
+                self._filas = [('act-1', 103)]
+            elif sql.startswith('DELETE FROM tarja_fact_actividad'):
+                estado['borrada'] = True
+                self.rowcount = 1
+
+        def executemany(self, sql, filas):
+            if 'tarja_rollup_pendiente' in sql:
+                marcados.extend(filas)
+
+    conexion.cursor = lambda *args, **kwargs: CursorEliminar(conexion)
+    monkeypatch.setattr(actividades, 'get_db_connection', lambda: conexion)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.delete('/api/actividades/act-1', headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert marcados == [(103, datetime.date(2025, 7, 1))]
+
+
+def test_rendimientos_contratista_con_since_solo_trae_cambios(cliente, monkeypatch):
+    import blueprints.rendimientos as rendimientos
+    conexion = ConexionFalsa(0)
+    monkeypatch.setattr(rendimientos, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(rendimientos, 'obtener_id_sucursal_activa', lambda usuario_id: 103)
+    consultadas = []
+
+    def consultar_cambios(cursor, tabla, since, id_sucursal=None):
+        consultadas.append((tabla, since, id_sucursal))
+        return ['r-1', 'r-2'], '57'
+
+    monkeypatch.setattr(rendimientos, 'consultar_cambios', consultar_cambios)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/rendimientos/individual/contratista?since=42',
+                            headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert consultadas == [('tarja_fact_rendimientocontratista', ('seq', 42), 103)]
+    assert respuesta.get_json() == {'data': [], 'eliminados': ['r-1', 'r-2'], 'since': '57', 'completo': False}
+    assert 'r.id IN' in conexion.consultas[-1]
+
+
+class CursorSinTabla:
+    """Cursor de una BD donde aún no se aplicó el script de la tabla `tabla`."""
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self.consultas = []
+
+    def execute(self, sql, params=None):
+        self.consultas.append(sql)
+        if self.tabla in sql:
+            import mysql.connector
+            raise mysql.connector.ProgrammingError(
+                msg=f"Table 'lahornilla.{self.tabla}' doesn't exist", errno=1146)
+
+    executemany = execute
+
+    def fetchall(self):
+        return []
+
+
+def test_registrar_cambio_sigue_sin_tabla_del_log(monkeypatch):
+    import utils.sincronizacion as sincronizacion
+    monkeypatch.setattr(sincronizacion, 'marcar_rollup', lambda cursor, tabla, ids: None)
+    cursor = CursorSinTabla('tarja_log_cambio')
+
+    sincronizacion.registrar_cambio(cursor, 'general_dim_colaborador', 'col-1', 103)
+
+    assert sincronizacion.consultar_cambios(cursor, 'general_dim_colaborador', ('seq', 42), 103) == (None, 0)
+
+
+def test_rollups_sin_tablas_marcan_nada_y_usan_vistas(monkeypatch):
+    import utils.rollups as rollups
+    monkeypatch.setattr(rollups.Config, 'INDICADORES_ROLLUP', True)
+    cursor = CursorSinTabla('tarja_rollup')
+    cursor.fetchall = lambda: [(103, datetime.date(2025, 7, 1))]
+
+    with flask_app.test_request_context():
+        rollups.marcar_rollup(cursor, 'tarja_fact_actividad', 'act-1')
+        assert rollups.usar_rollup(cursor, 103) is None
+
+
+def test_catalogo_modificar_lo_obtenido_no_altera_la_cache():
+    from utils.catalogos import CatalogoCache
+    cache = CatalogoCache()
+    cargar = lambda: [{'id': 1, 'nombre': 'Poda'}]
+
+    filas = cache.obtener('general_dim_labor', cargar)
+    filas[0]['nombre'] = 'Otra'
+    filas.append({'id': 2})
+
+    assert cache.obtener('general_dim_labor', cargar) == [{'id': 1, 'nombre': 'Poda'}]
+
+
+def test_pool_precalentado_abre_min_size_conexiones():
+    from utils.db import ConexionPool
+    creadas = []
+    pool = ConexionPool(lambda: creadas.append(object()) or creadas[-1], min_size=3, max_size=5)
+
+    assert pool.precalentar() == 3
+    assert pool.precalentar() == 0
+    estadisticas = pool.estadisticas()
+    assert (estadisticas['abiertas'], estadisticas['ociosas'], estadisticas['creadas']) == (3, 3, 3)
+    pool.obtener()
+    assert len(creadas) == 3  # el préstamo usa una conexión ya abierta
+
+
+def test_editar_colaborador_marca_los_dias_del_rollup_donde_aparece(cliente):
+    from utils.rollups import marcar_rollup
+    marcados = []
+
+    class CursorDimension:
+        def execute(self, sql, params=None):
+            assert 'FROM tarja_rollup_horas_diarias WHERE id_colaborador IN' in sql
+            self.filas = [{'id_sucursal': 103, 'fecha': datetime.date(2025, 6, 2)}]
+
+        def fetchall(self):
+            return self.filas
+
+        def executemany(self, sql, filas):
+            marcados.extend(filas)
+
+    with flask_app.test_request_context():
+        marcar_rollup(CursorDimension(), 'general_dim_colaborador', 'col-1')
+
+    assert marcados == [(103, datetime.date(2025, 6, 2))]
+
+
+def test_control_horas_lee_el_calendario_una_vez_por_peticion(cliente, monkeypatch):
+    import blueprints.indicadores as indicadores
+    conexion = ConexionFalsa(0)
+
+    class CursorHoras(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            self._filas = [{'id_colaborador': f'col-{i}', 'colaborador': 'Ana', 'fecha': datetime.date(2025, 7, 7),
+                            'nombre_dia': 'Monday', 'horas_trabajadas': 9, 'id_empresa': 1} for i in range(50)]
+
+    conexion.cursor = lambda *args, **kwargs: CursorHoras(conexion)
+    lecturas = []
+    monkeypatch.setattr(indicadores, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(indicadores, 'obtener_id_sucursal_activa', lambda usuario_id: 105)
+    monkeypatch.setattr('utils.sucursal.obtener_id_sucursal_activa', lambda usuario_id: 105)
+    monkeypatch.setattr(indicadores, 'usar_rollup', lambda cursor, id_sucursal, fecha_inicio=None, forzar=False: None)
+    monkeypatch.setattr(indicadores, 'obtener_calendarios', lambda: lecturas.append(1) or {1: [8] * 7})
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+
+    respuesta = cliente.get('/api/indicadores/control-horas/resumen-diario-colaborador?id_colaborador=calendario',
+                            headers={'Authorization': f'Bearer {token}'})
+
+    assert respuesta.status_code == 200
+    assert len(respuesta.get_json()) == 50
+    assert respuesta.get_json()[0]['estado_trabajo'] == 'MÁS'
+    assert len(lecturas) == 1
+
+
+class ConexionMySQLFalsa:
+    """Conexión física mínima para probar el pool real."""
+    unread_result = False
+    in_transaction = False
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, *args, **kwargs):
+        return CursorFalso(ConexionFalsa(0))
+
+    def close(self):
+        pass
+
+
+def test_conexion_por_peticion_se_reutiliza_y_vuelve_al_pool(monkeypatch):
+    from flask import Flask
+    import utils.db as db
+    pool = db.ConexionPool(ConexionMySQLFalsa, min_size=0, max_size=2)
+    monkeypatch.setattr(db, '_pool', pool)
+
+    app = Flask(__name__)
+    db.init_app(app)
+    vistas = {}
+
+    @app.route('/dos-conexiones')
+    def dos_conexiones():
+        vistas['iguales'] = db.get_db_connection() is db.get_db_connection()
+        db.get_db_connection().close()  # los handlers llaman close(): no debe devolverla
+        vistas['en_uso'] = pool.estadisticas()['en_uso']
+        return 'ok'
+
+    @app.route('/falla')
+    def falla():
+        db.get_db_connection()
+        raise RuntimeError('error en el handler')
+
+    with app.test_client() as cliente:
+        assert cliente.get('/dos-conexiones').status_code == 200
+        assert cliente.get('/falla').status_code == 500
+
+    assert vistas == {'iguales': True, 'en_uso': 1}
+    estadisticas = pool.estadisticas()
+    assert (estadisticas['en_uso'], estadisticas['prestamos'], estadisticas['creadas']) == (0, 2, 1)
+
+
+def _crear_rendimientos(cliente, monkeypatch, lote):
+    """POST /api/rendimientos/ contra una actividad individual de trabajadores propios."""
+    import blueprints.rendimientos as rendimientos
+    conexion = ConexionFalsa(0)
+    conexion.commit = lambda: None
+    conexion.lotes = []
+
+    class CursorRendimientos(CursorFalso):
+        def execute(self, sql, params=None):
+            self.conexion.consultas.append(sql)
+            self._filas = [{'id_tipotrabajador': 1, 'id_tiporendimiento': 1}]
+
+        def executemany(self, sql, filas):
+            self.conexion.lotes.append((sql, list(filas)))
+
+    conexion.cursor = lambda *args, **kwargs: CursorRendimientos(conexion)
+    monkeypatch.setattr(rendimientos, 'get_db_connection', lambda: conexion)
+    monkeypatch.setattr(rendimientos, 'registrar_cambio', lambda cursor, tabla, ids, *args, **kwargs: None)
+    with flask_app.app_context():
+        token = create_access_token(identity='usuario-1')
+    respuesta = cliente.post('/api/rendimientos/', json=lote, headers={'Authorization': f'Bearer {token}'})
+    return respuesta, conexion
+
+
+def test_crear_rendimientos_informa_errores_por_indice(cliente, monkeypatch):
+    lote = [
+        {'id_actividad': 'act-1', 'id_colaborador': 'col-1', 'rendimiento': 10},
+        {'id_actividad': 'act-1', 'rendimiento': 5},
+        {'id_actividad': 'act-1', 'id_colaborador': 'col-3', 'rendimiento': 'diez'},
+    ]
+
+    respuesta, conexion = _crear_rendimientos(cliente, monkeypatch, lote)
+
+    assert respuesta.status_code == 400
+    assert [error['indice'] for error in respuesta.get_json()['errores']] == [1, 2]
+    assert respuesta.get_json()['error'] == "Falta id_colaborador para trabajador propio"
+    assert conexion.lotes == []  # nada se inserta si alguna fila es inválida
+
+
+def test_crear_rendimientos_inserta_el_lote_con_un_executemany(cliente, monkeypatch):
+    lote = [{'id_actividad': 'act-1', 'id_colaborador': f'col-{i}', 'rendimiento': i} for i in range(20)]
+
+    respuesta, conexion = _crear_rendimientos(cliente, monkeypatch, lote)
+
+    assert respuesta.status_code == 201
+    assert len(conexion.lotes) == 1
+    sql, filas = conexion.lotes[0]
+    assert 'INSERT INTO tarja_fact_rendimientopropio' in sql
+    assert [fila[2] for fila in filas] == [f'col-{i}' for i in range(20)]
+    assert not any('INSERT' in sql for sql in conexion.consultas)
+
+
+def test_crear_rendimientos_responde_resultados_por_indice(cliente, monkeypatch):
+    lote = [{'id_actividad': 'act-1', 'id_colaborador': f'col-{i}', 'rendimiento': 1} for i in range(3)]
+
+    respuesta, conexion = _crear_rendimientos(cliente, monkeypatch, lote)
+
+    cuerpo = respuesta.get_json()
+    ids = [fila[0] for fila in conexion.lotes[0][1]]
+    assert cuerpo['ids'] == ids
+    assert cuerpo['resultados'] == [{'indice': i, 'id': ids[i], 'estado': 'creado'} for i in range(3)]
+
+
+def test_uuid7_version_variante_y_orden_creciente(monkeypatch):
+    import uuid
+    import utils.ids as ids
+
+    generados = [ids.generar_id() for _ in range(2000)]
+    assert generados == sorted(generados)
+    assert len(set(generados)) == len(generados)
+    for texto in generados[:50]:
+        valor = uuid.UUID(texto)
+        assert valor.version == 7
+        assert valor.variant == uuid.RFC_4122
+
+    # Mismo milisegundo con el contador de 12 bits a punto de desbordar:
+    # se pasa al milisegundo siguiente sin perder el orden
+    ms = ids._ultimo_ms + 10
+    monkeypatch.setattr(ids.time, 'time_ns', lambda: ms * 1_000_000)
+    primero = ids.uuid7()
+    monkeypatch.setattr(ids, '_contador', 0xFFE)
+    desborde = [ids.uuid7() for _ in range(4)]
+    assert [primero] + desborde == sorted([primero] + desborde)
+    assert desborde[-1].int >> 80 == ms + 1
+    assert [(valor.int >> 64) & 0xFFF for valor in desborde] == [0xFFF, 0, 1, 2]
+
+
+@pytest.mark.parametrize('con_orjson', [True, False], ids=['orjson', 'json'])
+def test_proveedor_json_formato_de_tipos_mysql(monkeypatch, con_orjson):
+    from decimal import Decimal
+    import utils.json_provider as json_provider
+    if con_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    fila = {
+        'fecha': datetime.date(2025, 7, 1),
+        'creado': datetime.datetime(2025, 7, 1, 8, 30),
+        'tarifa': Decimal('12500.00'),
+        'hora_inicio': datetime.timedelta(hours=8, minutes=30),
+    }
+    esperado = {'fecha': '2025-07-01', 'creado': '2025-07-01T08:30:00', 'tarifa': 12500.0, 'hora_inicio': '8:30:00'}
+
+    with flask_app.app_context():
+        respuesta = flask_app.json.response(fila)
+        assert json.loads(respuesta.get_data()) == esperado
+        assert json.loads(flask_app.json.dumps([fila])) == [esperado]
+    assert json.loads(json_provider.dumps(fila)) == esperado
+    assert '"tarifa":12500.0' in json_provider.dumps(fila)  # número, no texto
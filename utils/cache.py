@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+_FALTANTE = object()
+
+
+class TTLCache:
+    """
+    Caché en memoria con expiración por tiempo (TTL) y desalojo LRU.
+
+    Es segura entre hilos y lleva contadores de aciertos y fallos para
+    exponerlos en las métricas.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()  # clave -> (valor, expira_en)
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+
+    def get(self, clave, default=None):
+        """Retorna el valor vigente de la clave, o default si no está o expiró."""
+        with self._lock:
+            entrada = self._datos.get(clave, _FALTANTE)
+            if entrada is not _FALTANTE:
+                valor, expira_en = entrada
+                if expira_en > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self._aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self._fallos += 1
+            return default
+
+    def set(self, clave, valor, ttl=None):
+        """Guarda un valor; ttl reemplaza el TTL por defecto para esta clave."""
+        expira_en = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._datos[clave] = (valor, expira_en)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        """Elimina una clave si existe."""
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def eliminar_si(self, predicado):
+        """Elimina las claves para las que predicado(clave) es verdadero; retorna cuántas."""
+        with self._lock:
+            claves = [clave for clave in self._datos if predicado(clave)]
+            for clave in claves:
+                del self._datos[clave]
+            return len(claves)
+
+    def clear(self):
+        """Vacía la caché."""
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        """Retorna tamaño y contadores de aciertos/fallos."""
+        with self._lock:
+            total = self._aciertos + self._fallos
+            return {
+                "tamano": len(self._datos),
+                "tamano_max": self.maxsize,
+                "ttl": self.ttl,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,61 @@
+import unicodedata
+from utils.catalogos import catalogos, invalidar_catalogo
+from utils.db import get_db_connection
+
+TABLA_HORAS = 'tarja_dim_horaspordia'
+
+# Índice = date.weekday()
+DIAS_SEMANA = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+
+def normalizar_dia(nombre_dia):
+    """'Miércoles', 'miercoles', ' MIERCOLES ' -> 'miercoles'."""
+    sin_tildes = unicodedata.normalize('NFKD', nombre_dia or '').encode('ascii', 'ignore').decode('ascii')
+    return sin_tildes.strip().lower()
+
+
+def _cargar_calendarios():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SELECT id_empresa, nombre_dia, horas_dia FROM {TABLA_HORAS}")
+    filas = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    # id_empresa -> [horas lunes, ..., horas domingo] (None si el día no está configurado)
+    calendarios = {}
+    for fila in filas:
+        dia = normalizar_dia(fila['nombre_dia'])
+        if dia not in DIAS_SEMANA:
+            continue
+        semana = calendarios.setdefault(fila['id_empresa'], [None] * 7)
+        semana[DIAS_SEMANA.index(dia)] = fila['horas_dia']
+    return calendarios
+
+
+def obtener_calendarios():
+    """
+    id_empresa -> horas por día de la semana, desde la caché de catálogos (TTL
+    por tabla). Para muchas filas, obtenerlo una vez y pasarlo a
+    horas_dia_empresa: cada lectura de la caché entrega una copia.
+    """
+    return catalogos.obtener(TABLA_HORAS, _cargar_calendarios, 'calendario')
+
+
+def horas_dia_empresa(id_empresa, fecha, calendarios=None):
+    """
+    Horas de trabajo esperadas de la empresa para el día de la semana de
+    `fecha`, o None si no están configuradas. La tabla completa se carga de
+    una vez y se guarda en la caché de catálogos (TTL por tabla).
+    """
+    if calendarios is None:
+        calendarios = obtener_calendarios()
+    semana = calendarios.get(id_empresa)
+    if semana is None:
+        return None
+    return semana[fecha.weekday()]
+
+
+def invalidar_calendario():
+    """Hook de invalidación para llamar tras modificar tarja_dim_horaspordia."""
+    invalidar_catalogo(TABLA_HORAS)
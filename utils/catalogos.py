@@ -0,0 +1,154 @@
+import copy
+import threading
+from config import Config
+from utils.cache import TTLCache
+from utils.db import get_db_connection
+
+# TTL (segundos) por tabla de dimensión; el resto usa Config.CATALOGO_CACHE_TTL
+TTL_POR_TABLA = {
+    'general_dim_labor': 600,
+    'tarja_dim_unidad': 600,
+    'general_dim_cecotipo': 3600,
+    'general_dim_especie': 3600,
+    'general_dim_tipotrabajador': 3600,
+    'tarja_dim_tiporendimiento': 3600,
+    'general_dim_maquinariatipo': 3600,
+    'general_dim_porcentajecontratista': 600,
+    'Porcentaje_trabajador': 600,
+    'tarja_dim_horaspordia': 3600,
+}
+
+
+class BackendMemoria:
+    """
+    Backend en memoria del proceso. Un backend compartido (por ejemplo Redis)
+    debe exponer los mismos métodos: get, set, delete, incr y version.
+    """
+
+    def __init__(self, maxsize=512):
+        self._valores = TTLCache(maxsize=maxsize, ttl=Config.CATALOGO_CACHE_TTL)
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        return self._valores.get(clave)
+
+    def set(self, clave, valor, ttl):
+        self._valores.set(clave, valor, ttl=ttl)
+
+    def delete(self, clave):
+        self._valores.delete(clave)
+
+    def incr(self, clave):
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return self._contadores[clave]
+
+    def version(self, clave):
+        with self._lock:
+            return self._contadores.get(clave, 0)
+
+
+class CatalogoCache:
+    """
+    Caché de tablas de dimensión (catálogos) con TTL por tabla y versionado.
+
+    Cada tabla tiene un número de versión; invalidar una tabla incrementa su
+    versión, con lo que todas las entradas anteriores dejan de usarse sin
+    necesidad de buscarlas y borrarlas una por una.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or BackendMemoria()
+        self._lock = threading.Lock()
+        self._aciertos = {}
+        self._fallos = {}
+
+    def obtener(self, tabla, cargar, variante=''):
+        """
+        Retorna una copia del valor en caché para (tabla, variante) o lo carga
+        con cargar(). Los handlers pueden modificar lo que reciben (por
+        ejemplo, agregar campos a cada fila) sin alterar lo guardado.
+        """
+        clave = f"catalogo:{tabla}:v{self.version(tabla)}:{variante}"
+        valor = self.backend.get(clave)
+        if valor is not None:
+            self._contar(self._aciertos, tabla)
+            return _copiar(valor)
+
+        self._contar(self._fallos, tabla)
+        valor = cargar()
+        self.backend.set(clave, valor, TTL_POR_TABLA.get(tabla, Config.CATALOGO_CACHE_TTL))
+        return _copiar(valor)
+
+    def version(self, tabla):
+        """Versión vigente de la tabla."""
+        return self.backend.version(f"catalogo:{tabla}:version")
+
+    def invalidar(self, *tablas):
+        """Descarta lo guardado para las tablas indicadas."""
+        for tabla in tablas:
+            self.backend.incr(f"catalogo:{tabla}:version")
+
+    def estadisticas(self):
+        """Aciertos y fallos por tabla."""
+        with self._lock:
+            tablas = sorted(set(self._aciertos) | set(self._fallos))
+            return {
+                tabla: {
+                    "aciertos": self._aciertos.get(tabla, 0),
+                    "fallos": self._fallos.get(tabla, 0),
+                    "version": self.version(tabla),
+                }
+                for tabla in tablas
+            }
+
+    def _contar(self, contadores, tabla):
+        with self._lock:
+            contadores[tabla] = contadores.get(tabla, 0) + 1
+
+
+def _copiar(valor):
+    # Las consultas de catálogo son listas de filas con valores simples: basta
+    # copiar cada fila, que es bastante más barato que deepcopy
+    if isinstance(valor, list) and all(isinstance(fila, dict) for fila in valor):
+        return [dict(fila) for fila in valor]
+    return copy.deepcopy(valor)
+
+
+catalogos = CatalogoCache()
+
+
+def configurar_backend(backend):
+    """Reemplaza el backend de la caché de catálogos (por ejemplo, uno compartido entre instancias)."""
+    catalogos.backend = backend
+
+
+def consultar_catalogo(tabla, sql, params=(), variante=None):
+    """
+    Ejecuta una consulta de catálogo sobre `tabla` y guarda sus filas en caché.
+    `variante` distingue consultas distintas sobre la misma tabla; por defecto
+    se usa el propio SQL.
+    """
+    def cargar():
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        filas = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return filas
+
+    if variante is None:
+        variante = ' '.join(sql.split()) + repr(tuple(params))
+    return catalogos.obtener(tabla, cargar, variante)
+
+
+def invalidar_catalogo(*tablas):
+    """Hook de invalidación para llamar tras modificar una tabla de dimensión."""
+    catalogos.invalidar(*tablas)
+
+
+def get_catalogo_cache_stats():
+    """Retorna las estadísticas de la caché de catálogos."""
+    return catalogos.estadisticas()
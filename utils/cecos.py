@@ -0,0 +1,37 @@
+from utils.consultas import marcadores, agrupar_por
+
+# Tabla de hechos de cada familia de CECO asociada a una actividad
+TABLAS_CECO = {
+    'cecos_productivos': 'tarja_fact_cecoproductivo',
+    'cecos_inversion': 'tarja_fact_cecoinversion',
+    'cecos_maquinaria': 'tarja_fact_cecomaquinaria',
+    'cecos_riego': 'tarja_fact_cecoriego',
+    'cecos_administrativos': 'tarja_fact_cecoadministrativo',
+}
+
+
+def agregar_cecos(cursor, actividades, familias=tuple(TABLAS_CECO)):
+    """
+    Agrega a cada actividad una lista [{'id', 'nombre'}] por familia de CECO,
+    con una consulta por familia para todas las actividades. Las familias no
+    pedidas quedan como lista vacía.
+    """
+    for actividad in actividades:
+        for campo in TABLAS_CECO:
+            actividad[campo] = []
+    if not actividades:
+        return actividades
+
+    por_id = {actividad['id']: actividad for actividad in actividades}
+    en_actividades = marcadores(por_id)
+    for campo in familias:
+        cursor.execute(f"""
+            SELECT DISTINCT f.id_actividad, f.id_ceco AS id, ce.nombre
+            FROM {TABLAS_CECO[campo]} f
+            JOIN general_dim_ceco ce ON f.id_ceco = ce.id
+            WHERE f.id_actividad IN ({en_actividades}) AND ce.nombre IS NOT NULL
+            ORDER BY f.id_actividad, f.id_ceco
+        """, tuple(por_id))
+        for id_actividad, cecos in agrupar_por(cursor.fetchall(), 'id_actividad').items():
+            por_id[id_actividad][campo] = [{'id': ceco['id'], 'nombre': ceco['nombre']} for ceco in cecos]
+    return actividades
@@ -0,0 +1,119 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+import bcrypt
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# bcrypt libera el GIL mientras calcula, así que unos pocos hilos dedicados
+# alcanzan para ocupar los núcleos sin dejar sin CPU al resto de las peticiones.
+_executor = ThreadPoolExecutor(max_workers=Config.BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+
+# Cupos = hilos trabajando + trabajos esperando en cola. Sin cupo se rechaza
+# de inmediato en vez de acumular logins esperando detrás de un hash de ~250 ms.
+_cupos = threading.BoundedSemaphore(Config.BCRYPT_WORKERS + Config.BCRYPT_COLA_MAX)
+
+_COSTO_HASH = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+_lock = threading.Lock()
+_contadores = {
+    "completadas": 0,
+    "rechazadas": 0,
+    "en_curso": 0,
+    "espera_total_ms": 0.0,
+    "espera_max_ms": 0.0,
+    "calculo_total_ms": 0.0,
+}
+
+
+class ClavesSaturadas(Exception):
+    """No hay cupo en la cola de hashing de claves."""
+
+
+def _contar(espera_ms=None, calculo_ms=None, **incrementos):
+    with _lock:
+        for clave, valor in incrementos.items():
+            _contadores[clave] += valor
+        if espera_ms is not None:
+            _contadores["espera_total_ms"] += espera_ms
+            _contadores["espera_max_ms"] = max(_contadores["espera_max_ms"], espera_ms)
+        if calculo_ms is not None:
+            _contadores["calculo_total_ms"] += calculo_ms
+
+
+def _ejecutar(funcion):
+    """Corre `funcion` en el pool de bcrypt y espera el resultado."""
+    if not _cupos.acquire(blocking=False):
+        _contar(rechazadas=1)
+        logger.warning("⚠️ Cola de hashing de claves llena, se rechaza la petición")
+        raise ClavesSaturadas("Servicio ocupado, intente nuevamente en unos segundos")
+
+    encolada = time.perf_counter()
+
+    def tarea():
+        inicio = time.perf_counter()
+        try:
+            return funcion()
+        finally:
+            fin = time.perf_counter()
+            _contar(espera_ms=(inicio - encolada) * 1000, calculo_ms=(fin - inicio) * 1000,
+                    completadas=1, en_curso=-1)
+            # El cupo se libera al terminar el cálculo, aunque quien esperaba ya se haya ido
+            _cupos.release()
+
+    _contar(en_curso=1)
+    try:
+        futuro = _executor.submit(tarea)
+    except Exception:
+        _contar(en_curso=-1)
+        _cupos.release()
+        raise
+    try:
+        return futuro.result(timeout=Config.BCRYPT_TIMEOUT)
+    except TimeoutError:
+        raise ClavesSaturadas("Servicio ocupado, intente nuevamente en unos segundos")
+
+
+def hash_clave(clave):
+    """Retorna el hash bcrypt (str) de `clave` con el costo configurado."""
+    return _ejecutar(
+        lambda: bcrypt.hashpw(clave.encode('utf-8'), bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)).decode('utf-8')
+    )
+
+
+def verificar_clave(clave, hash_guardado):
+    """Compara `clave` contra el hash guardado en general_dim_usuario."""
+    return _ejecutar(lambda: bcrypt.checkpw(clave.encode('utf-8'), hash_guardado.encode('utf-8')))
+
+
+def necesita_rehash(hash_guardado):
+    """True si el hash se generó con un costo distinto de BCRYPT_ROUNDS."""
+    coincidencia = _COSTO_HASH.match(hash_guardado or '')
+    return coincidencia is not None and int(coincidencia.group(1)) != Config.BCRYPT_ROUNDS
+
+
+def respuesta_saturada():
+    """Respuesta 503 para cuando la cola de hashing está llena."""
+    return jsonify({"error": "Servicio ocupado, intente nuevamente en unos segundos"}), 503, {"Retry-After": "2"}
+
+
+def get_claves_stats():
+    """Retorna las estadísticas del pool de hashing de claves."""
+    with _lock:
+        estadisticas = dict(_contadores)
+    completadas = estadisticas["completadas"]
+    return {
+        "hilos": Config.BCRYPT_WORKERS,
+        "cola_max": Config.BCRYPT_COLA_MAX,
+        "costo": Config.BCRYPT_ROUNDS,
+        "en_curso": estadisticas["en_curso"],
+        "completadas": completadas,
+        "rechazadas": estadisticas["rechazadas"],
+        "espera_promedio_ms": round(estadisticas["espera_total_ms"] / completadas, 2) if completadas else 0,
+        "espera_max_ms": round(estadisticas["espera_max_ms"], 2),
+        "calculo_promedio_ms": round(estadisticas["calculo_total_ms"] / completadas, 2) if completadas else 0,
+    }
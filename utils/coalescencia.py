@@ -0,0 +1,115 @@
+import threading
+from functools import wraps
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from config import Config
+from utils.sucursal import obtener_id_sucursal_activa
+
+ALCANCES = ('global', 'sucursal', 'usuario')
+
+
+class _Llamada:
+    """Petición en curso que otras peticiones idénticas esperan."""
+
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None  # (cuerpo, estado, encabezados) o None si falló
+
+
+class SingleFlight:
+    """
+    Agrupa las peticiones GET idénticas que llegan mientras una igual está en
+    curso en este proceso: solo la primera ejecuta la vista (y sus consultas)
+    y las demás reciben una copia de su respuesta.
+    """
+
+    def __init__(self, espera):
+        self.espera = espera  # segundos máximos esperando a la petición en curso
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self._contadores = {"ejecutadas": 0, "coalescidas": 0, "esperas_vencidas": 0}
+
+    def ejecutar(self, clave, vista):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = _Llamada()
+                self._en_curso[clave] = llamada
+                self._contadores["ejecutadas"] += 1
+
+        if not lider:
+            if llamada.terminada.wait(self.espera) and llamada.resultado is not None:
+                self._contar("coalescidas")
+                cuerpo, estado, encabezados = llamada.resultado
+                return current_app.response_class(cuerpo, status=estado, headers=encabezados)
+            # Se venció la espera o la petición en curso falló: ejecutar por separado
+            if not llamada.terminada.is_set():
+                self._contar("esperas_vencidas")
+            return vista()
+
+        try:
+            respuesta = make_response(vista())
+            if not respuesta.is_streamed:
+                llamada.resultado = (respuesta.get_data(), respuesta.status_code, list(respuesta.headers))
+            return respuesta
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            llamada.terminada.set()
+
+    def _contar(self, clave):
+        with self._lock:
+            self._contadores[clave] += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self._contadores, en_curso=len(self._en_curso))
+
+
+_single_flight = SingleFlight(Config.COALESCER_ESPERA)
+
+
+def _alcance(alcance):
+    if alcance == 'global':
+        return None
+    usuario_id = get_jwt_identity()
+    if alcance == 'sucursal':
+        return ('sucursal', obtener_id_sucursal_activa(usuario_id))
+    return ('usuario', usuario_id)
+
+
+def coalescer(alcance='usuario'):
+    """
+    Comparte entre peticiones GET concurrentes idénticas (ruta, parámetros y
+    alcance) una sola ejecución de la vista.
+
+    - alcance: de quién depende la respuesta. 'global' si solo depende de la
+      ruta y sus parámetros, 'sucursal' si depende de la sucursal activa del
+      usuario y 'usuario' si depende del usuario.
+
+    Va debajo de @jwt_required() y de @cache_http(), para que cada petición
+    reciba su propio ETag/304.
+    """
+    if alcance not in ALCANCES:
+        raise ValueError(f"alcance debe ser uno de {ALCANCES}")
+
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method != 'GET' or not Config.COALESCER_GET:
+                return vista(*args, **kwargs)
+            clave = (
+                request.endpoint,
+                tuple(sorted((request.view_args or {}).items())),
+                tuple(sorted(request.args.items(multi=True))),
+                _alcance(alcance),
+            )
+            return _single_flight.ejecutar(clave, lambda: vista(*args, **kwargs))
+        return envoltura
+    return decorador
+
+
+def get_coalescencia_stats():
+    """Retorna cuántas peticiones se ejecutaron y cuántas reutilizaron una en curso."""
+    return _single_flight.estadisticas()
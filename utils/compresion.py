@@ -0,0 +1,108 @@
+import gzip
+import threading
+from flask import request
+from config import Config
+from utils.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+MIMETYPES_COMPRIMIBLES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/html',
+    'text/plain',
+    'text/csv',
+}
+
+# Respuestas con ETag (catálogos) ya comprimidas: (etag, codificación) -> bytes
+_comprimidas = TTLCache(maxsize=Config.COMPRESION_CACHE_MAX, ttl=Config.COMPRESION_CACHE_TTL)
+
+_lock = threading.Lock()
+_contadores = {
+    "comprimidas": 0,
+    "omitidas_tamano": 0,
+    "bytes_originales": 0,
+    "bytes_enviados": 0,
+}
+
+
+def _contar(**incrementos):
+    with _lock:
+        for clave, valor in incrementos.items():
+            _contadores[clave] += valor
+
+
+def elegir_codificacion():
+    """Codificación a usar según Accept-Encoding: 'br', 'gzip' o None."""
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=Config.COMPRESION_NIVEL_BROTLI)
+    return gzip.compress(datos, compresslevel=Config.COMPRESION_NIVEL_GZIP)
+
+
+def comprimir_respuesta(respuesta):
+    """
+    after_request: comprime el cuerpo si el cliente lo acepta y la respuesta
+    es de texto/JSON y supera COMPRESION_MIN_BYTES. Las respuestas en
+    streaming y las que ya vienen codificadas se dejan tal cual.
+    """
+    if (respuesta.direct_passthrough or respuesta.is_streamed
+            or respuesta.status_code < 200 or respuesta.status_code in (204, 206, 304)
+            or 'Content-Encoding' in respuesta.headers
+            or respuesta.mimetype not in MIMETYPES_COMPRIMIBLES):
+        return respuesta
+
+    # La respuesta depende de Accept-Encoding aunque esta vez no se comprima
+    respuesta.vary.add('Accept-Encoding')
+
+    codificacion = elegir_codificacion()
+    if codificacion is None:
+        return respuesta
+
+    datos = respuesta.get_data()
+    if len(datos) < Config.COMPRESION_MIN_BYTES:
+        _contar(omitidas_tamano=1)
+        return respuesta
+
+    etag, debil = respuesta.get_etag()
+    comprimidos = None
+    if etag:
+        clave = (etag, codificacion)
+        comprimidos = _comprimidas.get(clave)
+        if comprimidos is None:
+            comprimidos = comprimir(datos, codificacion)
+            _comprimidas.set(clave, comprimidos)
+        # Los bytes enviados ya no son los del ETag fuerte original
+        respuesta.set_etag(etag, weak=True)
+    else:
+        comprimidos = comprimir(datos, codificacion)
+
+    respuesta.set_data(comprimidos)
+    respuesta.headers['Content-Encoding'] = codificacion
+    _contar(comprimidas=1, bytes_originales=len(datos), bytes_enviados=len(comprimidos))
+    return respuesta
+
+
+def init_app(app):
+    """Registra la compresión de respuestas en la aplicación."""
+    app.after_request(comprimir_respuesta)
+
+
+def get_compresion_stats():
+    """Retorna las estadísticas de compresión y de la caché de respuestas comprimidas."""
+    with _lock:
+        estadisticas = dict(_contadores)
+    estadisticas["brotli_disponible"] = brotli is not None
+    estadisticas["cache"] = _comprimidas.estadisticas()
+    return estadisticas
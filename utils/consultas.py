@@ -0,0 +1,38 @@
+import logging
+import threading
+from mysql.connector import errorcode
+
+logger = logging.getLogger(__name__)
+
+_faltantes_avisadas = set()
+_lock = threading.Lock()
+
+
+def marcadores(valores):
+    """Retorna '%s, %s, ...' con un marcador por valor, para usar en IN (...)."""
+    return ', '.join(['%s'] * len(valores))
+
+
+def agrupar_por(filas, clave):
+    """Agrupa filas (diccionarios) por el valor de `clave`, conservando su orden."""
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(fila[clave], []).append(fila)
+    return grupos
+
+
+def falta_tabla(error, script):
+    """
+    Si `error` es de MySQL por una tabla que no existe, avisa en el log (una
+    vez por script) que falta aplicar `script` y retorna True. Lo usan las
+    tablas opcionales de la API (log de cambios, rollups) para seguir sin
+    ellas; en MySQL el error de una sentencia no anula la transacción.
+    """
+    if getattr(error, 'errno', None) != errorcode.ER_NO_SUCH_TABLE:
+        return False
+    with _lock:
+        avisar = script not in _faltantes_avisadas
+        _faltantes_avisadas.add(script)
+    if avisar:
+        logger.warning(f"⚠️ {str(error)}: falta aplicar {script} en la base de datos")
+    return True
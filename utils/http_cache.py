@@ -0,0 +1,39 @@
+from functools import wraps
+from flask import make_response, request
+
+
+def cache_http(max_age=0, privado=True):
+    """
+    Agrega ETag y Cache-Control a las respuestas GET exitosas del endpoint y
+    responde 304 Not Modified cuando el `If-None-Match` del cliente coincide.
+
+    - max_age: segundos que el cliente puede reutilizar la respuesta sin
+      preguntar; con 0 se exige revalidar siempre (no-cache), lo que igual
+      ahorra la transferencia cuando el contenido no cambió.
+    - privado: las respuestas dependen del usuario (JWT), así que por defecto
+      solo las guarda el cliente y no un proxy o CDN compartido.
+
+    Va debajo de @jwt_required() para no condicionar las respuestas 401.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            respuesta = make_response(vista(*args, **kwargs))
+            if request.method not in ('GET', 'HEAD') or respuesta.status_code != 200 or respuesta.is_streamed:
+                return respuesta
+
+            if privado:
+                respuesta.cache_control.private = True
+                respuesta.vary.add('Authorization')
+            else:
+                respuesta.cache_control.public = True
+            if max_age:
+                respuesta.cache_control.max_age = max_age
+            else:
+                respuesta.cache_control.no_cache = True
+
+            # ETag fuerte: hash del cuerpo ya serializado
+            respuesta.add_etag()
+            return respuesta.make_conditional(request)
+        return envoltura
+    return decorador
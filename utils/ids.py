@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_ultimo_ms = 0
+_contador = 0
+
+
+def uuid7():
+    """
+    Genera un UUID versión 7 (RFC 9562): 48 bits de milisegundos Unix seguidos
+    de bits aleatorios. Los IDs generados en el proceso son crecientes, por lo
+    que se insertan al final del índice primario de InnoDB en vez de en
+    posiciones aleatorias.
+    """
+    global _ultimo_ms, _contador
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _ultimo_ms:
+            _ultimo_ms = ms
+            # Contador de 12 bits iniciado al azar en la mitad inferior para dejar margen
+            _contador = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Mismo milisegundo (o reloj atrasado): se incrementa el contador
+            _contador += 1
+            if _contador > 0xFFF:
+                _ultimo_ms += 1
+                _contador = 0
+            ms = _ultimo_ms
+        contador = _contador
+
+    aleatorio = int.from_bytes(os.urandom(8), 'big') & 0x3FFFFFFFFFFFFFFF
+    valor = (ms & 0xFFFFFFFFFFFF) << 80
+    valor |= 0x7 << 76           # versión 7
+    valor |= contador << 64      # rand_a (contador monotónico)
+    valor |= 0b10 << 62          # variante RFC 9562
+    valor |= aleatorio           # rand_b
+    return uuid.UUID(int=valor)
+
+
+def generar_id():
+    """Retorna un nuevo identificador (UUIDv7) en formato texto de 36 caracteres."""
+    return str(uuid7())
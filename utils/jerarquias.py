@@ -0,0 +1,217 @@
+import threading
+from config import Config
+from utils.cache import TTLCache
+from utils.db import get_db_connection
+
+
+class IndicePorSucursal:
+    """
+    Índice en memoria, uno por sucursal, armado con unas pocas consultas la
+    primera vez que se pide y reutilizado hasta que vence su TTL o se invalida.
+    `construir(cursor, id_sucursal)` arma el índice a partir de la BD.
+    """
+
+    def __init__(self, nombre, construir, tablas):
+        self.nombre = nombre
+        self.construir = construir
+        self.tablas = set(tablas)  # tablas de dimensión de las que depende
+        self._indices = TTLCache(maxsize=Config.JERARQUIA_CACHE_MAX, ttl=Config.JERARQUIA_CACHE_TTL)
+        self._construyendo = threading.Lock()
+
+    def obtener(self, id_sucursal):
+        indice = self._indices.get(id_sucursal)
+        if indice is not None:
+            return indice
+        # Un solo hilo arma el índice; los demás esperan y reutilizan el resultado
+        with self._construyendo:
+            indice = self._indices.get(id_sucursal)
+            if indice is None:
+                conn = get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+                indice = self.construir(cursor, id_sucursal)
+                cursor.close()
+                conn.close()
+                self._indices.set(id_sucursal, indice)
+        return indice
+
+    def invalidar(self, id_sucursal=None):
+        """Descarta el índice de una sucursal, o el de todas."""
+        if id_sucursal is None:
+            self._indices.clear()
+        else:
+            self._indices.delete(id_sucursal)
+
+    def estadisticas(self):
+        return self._indices.estadisticas()
+
+
+def _construir_arbol_productivo(cursor, id_sucursal):
+    # Mismos filtros que la cascada especie → variedad → cuartel: cuarteles
+    # cuyo CECO es de la sucursal y está activo
+    cursor.execute("""
+        SELECT e.id AS id_especie, e.nombre AS nombre_especie,
+               v.id AS id_variedad, v.nombre AS nombre_variedad,
+               c.id AS id_cuartel, c.nombre AS nombre_cuartel,
+               ce.id AS id_ceco, ce.nombre AS nombre_ceco
+        FROM general_dim_cuartel c
+        JOIN general_dim_ceco ce ON c.id_ceco = ce.id
+        JOIN general_dim_variedad v ON c.id_variedad = v.id
+        JOIN general_dim_especie e ON v.id_especie = e.id
+        WHERE ce.id_sucursal = %s AND ce.id_estado = 1
+        ORDER BY e.nombre ASC, v.nombre ASC, c.nombre ASC
+    """, (id_sucursal,))
+
+    arbol = []
+    especies = {}
+    variedades = {}
+    cuarteles_por_variedad = {}
+    cecos_por_cuartel = {}
+    for fila in cursor.fetchall():
+        especie = especies.get(fila['id_especie'])
+        if especie is None:
+            especie = {"id": fila['id_especie'], "nombre": fila['nombre_especie'], "variedades": []}
+            especies[fila['id_especie']] = especie
+            arbol.append(especie)
+
+        variedad = variedades.get(fila['id_variedad'])
+        if variedad is None:
+            variedad = {"id": fila['id_variedad'], "nombre": fila['nombre_variedad'], "cuarteles": []}
+            variedades[fila['id_variedad']] = variedad
+            especie["variedades"].append(variedad)
+
+        ceco = {"id": fila['id_ceco'], "nombre": fila['nombre_ceco']}
+        variedad["cuarteles"].append({
+            "id": fila['id_cuartel'],
+            "nombre": fila['nombre_cuartel'],
+            "cecos": [ceco],
+        })
+        cuarteles_por_variedad.setdefault(fila['id_variedad'], []).append(
+            {"id": fila['id_cuartel'], "nombre": fila['nombre_cuartel']}
+        )
+        cecos_por_cuartel.setdefault(fila['id_cuartel'], []).append(ceco)
+
+    return {
+        "arbol": arbol,
+        # Listas planas con la forma de cada paso de la cascada
+        "especies": [{"id": e["id"], "nombre": e["nombre"]} for e in arbol],
+        "variedades_por_especie": {
+            e["id"]: [{"id": v["id"], "nombre": v["nombre"]} for v in e["variedades"]] for e in arbol
+        },
+        "cuarteles_por_variedad": cuarteles_por_variedad,
+        "cecos_por_cuartel": cecos_por_cuartel,
+    }
+
+
+arbol_productivo = IndicePorSucursal(
+    'productivo', _construir_arbol_productivo,
+    ['general_dim_especie', 'general_dim_variedad', 'general_dim_cuartel', 'general_dim_ceco']
+)
+
+
+def _construir_topologia_riego(cursor, id_sucursal):
+    cursor.execute("""
+        SELECT id, nombre, ubicacion
+        FROM riego_dim_caseta
+        WHERE id_sucursal = %s
+        ORDER BY nombre ASC
+    """, (id_sucursal,))
+    casetas = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT e.id, e.nombre, e.id_caseta
+        FROM riego_dim_equipo e
+        JOIN riego_dim_caseta c ON e.id_caseta = c.id
+        WHERE c.id_sucursal = %s
+        ORDER BY e.nombre ASC
+    """, (id_sucursal,))
+    equipos = cursor.fetchall()
+
+    # Sectores de la sucursal por su caseta (cascada) o por su CECO
+    # (actividades_multiples /sectores-riego, que toma nombre_caseta de general_dim_maquinaria)
+    cursor.execute("""
+        SELECT s.id, s.nombre, s.id_equipo, s.id_ceco,
+               ce.nombre AS nombre_ceco, ce.id_sucursal AS id_sucursal_ceco, ce.id_estado AS id_estado_ceco,
+               e.nombre AS nombre_equipo, e.id_caseta,
+               ca.id_sucursal AS id_sucursal_caseta,
+               m.nombre AS nombre_maquinaria
+        FROM riego_dim_sector s
+        LEFT JOIN general_dim_ceco ce ON s.id_ceco = ce.id
+        LEFT JOIN riego_dim_equipo e ON s.id_equipo = e.id
+        LEFT JOIN riego_dim_caseta ca ON e.id_caseta = ca.id
+        LEFT JOIN general_dim_maquinaria m ON e.id_caseta = m.id
+        WHERE ca.id_sucursal = %s OR (ce.id_sucursal = %s AND ce.id_estado = 1)
+        ORDER BY s.nombre ASC
+    """, (id_sucursal, id_sucursal))
+    sectores = cursor.fetchall()
+
+    # Las rutas reciben los ids como texto: las claves de búsqueda son str
+    equipos_por_caseta = {}
+    for equipo in equipos:
+        equipos_por_caseta.setdefault(str(equipo['id_caseta']), []).append(
+            {"id": equipo['id'], "nombre": equipo['nombre']}
+        )
+
+    sectores_por_equipo = {}
+    ceco_por_sector = {}
+    sectores_ceco_sucursal = []
+    for sector in sectores:
+        if sector['id_sucursal_caseta'] == id_sucursal and sector['id_equipo'] is not None:
+            sectores_por_equipo.setdefault(str(sector['id_equipo']), []).append(
+                {"id": sector['id'], "nombre": sector['nombre']}
+            )
+        if sector['id_ceco'] is not None and sector['id_estado_ceco'] == 1:
+            ceco_por_sector[str(sector['id'])] = {"id": sector['id_ceco'], "nombre": sector['nombre_ceco']}
+            if sector['id_sucursal_ceco'] == id_sucursal:
+                sectores_ceco_sucursal.append({
+                    "id_sectorriego": sector['id'],
+                    "nombre_sector": sector['nombre'],
+                    "id_ceco": sector['id_ceco'],
+                    "nombre_ceco": sector['nombre_ceco'],
+                    "id_equipo": sector['id_equipo'],
+                    "nombre_equipo": sector['nombre_equipo'],
+                    "id_caseta": sector['id_caseta'],
+                    "nombre_caseta": sector['nombre_maquinaria'],
+                })
+
+    arbol = []
+    for caseta in casetas:
+        nodo_caseta = dict(caseta, equipos=[])
+        for equipo in equipos_por_caseta.get(str(caseta['id']), []):
+            nodo_equipo = dict(equipo, sectores=[])
+            for sector in sectores_por_equipo.get(str(equipo['id']), []):
+                ceco = ceco_por_sector.get(str(sector['id']))
+                nodo_equipo["sectores"].append(dict(sector, cecos=[ceco] if ceco else []))
+            nodo_caseta["equipos"].append(nodo_equipo)
+        arbol.append(nodo_caseta)
+
+    return {
+        "arbol": arbol,
+        "casetas": casetas,
+        "equipos_por_caseta": equipos_por_caseta,
+        "sectores_por_equipo": sectores_por_equipo,
+        "ceco_por_sector": ceco_por_sector,
+        "sectores_ceco_sucursal": sectores_ceco_sucursal,
+    }
+
+
+topologia_riego = IndicePorSucursal(
+    'riego', _construir_topologia_riego,
+    ['riego_dim_caseta', 'riego_dim_equipo', 'riego_dim_sector', 'general_dim_ceco', 'general_dim_maquinaria']
+)
+
+_INDICES = [arbol_productivo, topologia_riego]
+
+
+def invalidar_jerarquias(*tablas, id_sucursal=None):
+    """
+    Hook de invalidación: descarta los índices que dependen de alguna de las
+    tablas indicadas (todos si no se indica ninguna).
+    """
+    for indice in _INDICES:
+        if not tablas or indice.tablas & set(tablas):
+            indice.invalidar(id_sucursal)
+
+
+def get_jerarquias_stats():
+    """Retorna las estadísticas de los índices por sucursal."""
+    return {indice.nombre: indice.estadisticas() for indice in _INDICES}
@@ -0,0 +1,68 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa json de la biblioteca estándar
+    orjson = None
+
+
+def convertir_valor(valor):
+    """
+    Convierte los tipos que entrega MySQL a valores JSON:
+    - Decimal -> float (igual que las conversiones manuales que hacían los endpoints)
+    - date / datetime / time -> ISO 8601 ('2025-07-01', '2025-07-01T08:00:00', '08:00:00')
+    - timedelta (columnas TIME) -> 'H:MM:SS', igual que str(timedelta)
+    """
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, timedelta):
+        return str(valor)
+    return DefaultJSONProvider.default(valor)
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    """
+    Proveedor JSON de la aplicación. Serializa Decimal, fechas, horas y
+    timedelta sin que cada endpoint tenga que convertir fila por fila.
+    Usa orjson cuando está instalado y json estándar en caso contrario.
+    """
+
+    default = staticmethod(convertir_valor)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._dumps_bytes(obj, indentar=False).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+
+        if orjson is None:
+            return super().response(obj)
+
+        return self._app.response_class(
+            self._dumps_bytes(obj, indentar) + b"\n", mimetype=self.mimetype
+        )
+
+    def _dumps_bytes(self, obj, indentar):
+        opciones = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indentar:
+            opciones |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=opciones)
+
+
+def dumps(obj):
+    """Serializa `obj` con las mismas reglas del proveedor, fuera de un contexto de Flask."""
+    if orjson is not None:
+        opciones = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=convertir_valor, option=opciones).decode('utf-8')
+    return json.dumps(obj, default=convertir_valor, sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,171 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from flask import request
+
+LIMITE_MAXIMO = 500
+
+
+class PaginacionInvalida(ValueError):
+    """`limit` o `cursor` inválidos en la petición."""
+
+
+class Columna:
+    """
+    Columna del ORDER BY usada para paginar por keyset.
+
+    - expresion: expresión SQL (ej. 'a.fecha')
+    - clave: nombre de la columna en las filas del cursor
+    - descendente: True para DESC
+    - si_nulo: valor para COALESCE en columnas que admiten NULL
+    - oculta: la columna se agrega al SELECT solo para paginar y se quita de la respuesta
+    """
+
+    def __init__(self, expresion, clave, descendente=False, si_nulo=None, oculta=False):
+        self.expresion = expresion
+        self.clave = clave
+        self.descendente = descendente
+        self.si_nulo = si_nulo
+        self.oculta = oculta
+
+    @property
+    def sql(self):
+        if self.si_nulo is None:
+            return self.expresion
+        return f"COALESCE({self.expresion}, '{self.si_nulo}')"
+
+    def valor(self, fila):
+        valor = fila.get(self.clave)
+        if valor is None and self.si_nulo is not None:
+            return self.si_nulo
+        return valor
+
+
+class Pagina:
+    """
+    Página pedida con `?limit=N[&cursor=...]` sobre un orden fijo de columnas.
+    La última columna debe ser única (normalmente el id) para desempatar.
+
+    Uso en un handler:
+        sql += pagina.condicion          (después del WHERE, antes de GROUP BY)
+        params += pagina.params
+        sql += pagina.orden_sql          (ORDER BY ... LIMIT %s)
+        params += pagina.params_limite
+        return jsonify(pagina.responder(cursor.fetchall())), 200
+    """
+
+    def __init__(self, columnas, limite, valores=None):
+        self.columnas = columnas
+        self.limite = limite
+        self.valores = valores
+
+    @property
+    def condicion(self):
+        """Filtro ' AND (...)' que deja solo las filas posteriores al cursor."""
+        if self.valores is None:
+            return ''
+        direcciones = {c.descendente for c in self.columnas}
+        if len(direcciones) == 1:
+            # Todas en el mismo sentido: comparación de filas, aprovechable por el índice
+            operador = '<' if self.columnas[0].descendente else '>'
+            expresiones = ', '.join(c.sql for c in self.columnas)
+            marcadores = ', '.join(['%s'] * len(self.columnas))
+            return f" AND ({expresiones}) {operador} ({marcadores})"
+
+        alternativas = []
+        for i, columna in enumerate(self.columnas):
+            iguales = [f"{c.sql} = %s" for c in self.columnas[:i]]
+            operador = '<' if columna.descendente else '>'
+            alternativas.append('(' + ' AND '.join(iguales + [f"{columna.sql} {operador} %s"]) + ')')
+        return f" AND ({' OR '.join(alternativas)})"
+
+    @property
+    def params(self):
+        if self.valores is None:
+            return []
+        if len({c.descendente for c in self.columnas}) == 1:
+            return list(self.valores)
+        params = []
+        for i in range(len(self.columnas)):
+            params.extend(self.valores[:i + 1])
+        return params
+
+    @property
+    def orden_sql(self):
+        orden = ', '.join(f"{c.sql} {'DESC' if c.descendente else 'ASC'}" for c in self.columnas)
+        return f" ORDER BY {orden} LIMIT %s"
+
+    @property
+    def params_limite(self):
+        # Se pide una fila extra para saber si hay página siguiente
+        return [self.limite + 1]
+
+    @property
+    def columnas_ocultas(self):
+        """Fragmento ', expr AS clave' para agregar al SELECT las columnas ocultas."""
+        return ''.join(f", {c.expresion} AS {c.clave}" for c in self.columnas if c.oculta)
+
+    def responder(self, filas):
+        """Arma {"data": [...], "next_cursor": "..."} a partir de las filas leídas."""
+        hay_mas = len(filas) > self.limite
+        filas = filas[:self.limite]
+        siguiente = codificar_cursor([c.valor(filas[-1]) for c in self.columnas]) if hay_mas else None
+        ocultas = [c.clave for c in self.columnas if c.oculta]
+        for fila in filas:
+            for clave in ocultas:
+                fila.pop(clave, None)
+        return {"data": filas, "next_cursor": siguiente}
+
+
+def obtener_pagina(columnas):
+    """
+    Lee `limit` y `cursor` de la petición. Retorna None si no se pidió
+    paginación (sin `limit`), para que el endpoint responda como siempre.
+    """
+    limite = request.args.get('limit')
+    if limite is None:
+        return None
+    try:
+        limite = int(limite)
+    except ValueError:
+        raise PaginacionInvalida("limit debe ser un número entero")
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise PaginacionInvalida(f"limit debe estar entre 1 y {LIMITE_MAXIMO}")
+
+    valores = None
+    token = request.args.get('cursor')
+    if token:
+        valores = decodificar_cursor(token)
+        if len(valores) != len(columnas):
+            raise PaginacionInvalida("cursor inválido")
+    return Pagina(columnas, limite, valores)
+
+
+def codificar_cursor(valores):
+    """Convierte los valores de la última fila en un token opaco (base64 de JSON)."""
+    texto = json.dumps([_valor_cursor(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise PaginacionInvalida("cursor inválido")
+    # Solo valores simples: un objeto o lista llegaría como parámetro SQL
+    if not isinstance(valores, list) or not all(
+            valor is None or isinstance(valor, (str, int, float)) for valor in valores):
+        raise PaginacionInvalida("cursor inválido")
+    return valores
+
+
+def _valor_cursor(valor):
+    # MySQL compara fechas y horas escritas como texto ('2025-07-01 08:00:00')
+    if isinstance(valor, (datetime, date, time, timedelta)):
+        return str(valor)
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
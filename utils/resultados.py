@@ -0,0 +1,108 @@
+from datetime import date, datetime
+from functools import wraps
+from flask import after_this_request, current_app, has_request_context, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from config import Config
+from utils.cache import TTLCache
+
+# (endpoint, id_sucursal, id_usuario, filtros) -> (cuerpo, mimetype, encabezados)
+_resultados = TTLCache(maxsize=Config.INDICADORES_CACHE_MAX, ttl=Config.INDICADORES_CACHE_TTL)
+
+# Parámetros que no cambian el resultado
+_IGNORADOS = {'fresco'}
+
+# Encabezados de la respuesta original que se guardan con el cuerpo
+_ENCABEZADOS = ('X-Rollup-Origen', 'X-Rollup-Actualizado', 'X-Rollup-Pendientes')
+
+
+def _filtros():
+    """Filtros de la consulta normalizados: sin vacíos ni espacios y en orden."""
+    return tuple(sorted(
+        (nombre, valor.strip()) for nombre, valor in request.args.items()
+        if nombre not in _IGNORADOS and valor.strip()
+    ))
+
+
+def _como_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _incluye(filtros, fecha):
+    """Si la ventana fecha_inicio..fecha_fin de los filtros incluye la fecha (sin límite = abierta)."""
+    filtros = dict(filtros)
+    inicio = _como_fecha(filtros.get('fecha_inicio'))
+    fin = _como_fecha(filtros.get('fecha_fin'))
+    return (inicio is None or inicio <= fecha) and (fin is None or fecha <= fin)
+
+
+def cache_indicador(vista):
+    """
+    Guarda las respuestas 200 del endpoint por sucursal, usuario y filtros
+    durante INDICADORES_CACHE_TTL segundos. Con `?fresco=1` se consulta igual
+    y se reemplaza lo guardado. Va debajo de @jwt_required().
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        # Import diferido: utils.sucursal termina importando este módulo
+        from utils.sucursal import obtener_id_sucursal_activa
+        usuario_id = get_jwt_identity()
+        id_sucursal = obtener_id_sucursal_activa(usuario_id)
+        if id_sucursal is None:
+            return vista(*args, **kwargs)
+
+        clave = (request.endpoint, id_sucursal, usuario_id, _filtros())
+        if request.args.get('fresco') not in ('1', 'true'):
+            guardada = _resultados.get(clave)
+            if guardada is not None:
+                cuerpo, mimetype, encabezados = guardada
+                return current_app.response_class(cuerpo, status=200, mimetype=mimetype, headers=encabezados)
+
+        respuesta = make_response(vista(*args, **kwargs))
+        if respuesta.status_code == 200 and not respuesta.is_streamed:
+            encabezados = {nombre: respuesta.headers[nombre] for nombre in _ENCABEZADOS if nombre in respuesta.headers}
+            _resultados.set(clave, (respuesta.get_data(), respuesta.mimetype, encabezados))
+        return respuesta
+    return envoltura
+
+
+def invalidar_resultados(dias):
+    """
+    Descarta los resultados guardados de cada (id_sucursal, fecha) de `dias`
+    cuya ventana de fechas incluye esa fecha. Retorna cuántos se descartaron.
+    Solo en este proceso: los demás workers los descartan al vencer el TTL.
+    """
+    dias = {(id_sucursal, _como_fecha(fecha)) for id_sucursal, fecha in dias}
+    if not dias:
+        return 0
+    return _resultados.eliminar_si(
+        lambda clave: any(clave[1] == id_sucursal and _incluye(clave[3], fecha) for id_sucursal, fecha in dias)
+    )
+
+
+def invalidar_resultados_al_terminar(dias):
+    """
+    Igual que invalidar_resultados, pero al terminar la petición: los
+    handlers marcan los días antes del commit, y descartar antes dejaría que
+    otra petición vuelva a guardar los datos sin el cambio.
+    """
+    dias = list(dias)
+    if not has_request_context():
+        invalidar_resultados(dias)
+        return
+
+    @after_this_request
+    def _invalidar(respuesta):
+        invalidar_resultados(dias)
+        return respuesta
+
+
+def get_resultados_stats():
+    """Retorna las estadísticas de la caché de resultados de indicadores."""
+    return _resultados.estadisticas()
@@ -0,0 +1,342 @@
+import logging
+import threading
+from datetime import date
+from config import Config
+from utils.consultas import falta_tabla, marcadores
+from utils.db import get_db_connection
+from utils.resultados import invalidar_resultados, invalidar_resultados_al_terminar
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_contadores = {"dias_recalculados": 0, "respuestas_rollup": 0, "respuestas_vista": 0}
+
+# Cómo llegar a la sucursal y fecha de la actividad desde cada tabla de hechos
+# que alimenta las vistas de control de horas y rendimientos
+ACTIVIDAD_POR_TABLA = {
+    'tarja_fact_actividad': """
+        SELECT a.id_sucursalactiva, a.fecha
+        FROM tarja_fact_actividad a
+        WHERE a.id IN ({ids})
+    """,
+    'tarja_fact_rendimientopropio': """
+        SELECT a.id_sucursalactiva, a.fecha
+        FROM tarja_fact_rendimientopropio r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id IN ({ids})
+    """,
+    'tarja_fact_rendimientocontratista': """
+        SELECT a.id_sucursalactiva, a.fecha
+        FROM tarja_fact_rendimientocontratista r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id IN ({ids})
+    """,
+    'tarja_fact_redimientogrupal': """
+        SELECT a.id_sucursalactiva, a.fecha
+        FROM tarja_fact_redimientogrupal r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id IN ({ids})
+    """,
+}
+
+# Columnas de los rollups que guardan el id de una tabla de dimensión cuyo
+# nombre también se copia al rollup: al cambiar la dimensión se recalculan
+# los días donde aparece, para no seguir mostrando el nombre anterior
+DIMENSIONES_ROLLUP = {
+    'general_dim_colaborador': [('tarja_rollup_horas_diarias', 'id_colaborador')],
+    'general_dim_labor': [('tarja_rollup_rendimiento_diario', 'id_labor')],
+    'general_dim_ceco': [('tarja_rollup_rendimiento_diario', 'id_ceco')],
+    'general_dim_cecotipo': [('tarja_rollup_rendimiento_diario', 'id_tipoceco')],
+    'tarja_dim_unidad': [('tarja_rollup_rendimiento_diario', 'id_unidad')],
+    'tarja_dim_tiporendimiento': [('tarja_rollup_rendimiento_diario', 'id_tiporendimiento')],
+}
+
+# Resumen diario por colaborador (control de horas)
+SQL_ROLLUP_HORAS = """
+    INSERT INTO tarja_rollup_horas_diarias
+        (id_sucursal, id_usuario, id_colaborador, colaborador, fecha, id_empresa, horas_trabajadas)
+    SELECT v.id_sucursal, v.id_usuario, v.id_colaborador, v.colaborador, v.fecha, v.id_empresa,
+           SUM(v.horas_trabajadas)
+    FROM v_tarja_tarjamovil_controlhoras v
+    WHERE v.id_sucursal = %s AND v.fecha = %s
+    GROUP BY v.id_sucursal, v.id_usuario, v.id_colaborador, v.colaborador, v.fecha, v.id_empresa
+"""
+
+# Resumen diario de rendimientos por tipo de mano de obra, labor, CECO y unidad
+SQL_ROLLUP_RENDIMIENTOS = """
+    INSERT INTO tarja_rollup_rendimiento_diario
+        (id_sucursal, id_usuario, fecha, tipo_mo, id_tiporendimiento, tipo_rendimiento, grupo_mo,
+         id_labor, labor, id_ceco, nombre_ceco, id_tipoceco, tipoceco, detalle_ceco, id_unidad, unidad,
+         total_rendimiento, total_trabajadores_individuales, total_grupos,
+         total_cantidad_individuales, total_cantidad_grupales)
+    SELECT v.id_sucursal, v.id_usuario, v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo,
+           v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco, v.detalle_ceco, v.id_unidad, v.unidad,
+           SUM(v.rendimiento),
+           COUNT(DISTINCT CASE WHEN v.id_trabajador IS NOT NULL THEN v.id_trabajador END),
+           COUNT(DISTINCT CASE WHEN v.id_trabajador IS NULL THEN v.grupo_mo END),
+           SUM(CASE WHEN v.id_trabajador IS NOT NULL THEN v.cantidad_trab ELSE 0 END),
+           SUM(CASE WHEN v.id_trabajador IS NULL THEN v.cantidad_trab ELSE 0 END)
+    FROM v_tarja_tarjamovil_controlrendimiento v
+    WHERE v.id_sucursal = %s AND v.fecha = %s
+    GROUP BY v.id_sucursal, v.id_usuario, v.fecha, v.tipo_mo, v.id_tiporendimiento, v.tipo_rendimiento, v.grupo_mo,
+             v.id_labor, v.labor, v.id_ceco, v.nombre_ceco, v.id_tipoceco, v.tipoceco, v.detalle_ceco, v.id_unidad, v.unidad
+"""
+
+# Script que crea las tablas de rollups
+SCRIPT_ROLLUP = 'sql/tarja_rollup.sql'
+
+TABLAS_ROLLUP = {
+    'tarja_rollup_horas_diarias': SQL_ROLLUP_HORAS,
+    'tarja_rollup_rendimiento_diario': SQL_ROLLUP_RENDIMIENTOS,
+}
+
+
+def marcar_rollup(cursor, tabla, ids):
+    """
+    Marca como pendientes los días (sucursal, fecha) afectados por los
+    registros `ids` de `tabla`: los de sus actividades para las tablas de
+    hechos y, para las de dimensión, los días del rollup donde aparecen. Se
+    llama con el cursor del handler y antes del commit; para borrados y
+    cambios de fecha, antes de modificar el registro. Al terminar la
+    petición descarta además los resultados de indicadores guardados para
+    esos días.
+    """
+    if tabla not in ACTIVIDAD_POR_TABLA and tabla not in DIMENSIONES_ROLLUP:
+        return
+    if isinstance(ids, (str, int)):
+        ids = [ids]
+    if not ids:
+        return
+    if tabla in DIMENSIONES_ROLLUP:
+        _marcar_dias(cursor, _dias_de_dimension(cursor, tabla, ids))
+        return
+    origen = ACTIVIDAD_POR_TABLA[tabla].format(ids=marcadores(ids))
+    cursor.execute(f"""
+        SELECT DISTINCT t.id_sucursalactiva, t.fecha
+        FROM ({origen}) t
+        WHERE t.id_sucursalactiva IS NOT NULL AND t.fecha IS NOT NULL
+    """, tuple(ids))
+    _marcar_dias(cursor, _como_tuplas(cursor.fetchall()))
+
+
+def marcar_dimension(cursor, *tablas):
+    """
+    Marca como pendientes todos los días del rollup que usan alguna de las
+    tablas de dimensión indicadas, para cambios hechos fuera de la API (por
+    ejemplo, al invalidar la caché de catálogos).
+    """
+    dias = []
+    for tabla in tablas:
+        if tabla in DIMENSIONES_ROLLUP:
+            dias += _dias_de_dimension(cursor, tabla, None)
+    _marcar_dias(cursor, sorted(set(dias)))
+    return len(set(dias))
+
+
+def _dias_de_dimension(cursor, tabla, ids):
+    # ids None: todos los días donde aparece cualquier registro de la dimensión
+    dias = []
+    for tabla_rollup, columna in DIMENSIONES_ROLLUP[tabla]:
+        condicion = f"{columna} IS NOT NULL" if ids is None else f"{columna} IN ({marcadores(ids)})"
+        try:
+            cursor.execute(f"SELECT DISTINCT id_sucursal, fecha FROM {tabla_rollup} WHERE {condicion}",
+                           tuple(ids or ()))
+        except Exception as e:
+            if not falta_tabla(e, SCRIPT_ROLLUP):
+                raise
+            return []
+        dias += _como_tuplas(cursor.fetchall())
+    return dias
+
+
+def _como_tuplas(filas):
+    # El cursor del handler puede ser de tuplas o de diccionarios
+    return [tuple(fila.values()) if isinstance(fila, dict) else tuple(fila) for fila in filas]
+
+
+def _marcar_dias(cursor, dias):
+    if not dias:
+        return
+    invalidar_resultados_al_terminar(dias)
+    try:
+        cursor.executemany("""
+            INSERT INTO tarja_rollup_pendiente (id_sucursal, fecha)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE marcado_en = CURRENT_TIMESTAMP(6)
+        """, dias)
+    except Exception as e:
+        # Sin las tablas de rollups los indicadores se leen de las vistas
+        if not falta_tabla(e, SCRIPT_ROLLUP):
+            raise
+
+
+def marcar_ventana(cursor, dias, id_sucursal=None):
+    """
+    Marca como pendientes todos los días con actividades de los últimos `dias`
+    días; sirve para la carga inicial y para recoger cambios hechos fuera de la API.
+    Anota además desde qué fecha el rollup de cada sucursal queda completo
+    (cubierto_desde): las consultas que empiezan antes van a las vistas.
+    """
+    filtro = ""
+    params = [dias]
+    if id_sucursal is not None:
+        filtro = " AND a.id_sucursalactiva = %s"
+        params.append(id_sucursal)
+    cursor.execute(f"""
+        INSERT INTO tarja_rollup_pendiente (id_sucursal, fecha)
+        SELECT DISTINCT a.id_sucursalactiva, a.fecha
+        FROM tarja_fact_actividad a
+        WHERE a.fecha >= CURDATE() - INTERVAL %s DAY AND a.id_sucursalactiva IS NOT NULL{filtro}
+        ON DUPLICATE KEY UPDATE marcado_en = CURRENT_TIMESTAMP(6)
+    """, tuple(params))
+    marcados = cursor.rowcount
+    cursor.execute(f"""
+        INSERT INTO tarja_rollup_estado (id_sucursal, cubierto_desde)
+        SELECT DISTINCT a.id_sucursalactiva, CURDATE() - INTERVAL %s DAY
+        FROM tarja_fact_actividad a
+        WHERE a.id_sucursalactiva IS NOT NULL{filtro}
+        ON DUPLICATE KEY UPDATE cubierto_desde = LEAST(
+            COALESCE(cubierto_desde, VALUES(cubierto_desde)), VALUES(cubierto_desde))
+    """, tuple(params))
+    return marcados
+
+
+def refrescar_rollups(id_sucursal=None, limite=None):
+    """
+    Recalcula los días pendientes (hasta `limite`), del más antiguo al más
+    nuevo. Cada día se reemplaza completo en su propia transacción; si se
+    vuelve a marcar mientras se recalcula, queda pendiente para la próxima vez.
+    Retorna la cantidad de días recalculados.
+    """
+    limite = limite or Config.ROLLUP_LOTE
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    sql = "SELECT id_sucursal, fecha, marcado_en FROM tarja_rollup_pendiente"
+    params = []
+    if id_sucursal is not None:
+        sql += " WHERE id_sucursal = %s"
+        params.append(id_sucursal)
+    sql += " ORDER BY marcado_en ASC LIMIT %s"
+    params.append(limite)
+    cursor.execute(sql, tuple(params))
+    pendientes = cursor.fetchall()
+
+    try:
+        for dia in pendientes:
+            for tabla, sql_insertar in TABLAS_ROLLUP.items():
+                cursor.execute(f"DELETE FROM {tabla} WHERE id_sucursal = %s AND fecha = %s",
+                               (dia['id_sucursal'], dia['fecha']))
+                cursor.execute(sql_insertar, (dia['id_sucursal'], dia['fecha']))
+            cursor.execute("""
+                DELETE FROM tarja_rollup_pendiente
+                WHERE id_sucursal = %s AND fecha = %s AND marcado_en <= %s
+            """, (dia['id_sucursal'], dia['fecha'], dia['marcado_en']))
+            cursor.execute("""
+                INSERT INTO tarja_rollup_estado (id_sucursal, actualizado_en)
+                VALUES (%s, CURRENT_TIMESTAMP(6))
+                ON DUPLICATE KEY UPDATE actualizado_en = CURRENT_TIMESTAMP(6)
+            """, (dia['id_sucursal'],))
+            conn.commit()
+            invalidar_resultados([(dia['id_sucursal'], dia['fecha'])])
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    _contar('dias_recalculados', len(pendientes))
+    if pendientes:
+        logger.info(f"📊 Rollups recalculados: {len(pendientes)} día(s)")
+    return len(pendientes)
+
+
+def estado_rollup(cursor, id_sucursal):
+    """
+    Retorna {"actualizado_en", "cubierto_desde", "pendientes"} de la sucursal, o None si sus
+    rollups nunca se calcularon o faltan sus tablas (en ese caso se
+    consultan las vistas).
+    """
+    try:
+        cursor.execute("""
+            SELECT actualizado_en, cubierto_desde FROM tarja_rollup_estado WHERE id_sucursal = %s
+        """, (id_sucursal,))
+    except Exception as e:
+        if not falta_tabla(e, SCRIPT_ROLLUP):
+            raise
+        return None
+    estado = cursor.fetchone()
+    if not estado:
+        return None
+    cursor.execute("SELECT COUNT(*) AS pendientes FROM tarja_rollup_pendiente WHERE id_sucursal = %s", (id_sucursal,))
+    return {
+        "actualizado_en": estado['actualizado_en'],
+        "cubierto_desde": estado['cubierto_desde'],
+        "pendientes": cursor.fetchone()['pendientes'],
+    }
+
+
+def cubre(estado, fecha_inicio):
+    """
+    Si el rollup tiene todos los días desde `fecha_inicio` (texto ISO o
+    None = sin límite). Sin carga inicial (marcar_ventana) no cubre nada:
+    solo tiene los días que se fueron modificando.
+    """
+    if estado['cubierto_desde'] is None or not fecha_inicio:
+        return False
+    try:
+        return date.fromisoformat(str(fecha_inicio).strip()[:10]) >= estado['cubierto_desde']
+    except ValueError:
+        return False
+
+
+def usar_rollup(cursor, id_sucursal, fecha_inicio=None, forzar=False):
+    """
+    Decide si el handler lee de los rollups. Solo si la consulta empieza
+    dentro del rango cargado (cubierto_desde); antes de leer recalcula los
+    días pendientes de la sucursal (hasta ROLLUP_LOTE_LECTURA; ROLLUP_LOTE
+    con `forzar`, que los handlers solo permiten a administradores). Si aún
+    quedan pendientes, la sucursal nunca se calculó o la consulta empieza
+    antes de lo cargado, retorna None y el handler consulta las vistas; si
+    no, el estado para los encabezados.
+    """
+    estado = None
+    if Config.INDICADORES_ROLLUP:
+        estado = estado_rollup(cursor, id_sucursal)
+        if estado is not None and not cubre(estado, fecha_inicio):
+            estado = None
+        if estado is not None and (estado['pendientes'] or forzar):
+            try:
+                refrescar_rollups(id_sucursal, None if forzar else Config.ROLLUP_LOTE_LECTURA)
+            except Exception as e:
+                # Otra petición puede estar recalculando los mismos días
+                logger.warning(f"⚠️ No se pudieron recalcular los rollups de la sucursal {id_sucursal}: {str(e)}")
+            estado = estado_rollup(cursor, id_sucursal)
+            if estado['pendientes']:
+                estado = None
+    _contar('respuestas_vista' if estado is None else 'respuestas_rollup')
+    return estado
+
+
+def encabezados_rollup(estado):
+    """Encabezados que indican qué tan al día está la respuesta."""
+    if estado is None:
+        return {"X-Rollup-Origen": "vista"}
+    return {
+        "X-Rollup-Origen": "rollup",
+        "X-Rollup-Actualizado": estado['actualizado_en'].isoformat() if estado['actualizado_en'] else '',
+        "X-Rollup-Pendientes": str(estado['pendientes']),
+    }
+
+
+def _contar(clave, cantidad=1):
+    with _lock:
+        _contadores[clave] += cantidad
+
+
+def get_rollups_stats():
+    """Retorna cuántas respuestas salieron de los rollups y cuántas de las vistas."""
+    with _lock:
+        estadisticas = dict(_contadores)
+    estadisticas["habilitado"] = Config.INDICADORES_ROLLUP
+    return estadisticas
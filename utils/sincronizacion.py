@@ -0,0 +1,154 @@
+from datetime import datetime
+from flask import request
+from utils.consultas import falta_tabla, marcadores
+from utils.rollups import marcar_rollup
+
+# Los cambios de los últimos segundos se vuelven a enviar en la sincronización
+# siguiente: una transacción que tomó un seq menor puede confirmarse después
+# de que otra con seq mayor ya fue leída.
+MARGEN_SEGUNDOS = 30
+
+# Script que crea la tabla del log de cambios
+SCRIPT_LOG = 'sql/tarja_log_cambio.sql'
+
+
+class SinceInvalido(ValueError):
+    """Parámetro `since` inválido."""
+
+
+def obtener_since():
+    """
+    Lee `?since=` de la petición. Retorna None si no viene; si no, una tupla:
+    - ('seq', n) para un token de sincronización (0 = sincronización completa)
+    - ('fecha', datetime) para una fecha/hora ISO 8601
+    """
+    valor = request.args.get('since')
+    if valor is None:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return ('seq', int(valor))
+    try:
+        return ('fecha', datetime.fromisoformat(valor))
+    except ValueError:
+        raise SinceInvalido("since debe ser un token de sincronización o una fecha ISO 8601")
+
+
+# Cómo obtener la sucursal de un registro cuando el handler no la tiene a mano
+SUCURSAL_POR_TABLA = {
+    'tarja_fact_actividad': "SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s",
+    'tarja_fact_rendimientopropio': """
+        SELECT a.id_sucursalactiva
+        FROM tarja_fact_rendimientopropio r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id = %s
+    """,
+    'tarja_fact_rendimientocontratista': """
+        SELECT a.id_sucursalactiva
+        FROM tarja_fact_rendimientocontratista r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id = %s
+    """,
+    'tarja_fact_redimientogrupal': """
+        SELECT a.id_sucursalactiva
+        FROM tarja_fact_redimientogrupal r
+        JOIN tarja_fact_actividad a ON r.id_actividad = a.id
+        WHERE r.id = %s
+    """,
+}
+
+
+def registrar_cambio(cursor, tabla, ids, id_sucursal=None, eliminado=False):
+    """
+    Anota en tarja_log_cambio que los registros `ids` de `tabla` cambiaron.
+    Se llama con el cursor del handler antes del commit, para que el registro
+    quede en la misma transacción que la escritura. Si no se indica la
+    sucursal se obtiene del propio registro (para borrados, llamar antes del DELETE).
+    También marca como pendientes los rollups de indicadores de esos días.
+    """
+    if isinstance(ids, (str, int)):
+        ids = [ids]
+    if not ids:
+        return
+    marcar_rollup(cursor, tabla, ids)
+    operacion = 'delete' if eliminado else 'upsert'
+    try:
+        if id_sucursal is None and tabla in SUCURSAL_POR_TABLA:
+            cursor.executemany(
+                f"""
+                INSERT INTO tarja_log_cambio (tabla, id_registro, id_sucursal, operacion)
+                VALUES (%s, %s, ({SUCURSAL_POR_TABLA[tabla]}), %s)
+                """,
+                [(tabla, str(id_registro), id_registro, operacion) for id_registro in ids]
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO tarja_log_cambio (tabla, id_registro, id_sucursal, operacion) VALUES (%s, %s, %s, %s)",
+                [(tabla, str(id_registro), id_sucursal, operacion) for id_registro in ids]
+            )
+    except Exception as e:
+        # Sin la tabla la escritura sigue; ?since= responde la lista completa
+        if not falta_tabla(e, SCRIPT_LOG):
+            raise
+
+
+def consultar_cambios(cursor, tabla, since, id_sucursal=None):
+    """
+    Retorna (ids, token): los ids de `tabla` que cambiaron desde `since` y el
+    token a usar en la próxima sincronización. `ids` es None cuando `since`
+    es 0, es decir, cuando el cliente pide todo, o cuando falta la tabla del
+    log (se responde todo con token 0).
+    """
+    try:
+        cursor.execute("""
+            SELECT COALESCE(MAX(seq), 0) AS seq
+            FROM tarja_log_cambio
+            WHERE fecha <= NOW(6) - INTERVAL %s SECOND
+        """, (MARGEN_SEGUNDOS,))
+    except Exception as e:
+        if not falta_tabla(e, SCRIPT_LOG):
+            raise
+        return None, 0
+    token = cursor.fetchone()['seq']
+
+    tipo, valor = since
+    if tipo == 'seq':
+        token = max(token, valor)
+        if valor == 0:
+            return None, token
+
+    sql = f"""
+        SELECT DISTINCT id_registro
+        FROM tarja_log_cambio
+        WHERE tabla = %s AND {'seq' if tipo == 'seq' else 'fecha'} > %s
+    """
+    params = [tabla, valor]
+    if id_sucursal is not None:
+        sql += " AND (id_sucursal = %s OR id_sucursal IS NULL)"
+        params.append(id_sucursal)
+    cursor.execute(sql, tuple(params))
+    return [fila['id_registro'] for fila in cursor.fetchall()], token
+
+
+def filtro_ids(columna, ids):
+    """Fragmento ' AND columna IN (...)' y sus parámetros para limitar la consulta a `ids`."""
+    if ids is None:
+        return '', []
+    if not ids:
+        return ' AND 1 = 0', []
+    return f" AND {columna} IN ({marcadores(ids)})", list(ids)
+
+
+def respuesta_delta(filas, ids, token, clave='id'):
+    """
+    Arma la respuesta de sincronización. Los ids que cambiaron pero ya no
+    aparecen en la consulta (borrados o que dejaron de cumplir el filtro)
+    se informan en `eliminados`. Con `ids` None (since=0 o sin log de
+    cambios) `data` es la lista completa y `completo` es True: el cliente
+    debe reemplazar su copia, no combinarla.
+    """
+    eliminados = []
+    if ids:
+        presentes = {str(fila[clave]) for fila in filas}
+        eliminados = [id_registro for id_registro in ids if id_registro not in presentes]
+    return {"data": filas, "eliminados": eliminados, "since": str(token), "completo": ids is None}
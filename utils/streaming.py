@@ -0,0 +1,87 @@
+import logging
+from flask import Response, request
+from utils.db import tomar_conexion_request
+from utils.json_provider import dumps
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+TAMANO_LOTE = 500
+
+
+def formato_streaming():
+    """
+    Indica si la petición pidió la respuesta en streaming:
+    - 'ndjson' con `Accept: application/x-ndjson` o `?stream=ndjson` (una fila JSON por línea)
+    - 'json' con `?stream=1` (el mismo arreglo JSON de siempre, enviado por partes)
+    - None si no se pidió streaming
+    """
+    stream = request.args.get('stream', '').lower()
+    if stream == 'ndjson' or MIMETYPE_NDJSON in request.headers.get('Accept', ''):
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+
+def respuesta_streaming(sql, params=(), formato='json', transformar=None, tamano_lote=TAMANO_LOTE):
+    """
+    Ejecuta `sql` y envía las filas a medida que se leen de MySQL, sin armar
+    la lista completa en memoria.
+
+    Toma la conexión de la petición (o una del pool si aún no usó ninguna)
+    con cursor no buffered, y la devuelve al pool cuando termina (o se
+    interrumpe) el envío. La consulta se ejecuta antes de responder, así que
+    un error de SQL se reporta con el status normal del handler. Un error a
+    mitad del envío termina la respuesta con un elemento {"error": ...}
+    (una línea en ndjson, el último elemento del arreglo en json).
+    `transformar(fila)` permite ajustar cada fila.
+    """
+    prestada = tomar_conexion_request()
+    try:
+        cursor = prestada.cursor(dictionary=True)
+        cursor.execute(sql, params)
+    except Exception:
+        prestada.close()
+        raise
+
+    mimetype = MIMETYPE_NDJSON if formato == 'ndjson' else 'application/json'
+    return Response(
+        _generar_filas(prestada, cursor, formato, transformar, tamano_lote),
+        mimetype=mimetype
+    )
+
+
+def _generar_filas(prestada, cursor, formato, transformar, tamano_lote):
+    primero = True
+    try:
+        if formato == 'json':
+            yield '['
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            if transformar:
+                filas = [transformar(fila) for fila in filas]
+            partes = [dumps(fila) for fila in filas]
+            if formato == 'ndjson':
+                yield '\n'.join(partes) + '\n'
+            else:
+                yield ('' if primero else ',') + ','.join(partes)
+            primero = False
+        if formato == 'json':
+            yield ']\n'
+    except Exception as e:
+        # Los encabezados ya se enviaron: solo queda cortar la respuesta
+        logger.error(f"❌ Error durante respuesta en streaming: {str(e)}")
+        if formato == 'ndjson':
+            yield dumps({"error": str(e)}) + '\n'
+        else:
+            yield ('' if primero else ',') + dumps({"error": str(e)}) + ']\n'
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        # devolver() descarta las filas no leídas si el cliente cortó la conexión
+        prestada.close()
@@ -0,0 +1,73 @@
+from config import Config
+from utils.cache import TTLCache
+from utils.db import get_db_connection
+from utils.usuario_actual import usuario_del_token
+
+# Sucursal activa por usuario (id_usuario -> id_sucursalactiva)
+_sucursales_activas = TTLCache(maxsize=Config.SUCURSAL_CACHE_MAX, ttl=Config.SUCURSAL_CACHE_TTL)
+
+# Sucursal de cada actividad (id_actividad -> id_sucursalactiva); no cambia una vez creada
+_sucursales_actividad = TTLCache(maxsize=Config.SUCURSAL_CACHE_MAX, ttl=Config.JERARQUIA_CACHE_TTL)
+
+
+def obtener_id_sucursal_activa(usuario_id):
+    """
+    Retorna el id_sucursalactiva del usuario, o None si el usuario no existe
+    o no tiene sucursal activa. Para el usuario de la petición se usa la
+    sucursal del token si sigue vigente; si no, se consulta (con caché por usuario).
+    """
+    usuario = usuario_del_token(usuario_id)
+    if usuario is not None:
+        return usuario.sucursal
+
+    id_sucursal = _sucursales_activas.get(usuario_id)
+    if id_sucursal is not None:
+        return id_sucursal
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
+    usuario = cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+    if not usuario or usuario['id_sucursalactiva'] is None:
+        return None
+
+    id_sucursal = usuario['id_sucursalactiva']
+    _sucursales_activas.set(usuario_id, id_sucursal)
+    return id_sucursal
+
+
+def invalidar_sucursal_activa(usuario_id):
+    """Descarta la sucursal activa en caché del usuario (llamar tras cambiarla)."""
+    _sucursales_activas.delete(usuario_id)
+
+
+def obtener_sucursal_actividad(id_actividad):
+    """
+    Retorna el id_sucursalactiva de la actividad, o None si no existe o no
+    tiene sucursal. El resultado se guarda en caché por actividad.
+    """
+    id_sucursal = _sucursales_actividad.get(id_actividad)
+    if id_sucursal is not None:
+        return id_sucursal
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id_sucursalactiva FROM tarja_fact_actividad WHERE id = %s", (id_actividad,))
+    actividad = cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+    if not actividad or not actividad['id_sucursalactiva']:
+        return None
+
+    id_sucursal = actividad['id_sucursalactiva']
+    _sucursales_actividad.set(id_actividad, id_sucursal)
+    return id_sucursal
+
+
+def get_sucursal_cache_stats():
+    """Retorna las estadísticas de la caché de sucursales activas."""
+    return _sucursales_activas.estadisticas()
@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from flask import g, has_request_context
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity
+from werkzeug.local import LocalProxy
+from config import Config
+from utils.db import get_db_connection
+from utils.consultas import falta_tabla
+from utils.sincronizacion import MARGEN_SEGUNDOS, SCRIPT_LOG
+
+logger = logging.getLogger(__name__)
+
+TABLA_USUARIO = 'general_dim_usuario'
+
+
+class RegistroVersiones:
+    """
+    Versión de los datos de autorización (rol, perfil, sucursal activa) de
+    cada usuario: el seq del último cambio anotado en tarja_log_cambio.
+
+    El token guarda la versión con que se emitió (claim `ver`); si el usuario
+    cambió después, sus claims ya no sirven y se consulta la BD. Los cambios
+    hechos en este proceso se ven de inmediato; los de otros procesos, al
+    releer el log cada CLAIMS_REFRESCO segundos (una sola consulta por
+    intervalo, no por petición). Como en la sincronización, se releen los
+    cambios de los últimos MARGEN_SEGUNDOS por si una transacción con seq
+    menor se confirmó tarde.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._versiones = {}  # id_usuario -> seq
+        self._ultimo_seq = 0
+        self._leido_en = None  # última lectura (o intento) del log
+        self._disponible = False
+        self._lock = threading.Lock()
+        self._refrescando = threading.Lock()
+
+    def _refrescar(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and self._leido_en is not None and ahora - self._leido_en < self.intervalo:
+            return
+        # Si otro hilo ya está leyendo el log, se usan las versiones conocidas
+        if not self._refrescando.acquire(blocking=forzar):
+            return
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id_registro, MAX(seq) AS seq
+                FROM tarja_log_cambio
+                WHERE tabla = %s
+                  AND (seq > %s OR fecha > NOW(6) - INTERVAL %s SECOND)
+                GROUP BY id_registro
+            """, (TABLA_USUARIO, self._ultimo_seq, MARGEN_SEGUNDOS))
+            filas = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            with self._lock:
+                for fila in filas:
+                    self._anotar(fila['id_registro'], fila['seq'])
+                    self._ultimo_seq = max(self._ultimo_seq, fila['seq'])
+                self._disponible = True
+        except Exception as e:
+            # Sin el log no se puede saber si un token quedó desactualizado
+            logger.warning(f"⚠️ No se pudo leer el log de cambios de usuarios: {str(e)}")
+            with self._lock:
+                self._disponible = False
+        finally:
+            self._leido_en = ahora
+            self._refrescando.release()
+
+    def _anotar(self, usuario_id, seq):
+        usuario_id = str(usuario_id)
+        self._versiones[usuario_id] = max(self._versiones.get(usuario_id, 0), seq)
+
+    def anotar(self, usuario_id, seq):
+        with self._lock:
+            self._anotar(usuario_id, seq)
+
+    def version(self, usuario_id, forzar=False):
+        """Versión actual del usuario, o None si no se pudo leer el log."""
+        self._refrescar(forzar)
+        with self._lock:
+            if not self._disponible:
+                return None
+            return self._versiones.get(str(usuario_id), 0)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "usuarios_con_cambios": len(self._versiones),
+                "ultimo_seq": self._ultimo_seq,
+                "intervalo": self.intervalo,
+            }
+
+
+_registro = RegistroVersiones(Config.CLAIMS_REFRESCO)
+_lock = threading.Lock()
+_contadores = {"desde_token": 0, "desde_bd": 0}
+
+
+class UsuarioActual:
+    """Datos de autorización del usuario de la petición."""
+
+    def __init__(self, id, rol, perfil, sucursal, desde_token):
+        self.id = id
+        self.rol = rol
+        self.perfil = perfil
+        self.sucursal = sucursal
+        self.desde_token = desde_token
+
+
+def _claims_vigentes(usuario_id, claims):
+    if 'ver' not in claims or 'perfil' not in claims:
+        return False  # token emitido antes de que existiera la versión
+    version = _registro.version(usuario_id)
+    return version is not None and version <= claims['ver']
+
+
+def _como_id(valor):
+    """Ids de los claims con el mismo tipo que en la BD: tokens antiguos pueden traer '5' en vez de 5."""
+    if isinstance(valor, str) and valor.strip().isdigit():
+        return int(valor)
+    return valor
+
+
+def obtener_usuario_actual():
+    """
+    Usuario de la petición (requiere @jwt_required()). Se arma una vez por
+    petición desde los claims del token; solo si el usuario cambió después
+    de emitido el token se leen rol, perfil y sucursal desde la BD.
+    """
+    if 'usuario_actual' in g:
+        return g.usuario_actual
+
+    usuario_id = get_jwt_identity()
+    claims = get_jwt()
+    if _claims_vigentes(usuario_id, claims):
+        usuario = UsuarioActual(usuario_id, _como_id(claims.get('rol')), _como_id(claims.get('perfil')),
+                                _como_id(claims.get('sucursal')), True)
+        _contar('desde_token')
+    else:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT id_rol, id_perfil, id_sucursalactiva FROM general_dim_usuario WHERE id = %s",
+            (usuario_id,)
+        )
+        fila = cursor.fetchone() or {}
+        cursor.close()
+        conn.close()
+        usuario = UsuarioActual(usuario_id, fila.get('id_rol'), fila.get('id_perfil'),
+                                fila.get('id_sucursalactiva'), False)
+        _contar('desde_bd')
+
+    g.usuario_actual = usuario
+    return usuario
+
+
+# Equivalente a current_user: usuario_actual.perfil, usuario_actual.sucursal
+usuario_actual = LocalProxy(obtener_usuario_actual)
+
+
+def usuario_del_token(usuario_id):
+    """
+    UsuarioActual de la petición si `usuario_id` es el del token verificado;
+    None fuera de una petición autenticada o para otro usuario.
+    """
+    if not has_request_context():
+        return None
+    try:
+        if get_jwt_identity() != usuario_id:
+            return None
+    except RuntimeError:
+        return None  # la vista no verificó el JWT
+    return obtener_usuario_actual()
+
+
+def marcar_cambio_usuario(cursor, usuario_id, eliminado=False):
+    """
+    Anota que cambiaron el rol, perfil, estado o sucursal activa del usuario,
+    con el cursor del handler y antes del commit. Los tokens emitidos antes
+    dejan de usar sus claims.
+    """
+    try:
+        cursor.execute(
+            "INSERT INTO tarja_log_cambio (tabla, id_registro, operacion) VALUES (%s, %s, %s)",
+            (TABLA_USUARIO, str(usuario_id), 'delete' if eliminado else 'upsert')
+        )
+        _registro.anotar(usuario_id, cursor.lastrowid)
+    except Exception as e:
+        # Sin el log los tokens se emiten con una versión nunca vigente
+        if not falta_tabla(e, SCRIPT_LOG):
+            raise
+    g.pop('usuario_actual', None)
+
+
+def crear_token_acceso(usuario_id, rol, perfil, sucursal, sucursal_nombre):
+    """Access token con los datos de autorización y la versión vigente del usuario."""
+    version = _registro.version(usuario_id, forzar=True)
+    return create_access_token(
+        identity=usuario_id,
+        additional_claims={
+            'rol': rol,
+            'perfil': perfil,
+            'sucursal': sucursal,
+            'sucursal_nombre': sucursal_nombre,
+            # Sin log legible se emite una versión que nunca está vigente
+            'ver': version if version is not None else -1
+        }
+    )
+
+
+def _contar(clave):
+    with _lock:
+        _contadores[clave] += 1
+
+
+def get_usuario_actual_stats():
+    """Retorna cuántas peticiones usaron los claims del token y cuántas la BD."""
+    with _lock:
+        estadisticas = dict(_contadores)
+    estadisticas["versiones"] = _registro.estadisticas()
+    return estadisticas